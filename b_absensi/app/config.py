@@ -16,13 +16,35 @@ DATABASE_PORT = os.getenv("DATABASE_PORT", "3306")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "absensi_db")
 
 DATABASE_URL = f"mysql+pymysql://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}"
+ASYNC_DATABASE_URL = f"mysql+aiomysql://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}"
+
+# Read replica (optional). Heavy list/history reads go here; empty host = read from the primary
+DATABASE_REPLICA_HOST = os.getenv("DATABASE_REPLICA_HOST", "")
+DATABASE_REPLICA_PORT = os.getenv("DATABASE_REPLICA_PORT", DATABASE_PORT)
+
+if DATABASE_REPLICA_HOST:
+    DATABASE_REPLICA_URL = f"mysql+pymysql://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_REPLICA_HOST}:{DATABASE_REPLICA_PORT}/{DATABASE_NAME}"
+    ASYNC_DATABASE_REPLICA_URL = f"mysql+aiomysql://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_REPLICA_HOST}:{DATABASE_REPLICA_PORT}/{DATABASE_NAME}"
+else:
+    DATABASE_REPLICA_URL = ""
+    ASYNC_DATABASE_REPLICA_URL = ""
+
+# Seconds a user's reads stay on the primary after they write (covers replication lag)
+READ_AFTER_WRITE_SECONDS = int(os.getenv("READ_AFTER_WRITE_SECONDS", "5"))
+
+# Connection Pool Configuration (per engine; the sync and async engines each get one)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Seconds; keep below MariaDB wait_timeout
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
 
 # Security Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 7
 
-# Lokasi Absensi
+# Lokasi Absensi (initial contents of the locations table; edit sites there, not here)
 LOKASI_ABSENSI = {
     "MNC Tower": {
         "lat": -6.1840816,
@@ -51,11 +73,124 @@ APP_ENV = os.getenv("APP_ENV", "development")
 
 # File Upload Configuration
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads")
+MAX_PHOTO_SIZE = int(os.getenv("MAX_PHOTO_SIZE", str(10 * 1024 * 1024)))  # bytes
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))  # bytes
+PHOTO_STORE_DIR = os.path.join(UPLOAD_DIR, "photos")  # Content-addressed, sharded photo store
+PHOTO_GC_GRACE_HOURS = int(os.getenv("PHOTO_GC_GRACE_HOURS", "24"))
+
+# Offline Attendance Batch Configuration
+OFFLINE_BATCH_MAX_EVENTS = int(os.getenv("OFFLINE_BATCH_MAX_EVENTS", "500"))
+OFFLINE_EVENT_MAX_AGE_HOURS = int(os.getenv("OFFLINE_EVENT_MAX_AGE_HOURS", "12"))  # Longest outage a queued event may sit through
+OFFLINE_KEY_EXPIRE_HOURS = int(os.getenv("OFFLINE_KEY_EXPIRE_HOURS", "24"))  # Lifetime of a key from /offline-key
+OFFLINE_CLOCK_SKEW_SECONDS = int(os.getenv("OFFLINE_CLOCK_SKEW_SECONDS", "300"))
+OFFLINE_EVENT_MAX_BYTES = int(os.getenv("OFFLINE_EVENT_MAX_BYTES", "16384"))  # Longest accepted NDJSON line
+
+# Check-in Journal (write-behind) Configuration
+CHECKIN_JOURNAL_ENABLED = os.getenv("CHECKIN_JOURNAL_ENABLED", "false").lower() == "true"
+CHECKIN_JOURNAL_DIR = os.getenv("CHECKIN_JOURNAL_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "journal"))
+CHECKIN_JOURNAL_BATCH_SIZE = int(os.getenv("CHECKIN_JOURNAL_BATCH_SIZE", "200"))  # Check-ins per database commit
+CHECKIN_JOURNAL_FLUSH_MS = int(os.getenv("CHECKIN_JOURNAL_FLUSH_MS", "200"))  # How long the writer lets a batch fill
+
+# Event-loop Lag Monitor Configuration
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_MONITOR_INTERVAL_MS = int(os.getenv("LOOP_MONITOR_INTERVAL_MS", "50"))  # Heartbeat period
+LOOP_LAG_THRESHOLD_MS = int(os.getenv("LOOP_LAG_THRESHOLD_MS", "200"))  # Lag that counts as a stall
+LOOP_STALL_HISTORY = int(os.getenv("LOOP_STALL_HISTORY", "50"))  # Recent stalls kept with their stack
+METRICS_ADMIN_POSITIONS = [
+    code.strip() for code in os.getenv("METRICS_ADMIN_POSITIONS", "KEPALA_IT").split(",") if code.strip()
+]  # Position codes allowed to read (and reset) /api/metrics
+
+# Idempotency-Key Configuration
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))  # How long completed responses are replayed
+IDEMPOTENCY_LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60"))  # After this an unfinished attempt is abandoned
+IDEMPOTENCY_WAIT_SECONDS = int(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "15"))  # How long a duplicate waits for the first attempt
+
+# Image Pipeline Configuration (review/thumbnail derivatives)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(max(1, min(2, os.cpu_count() or 1)))))
+IMAGE_REVIEW_SIZE = int(os.getenv("IMAGE_REVIEW_SIZE", "1280"))  # max edge in pixels
+IMAGE_THUMB_SIZE = int(os.getenv("IMAGE_THUMB_SIZE", "256"))  # max edge in pixels
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "80"))
+
+# PIN login lockout
+PIN_MAX_ATTEMPTS = int(os.getenv("PIN_MAX_ATTEMPTS", "5"))
+PIN_LOCKOUT_MINUTES = int(os.getenv("PIN_LOCKOUT_MINUTES", "15"))  # First lockout; each further one doubles
+
+# Password hashing pool (bcrypt runs in worker processes, not the request threadpool)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))  # Cost factor; hashes with another cost are replaced on login
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(os.cpu_count() or 1)))
+BCRYPT_QUEUE_LIMIT = int(os.getenv("BCRYPT_QUEUE_LIMIT", str(BCRYPT_WORKERS * 8)))  # In flight before 503
+BCRYPT_RETRY_AFTER_SECONDS = int(os.getenv("BCRYPT_RETRY_AFTER_SECONDS", "2"))
+
+# Verified JWT cache (entries live until the token's exp)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+# Access token revocation (logout); Bloom filter in front of revoked_tokens
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+REVOCATION_SYNC_SECONDS = int(os.getenv("REVOCATION_SYNC_SECONDS", "30"))  # Pick up other processes' revocations
+
+# Authenticated principal cache (identity looked up once per TTL instead of per request)
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+# Attendance sites (locations table, served from an in-memory spatial index)
+LOCATION_SYNC_SECONDS = int(os.getenv("LOCATION_SYNC_SECONDS", "30"))  # Pick up site edits made elsewhere
+LOCATION_ADMIN_POSITIONS = [
+    code.strip() for code in os.getenv("LOCATION_ADMIN_POSITIONS", "KEPALA_IT,KEPALA_ADMIN").split(",") if code.strip()
+]  # Position codes allowed to add/edit/remove sites
+GEOFENCE_BATCH_MAX_CELLS = int(os.getenv("GEOFENCE_BATCH_MAX_CELLS", "1000000"))  # points x sites per NumPy chunk (~8 MB per matrix)
+
+# Public holidays (holidays table, served from memory, refreshed from the API in the background)
+HOLIDAY_API_URL = os.getenv("HOLIDAY_API_URL", "https://api-harilibur.vercel.app/api")
+HOLIDAY_API_TIMEOUT_SECONDS = int(os.getenv("HOLIDAY_API_TIMEOUT_SECONDS", "10"))
+HOLIDAY_MAX_AGE_HOURS = int(os.getenv("HOLIDAY_MAX_AGE_HOURS", "24"))  # Older years are re-fetched (still served meanwhile)
+HOLIDAY_RETRY_MINUTES = int(os.getenv("HOLIDAY_RETRY_MINUTES", "15"))  # Wait after a failed fetch
+
+# Annual leave quotas (positions.annual_leave_quota overrides the default per position)
+ANNUAL_LEAVE_QUOTA = int(os.getenv("ANNUAL_LEAVE_QUOTA", "12"))  # Days per year
+# Prorate the first year by months left (hire month included), taking users.created_at as the hire date
+LEAVE_QUOTA_PRORATE_NEW_HIRES = os.getenv("LEAVE_QUOTA_PRORATE_NEW_HIRES", "false").lower() == "true"
+LEAVE_QUOTA_ROLLOVER_CHUNK = int(os.getenv("LEAVE_QUOTA_ROLLOVER_CHUNK", "1000"))  # Users per INSERT ... SELECT
+LEAVE_AUDIT_POSITIONS = [
+    code.strip() for code in os.getenv("LEAVE_AUDIT_POSITIONS", "KEPALA_HR,STAFF_HR").split(",") if code.strip()
+]  # Position codes allowed to see other users' quota ledgers and the audit
 
 # Settings class for compatibility
 class Settings:
     DATABASE_URL = DATABASE_URL
+    ASYNC_DATABASE_URL = ASYNC_DATABASE_URL
+    DATABASE_REPLICA_URL = DATABASE_REPLICA_URL
+    ASYNC_DATABASE_REPLICA_URL = ASYNC_DATABASE_REPLICA_URL
+    READ_AFTER_WRITE_SECONDS = READ_AFTER_WRITE_SECONDS
+    DB_POOL_SIZE = DB_POOL_SIZE
+    DB_MAX_OVERFLOW = DB_MAX_OVERFLOW
+    DB_POOL_TIMEOUT = DB_POOL_TIMEOUT
+    DB_POOL_RECYCLE = DB_POOL_RECYCLE
+    DB_POOL_PRE_PING = DB_POOL_PRE_PING
     SECRET_KEY = SECRET_KEY
+    PIN_MAX_ATTEMPTS = PIN_MAX_ATTEMPTS
+    PIN_LOCKOUT_MINUTES = PIN_LOCKOUT_MINUTES
+    BCRYPT_ROUNDS = BCRYPT_ROUNDS
+    BCRYPT_WORKERS = BCRYPT_WORKERS
+    BCRYPT_QUEUE_LIMIT = BCRYPT_QUEUE_LIMIT
+    BCRYPT_RETRY_AFTER_SECONDS = BCRYPT_RETRY_AFTER_SECONDS
+    TOKEN_CACHE_SIZE = TOKEN_CACHE_SIZE
+    REVOCATION_BLOOM_CAPACITY = REVOCATION_BLOOM_CAPACITY
+    REVOCATION_BLOOM_ERROR_RATE = REVOCATION_BLOOM_ERROR_RATE
+    REVOCATION_SYNC_SECONDS = REVOCATION_SYNC_SECONDS
+    PRINCIPAL_CACHE_SIZE = PRINCIPAL_CACHE_SIZE
+    PRINCIPAL_CACHE_TTL_SECONDS = PRINCIPAL_CACHE_TTL_SECONDS
+    LOCATION_SYNC_SECONDS = LOCATION_SYNC_SECONDS
+    LOCATION_ADMIN_POSITIONS = LOCATION_ADMIN_POSITIONS
+    GEOFENCE_BATCH_MAX_CELLS = GEOFENCE_BATCH_MAX_CELLS
+    HOLIDAY_API_URL = HOLIDAY_API_URL
+    HOLIDAY_API_TIMEOUT_SECONDS = HOLIDAY_API_TIMEOUT_SECONDS
+    HOLIDAY_MAX_AGE_HOURS = HOLIDAY_MAX_AGE_HOURS
+    HOLIDAY_RETRY_MINUTES = HOLIDAY_RETRY_MINUTES
+    ANNUAL_LEAVE_QUOTA = ANNUAL_LEAVE_QUOTA
+    LEAVE_QUOTA_PRORATE_NEW_HIRES = LEAVE_QUOTA_PRORATE_NEW_HIRES
+    LEAVE_QUOTA_ROLLOVER_CHUNK = LEAVE_QUOTA_ROLLOVER_CHUNK
+    LEAVE_AUDIT_POSITIONS = LEAVE_AUDIT_POSITIONS
     ALGORITHM = ALGORITHM
     ACCESS_TOKEN_EXPIRE_DAYS = ACCESS_TOKEN_EXPIRE_DAYS
     LOKASI_ABSENSI = LOKASI_ABSENSI
@@ -65,5 +200,30 @@ class Settings:
     APP_PORT = APP_PORT
     APP_ENV = APP_ENV
     UPLOAD_DIR = UPLOAD_DIR
+    MAX_PHOTO_SIZE = MAX_PHOTO_SIZE
+    UPLOAD_CHUNK_SIZE = UPLOAD_CHUNK_SIZE
+    PHOTO_STORE_DIR = PHOTO_STORE_DIR
+    PHOTO_GC_GRACE_HOURS = PHOTO_GC_GRACE_HOURS
+    OFFLINE_BATCH_MAX_EVENTS = OFFLINE_BATCH_MAX_EVENTS
+    OFFLINE_EVENT_MAX_AGE_HOURS = OFFLINE_EVENT_MAX_AGE_HOURS
+    OFFLINE_KEY_EXPIRE_HOURS = OFFLINE_KEY_EXPIRE_HOURS
+    OFFLINE_CLOCK_SKEW_SECONDS = OFFLINE_CLOCK_SKEW_SECONDS
+    OFFLINE_EVENT_MAX_BYTES = OFFLINE_EVENT_MAX_BYTES
+    CHECKIN_JOURNAL_ENABLED = CHECKIN_JOURNAL_ENABLED
+    CHECKIN_JOURNAL_DIR = CHECKIN_JOURNAL_DIR
+    CHECKIN_JOURNAL_BATCH_SIZE = CHECKIN_JOURNAL_BATCH_SIZE
+    CHECKIN_JOURNAL_FLUSH_MS = CHECKIN_JOURNAL_FLUSH_MS
+    LOOP_MONITOR_ENABLED = LOOP_MONITOR_ENABLED
+    LOOP_MONITOR_INTERVAL_MS = LOOP_MONITOR_INTERVAL_MS
+    LOOP_LAG_THRESHOLD_MS = LOOP_LAG_THRESHOLD_MS
+    LOOP_STALL_HISTORY = LOOP_STALL_HISTORY
+    METRICS_ADMIN_POSITIONS = METRICS_ADMIN_POSITIONS
+    IDEMPOTENCY_TTL_HOURS = IDEMPOTENCY_TTL_HOURS
+    IDEMPOTENCY_LEASE_SECONDS = IDEMPOTENCY_LEASE_SECONDS
+    IDEMPOTENCY_WAIT_SECONDS = IDEMPOTENCY_WAIT_SECONDS
+    IMAGE_WORKERS = IMAGE_WORKERS
+    IMAGE_REVIEW_SIZE = IMAGE_REVIEW_SIZE
+    IMAGE_THUMB_SIZE = IMAGE_THUMB_SIZE
+    IMAGE_JPEG_QUALITY = IMAGE_JPEG_QUALITY
 
 settings = Settings()
\ No newline at end of file
@@ -1,15 +1,239 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+from sqlalchemy import create_engine, event, func, literal
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from app.config import settings
+from app.utils.pool_metrics import instrument_pool, pool_stats, timed_pool_class
 
-engine = create_engine(settings.DATABASE_URL)
+def pool_options() -> dict:
+    """Pool sizing/health options shared by the sync and async engines"""
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,  # Reconnect before MariaDB's wait_timeout closes idle connections
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,  # Detect connections dropped while idle
+    }
+
+primary_pool_stats = pool_stats("primary")
+engine = create_engine(
+    settings.DATABASE_URL,
+    poolclass=timed_pool_class(QueuePool, primary_pool_stats),
+    **pool_options()
+)
+instrument_pool(engine, primary_pool_stats)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine for `async def` endpoints, so DB waits don't block the event loop.
+# expire_on_commit=False: attributes stay loaded after commit (no implicit IO).
+async_pool_stats = pool_stats("primary_async")
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    poolclass=timed_pool_class(AsyncAdaptedQueuePool, async_pool_stats),
+    **pool_options()
+)
+instrument_pool(async_engine.sync_engine, async_pool_stats)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Read replica engines for heavy list/history endpoints. Without a replica
+# configured they are the primary engines, so the read sessions still work.
+if settings.DATABASE_REPLICA_URL:
+    replica_pool_stats = pool_stats("replica")
+    read_engine = create_engine(
+        settings.DATABASE_REPLICA_URL,
+        poolclass=timed_pool_class(QueuePool, replica_pool_stats),
+        **pool_options()
+    )
+    instrument_pool(read_engine, replica_pool_stats)
+
+    async_replica_pool_stats = pool_stats("replica_async")
+    async_read_engine = create_async_engine(
+        settings.ASYNC_DATABASE_REPLICA_URL,
+        poolclass=timed_pool_class(AsyncAdaptedQueuePool, async_replica_pool_stats),
+        **pool_options()
+    )
+    instrument_pool(async_read_engine.sync_engine, async_replica_pool_stats)
+else:
+    read_engine = engine
+    async_read_engine = async_engine
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+def has_replica() -> bool:
+    return bool(settings.DATABASE_REPLICA_URL)
+
+class ReadRouting:
+    """
+    Read-your-writes for replica reads: after a user's session commits a
+    write, that user's reads stay on the primary for READ_AFTER_WRITE_SECONDS
+    so they don't see a replica that hasn't caught up yet. Commits are
+    attributed to the user the request authenticated as (set_request_user,
+    called by the auth dependencies). Per process, like the rest of the
+    in-memory state.
+    """
+
+    _request_user: ContextVar[Optional[str]] = ContextVar("request_user_id", default=None)
+
+    _lock = threading.Lock()
+    _recent_writes: Dict[str, float] = {}  # user_id -> monotonic time the sticky window ends
+    _MAX_TRACKED = 10000
+
+    @classmethod
+    def set_request_user(cls, user_id: str):
+        """Attribute this request's commits to user_id (call from an async dependency)"""
+        cls._request_user.set(user_id)
+
+    @classmethod
+    def request_user(cls) -> Optional[str]:
+        return cls._request_user.get()
+
+    @classmethod
+    def mark_write(cls, user_id: str):
+        until = time.monotonic() + settings.READ_AFTER_WRITE_SECONDS
+        with cls._lock:
+            if len(cls._recent_writes) >= cls._MAX_TRACKED:
+                now = time.monotonic()
+                cls._recent_writes = {uid: t for uid, t in cls._recent_writes.items() if t > now}
+            cls._recent_writes[user_id] = until
+
+    @classmethod
+    def use_primary(cls, user_id: Optional[str]) -> bool:
+        if not has_replica():
+            return True
+        if user_id is None:
+            return False
+        until = cls._recent_writes.get(user_id)
+        return until is not None and until > time.monotonic()
+
+    @classmethod
+    def session_for(cls, user_id: Optional[str]) -> Session:
+        factory = SessionLocal if cls.use_primary(user_id) else ReadSessionLocal
+        return factory()
+
+    @classmethod
+    def async_session_for(cls, user_id: Optional[str]) -> AsyncSession:
+        factory = AsyncSessionLocal if cls.use_primary(user_id) else AsyncReadSessionLocal
+        return factory()
+
+# Session events fire for AsyncSession too (they run on its sync_session)
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_write(orm_execute_state):
+    # Bulk query.update()/delete() and Core insert/update statements skip the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+@event.listens_for(Session, "after_commit")
+def _remember_writer(session):
+    user_id = ReadRouting.request_user()
+    if session.info.pop("wrote", False) and user_id:
+        ReadRouting.mark_write(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_write(session):
+    session.info.pop("wrote", None)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def upsert(db, table, values: dict, update: dict, index_elements: list):
+    """
+    Build a single-statement insert-or-update for table.
+    Uses INSERT ... ON DUPLICATE KEY UPDATE on MariaDB/MySQL and
+    INSERT ... ON CONFLICT DO UPDATE elsewhere (SQLite for local runs).
+    """
+    if db.get_bind().dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(**values)
+        return stmt.on_duplicate_key_update(**update)
+    
+    from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(table).values(**values)
+    return stmt.on_conflict_do_update(index_elements=index_elements, set_=update)
+
+def insert_missing(db, table, columns: list, select, index_elements: list):
+    """
+    Build a single-statement INSERT ... SELECT that skips rows whose key
+    already exists (filter those out in select too; this only covers a
+    concurrent insert). On MariaDB/MySQL a skipped row still counts in
+    rowcount (the driver reports found rows), so count inserted rows
+    with a query when the number matters.
+    """
+    if db.get_bind().dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).from_select(columns, select)
+        key = index_elements[0]
+        return stmt.on_duplicate_key_update({key: table.c[key]})
+    
+    from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(table).from_select(columns, select)
+    return stmt.on_conflict_do_nothing(index_elements=index_elements)
+
+def new_id(db):
+    """
+    SQL expression for a fresh String(36) id, for rows inserted by
+    INSERT ... SELECT; same 8-4-4-4-12 text as str(uuid.uuid4())
+    """
+    if db.get_bind().dialect.name == "mysql":
+        return func.uuid()
+    
+    # SQLite has no UUID function: a version 4 UUID from randomblob()
+    def hex_digits(n: int):
+        return func.lower(func.hex(func.randomblob(n)))
+    variant = func.substr(literal("89ab"), 1 + func.random().op("&")(3), 1)
+    return (
+        hex_digits(4).concat("-")
+        .concat(hex_digits(2)).concat("-4")
+        .concat(func.substr(hex_digits(2), 2)).concat("-")
+        .concat(variant).concat(func.substr(hex_digits(2), 2)).concat("-")
+        .concat(hex_digits(6))
+    )
+
+def upsert_rows(db, table, update_columns: list, index_elements: list):
+    """
+    upsert() for executemany: execute the statement with a list of row
+    dicts; on a key conflict update_columns take the new row's values.
+    """
+    if db.get_bind().dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        return stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in update_columns})
+    
+    from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={column: stmt.excluded[column] for column in update_columns}
+    )
+
+def insert_new_rows(db, table):
+    """
+    INSERT for executemany that skips rows whose primary or unique key
+    already exists (a no-op ON DUPLICATE KEY UPDATE on MariaDB/MySQL,
+    ON CONFLICT DO NOTHING elsewhere)
+    """
+    if db.get_bind().dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        key = table.primary_key.columns.values()[0].name
+        return insert(table).on_duplicate_key_update({key: table.c[key]})
+    
+    from sqlalchemy.dialects.sqlite import insert
+    return insert(table).on_conflict_do_nothing()
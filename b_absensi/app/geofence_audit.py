@@ -0,0 +1,140 @@
+"""
+Re-check stored attendance coordinates against the current attendance sites
+and write the mismatches as CSV.
+
+    python -m app.geofence_audit --start 2024-01-01 --end 2024-06-30 -o mismatches.csv
+
+A check-in/check-out is a mismatch when its coordinates are inside no
+active site, or outside the recorded site but inside another one (a point
+inside the recorded site is fine even where sites overlap). Rows are
+read in id order, --batch-size at a time (from the read replica when one
+is configured), and evaluated with LocationService.locate_batch.
+distance_km is how far outside the nearest site's boundary the point is.
+"""
+import argparse
+import csv
+import logging
+import sys
+import time
+from datetime import date
+from typing import Optional
+from sqlalchemy import select
+from app.database import ReadSessionLocal
+from app.models.absensi import Attendance
+from app.services.location_service import LocationService
+
+logger = logging.getLogger(__name__)
+
+CSV_COLUMNS = [
+    "attendance_id", "user_id", "work_date", "event",
+    "latitude", "longitude", "recorded_location",
+    "matched_location", "nearest_location", "distance_km", "reason",
+]
+
+EVENTS = (
+    ("check_in", Attendance.check_in_latitude, Attendance.check_in_longitude, Attendance.check_in_location),
+    ("check_out", Attendance.check_out_latitude, Attendance.check_out_longitude, Attendance.check_out_location),
+)
+
+def _pages(db, batch_size: int, start: Optional[date], end: Optional[date]):
+    """Attendance rows in keyset pages by id (no long-lived server cursor)"""
+    # id, user_id, work_date, then (latitude, longitude, location) per event
+    columns = [Attendance.id, Attendance.user_id, Attendance.work_date]
+    for _, lat, lon, location in EVENTS:
+        columns += [lat, lon, location]
+
+    last_id = None
+    while True:
+        query = select(*columns).order_by(Attendance.id).limit(batch_size)
+        if start is not None:
+            query = query.where(Attendance.work_date >= start)
+        if end is not None:
+            query = query.where(Attendance.work_date <= end)
+        if last_id is not None:
+            query = query.where(Attendance.id > last_id)
+
+        rows = db.execute(query).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+def audit(db, out, batch_size: int = 50000, start: Optional[date] = None, end: Optional[date] = None) -> dict:
+    """Write mismatches to out (a text stream) as CSV; returns counts"""
+    writer = csv.writer(out)
+    writer.writerow(CSV_COLUMNS)
+    counts = {"attendances": 0, "checked": 0, "outside": 0, "different_site": 0}
+
+    for rows in _pages(db, batch_size, start, end):
+        counts["attendances"] += len(rows)
+        for k, (event, *_) in enumerate(EVENTS):
+            lat_at, lon_at, location_at = 3 + 3 * k, 4 + 3 * k, 5 + 3 * k
+            events = [row for row in rows if row[lat_at] is not None and row[lon_at] is not None]
+            if not events:
+                continue
+            counts["checked"] += len(events)
+            inside = LocationService.inside_named_batch(
+                [row[location_at] for row in events],
+                [row[lat_at] for row in events],
+                [row[lon_at] for row in events]
+            )
+            events = [row for row, ok in zip(events, inside.tolist()) if not ok]
+            if not events:
+                continue
+            latitudes = [row[lat_at] for row in events]
+            longitudes = [row[lon_at] for row in events]
+            result = LocationService.locate_batch(latitudes, longitudes)
+            names = result.names()
+
+            for i, row in enumerate(events):
+                recorded = row[location_at]
+                valid = bool(result.is_valid[i])
+                reason = "different_site" if valid else "outside"
+                counts[reason] += 1
+                writer.writerow([
+                    row.id,
+                    row.user_id,
+                    row.work_date.isoformat() if row.work_date else "",
+                    event,
+                    latitudes[i],
+                    longitudes[i],
+                    recorded or "",
+                    names[i] if valid else "",
+                    "" if valid else names[i],
+                    round(float(result.distance[i]), 3),
+                    reason,
+                ])
+
+    return counts
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.geofence_audit",
+        description="Write attendances whose stored coordinates don't match the current sites as CSV"
+    )
+    parser.add_argument("--start", type=date.fromisoformat, help="First work_date (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last work_date (YYYY-MM-DD)")
+    parser.add_argument("-o", "--output", default="-", help="CSV file (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=50000, help="Attendance rows per query")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    db = ReadSessionLocal()
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        LocationService.reload(db)
+        started = time.perf_counter()
+        counts = audit(db, out, args.batch_size, args.start, args.end)
+        logger.info(
+            f"Geofence audit: {counts['attendances']} attendances, {counts['checked']} events checked, "
+            f"{counts['outside']} outside every site, {counts['different_site']} at a different site "
+            f"({time.perf_counter() - started:.1f}s)"
+        )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
-from .auth_middleware import get_current_user
+from .auth_middleware import get_current_principal, get_current_user, get_current_user_async, get_read_db, get_async_read_db
+from .loop_monitor_middleware import LoopMonitorMiddleware
 
-__all__ = ['get_current_user']
+__all__ = ['get_current_principal', 'get_current_user', 'get_current_user_async', 'get_read_db', 'get_async_read_db', 'LoopMonitorMiddleware']
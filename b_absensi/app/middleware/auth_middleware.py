@@ -1,34 +1,91 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import ReadRouting, get_db, get_async_db
 from app.models import User
+from app.services.principal_service import Principal, PrincipalService
+from app.services.token_revocation_service import TokenRevocationService
 from app.utils import decode_token
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
-def get_current_user(
-    credentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user from JWT token"""
+def _access_token_payload(credentials) -> dict:
+    """Validate the bearer token and return its payload (with a subject)"""
     token = credentials.credentials
     
     payload = decode_token(token)
-    if not payload:
+    if not payload or payload.get("type") != "access":
+        # Refresh tokens are only accepted by /api/auth/refresh
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token"
         )
     
-    user_id = payload.get("sub")
-    if not user_id:
+    if not payload.get("sub"):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token payload"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    return payload
+
+def get_optional_token_payload(credentials = Depends(optional_security)) -> Optional[dict]:
+    """Payload of a valid access token, or None when no bearer token was sent"""
+    if credentials is None:
+        return None
+    return _access_token_payload(credentials)
+
+async def get_current_principal(
+    credentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> Principal:
+    """
+    Authenticated user's identity, from the principal cache when possible.
+    Use this when a handler only needs id/name/nip/department; the
+    AsyncSession is only used on a cache miss or a probable revocation.
+    """
+    payload = _access_token_payload(credentials)
+    
+    # Bloom filter lookup; only a probable hit queries revoked_tokens
+    if await TokenRevocationService.is_revoked(db, payload.get("jti")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked"
+        )
+    
+    principal = await PrincipalService.get(db, payload["sub"])
+    if not principal:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    
+    ReadRouting.set_request_user(principal.id)  # Writes in this request pin the user's reads to the primary
+    return principal
+
+def get_current_user(
+    principal: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+) -> User:
+    """Get current authenticated user as an ORM object (one query)"""
+    user = db.get(User, principal.id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    
+    return user
+
+async def get_current_user_async(
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """get_current_user for endpoints on AsyncSession"""
+    user = await db.get(User, principal.id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -36,3 +93,19 @@ def get_current_user(
         )
     
     return user
+
+def get_read_db(principal: Principal = Depends(get_current_principal)):
+    """
+    Session for read-only endpoints: the replica, or the primary while
+    the user is inside their read-after-write window
+    """
+    db = ReadRouting.session_for(principal.id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(principal: Principal = Depends(get_current_principal)):
+    """get_read_db for endpoints on AsyncSession"""
+    async with ReadRouting.async_session_for(principal.id) as db:
+        yield db
@@ -0,0 +1,24 @@
+import asyncio
+from app.services.loop_monitor_service import LoopMonitorService
+
+class LoopMonitorMiddleware:
+    """
+    Pure ASGI middleware (runs the endpoint in the same task) that tells
+    the loop monitor which request each task is serving, so event-loop
+    stalls can be attributed to a route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        task = asyncio.current_task()
+        LoopMonitorService.request_started(task, scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            LoopMonitorService.request_finished(task)
@@ -1,9 +1,21 @@
 from .user import User, UserRole, Position, PositionCategory, user_positions
-from .absensi import Attendance, AttendanceStatus, Leave, LeaveStatus, LeaveType, LeaveCategory, LeaveQuota, Task, TaskStatus
+from .absensi import Attendance, AttendanceStatus, PhotoBlob, Leave, LeaveStatus, LeaveType, LeaveCategory, LeaveQuota, Task, TaskStatus
+from .idempotency import IdempotencyKey
+from .refresh_token import RefreshToken
+from .revoked_token import RevokedToken
+from .location import Location
+from .holiday import Holiday
+from .leave_ledger import LeaveQuotaEntry, LeaveQuotaSnapshot
 
 __all__ = [
     'User', 'UserRole', 'Position', 'PositionCategory', 'user_positions',
-    'Attendance', 'AttendanceStatus', 
+    'Attendance', 'AttendanceStatus', 'PhotoBlob',
     'Leave', 'LeaveStatus', 'LeaveType', 'LeaveCategory', 'LeaveQuota',
-    'Task', 'TaskStatus'
+    'Task', 'TaskStatus',
+    'IdempotencyKey',
+    'RefreshToken',
+    'RevokedToken',
+    'Location',
+    'Holiday',
+    'LeaveQuotaEntry', 'LeaveQuotaSnapshot'
 ]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, DateTime, Enum, ForeignKey, Integer, Text, Boolean
+from sqlalchemy import Column, String, Float, DateTime, Date, Enum, ForeignKey, Integer, Text, Boolean, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -24,24 +24,55 @@ class Attendance(Base):
     user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
     
     check_in_time = Column(DateTime, nullable=False)
+    # Jakarta-local calendar day of check_in_time; unique per user so the
+    # database rejects a second check-in on the same day. Nullable only for
+    # legacy duplicate rows left unkeyed by migration 003.
+    work_date = Column(Date, nullable=True)
     check_in_latitude = Column(Float, nullable=False)
     check_in_longitude = Column(Float, nullable=False)
     check_in_location = Column(String(255), nullable=False)
     check_in_photo_url = Column(String(512))
+    check_in_photo_review_url = Column(String(512), nullable=True)  # Downscaled, EXIF-stripped copy
+    check_in_photo_thumb_url = Column(String(512), nullable=True)
+    check_in_photo_width = Column(Integer, nullable=True)  # Review image size in pixels
+    check_in_photo_height = Column(Integer, nullable=True)
     
     check_out_time = Column(DateTime, nullable=True)
     check_out_latitude = Column(Float, nullable=True)
     check_out_longitude = Column(Float, nullable=True)
     check_out_location = Column(String(255), nullable=True)
     check_out_photo_url = Column(String(512), nullable=True)
+    check_out_photo_review_url = Column(String(512), nullable=True)
+    check_out_photo_thumb_url = Column(String(512), nullable=True)
+    check_out_photo_width = Column(Integer, nullable=True)
+    check_out_photo_height = Column(Integer, nullable=True)
     
     required_checkout_time = Column(DateTime, nullable=False)  # Waktu checkout yang seharusnya
     status = Column(String(20), default="on_time")
     notes = Column(String(1024), nullable=True)
+    # Times taken from the app's offline queue (/attendance/batch), not the server clock
+    check_in_offline = Column(Boolean, default=False, nullable=False)
+    check_out_offline = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, default=get_jakarta_time)
     updated_at = Column(DateTime, default=get_jakarta_time, onupdate=get_jakarta_time)
     
     user = relationship("User", back_populates="attendances")
+    
+    __table_args__ = (
+        UniqueConstraint('user_id', 'work_date', name='uq_attendances_user_work_date'),
+        Index('idx_attendances_work_date', 'work_date'),
+        Index('idx_attendances_user_check_in', 'user_id', 'check_in_time', 'id'),  # History keyset pagination
+    )
+
+class PhotoBlob(Base):
+    """Content-addressed photo file with a count of attendance references"""
+    __tablename__ = "photo_blobs"
+    
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String(255), nullable=False)  # Relative to UPLOAD_DIR, e.g. photos/ab/cd/<sha256>.jpg
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=get_jakarta_time)
+    updated_at = Column(DateTime, default=get_jakarta_time, onupdate=get_jakarta_time)
 
 class LeaveType(str, enum.Enum):
     CUTI = "cuti"  # Annual leave - 12 days/year
@@ -133,6 +164,7 @@ class LeaveQuota(Base):
     
     __table_args__ = (
         # Unique constraint: one quota record per user per year
+        UniqueConstraint('user_id', 'year', name='unique_user_year'),
         {'sqlite_autoincrement': True},
     )
 
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, String, DateTime, Date, Integer
+from datetime import datetime
+import pytz
+from app.database import Base
+
+TZ = pytz.timezone('Asia/Jakarta')
+
+def get_jakarta_time():
+    return datetime.now(TZ)
+
+class Holiday(Base):
+    """Public holiday (hari libur nasional); excluded from leave working days"""
+    __tablename__ = "holidays"
+    
+    holiday_date = Column(Date, primary_key=True)
+    year = Column(Integer, nullable=False, index=True)
+    name = Column(String(255), nullable=False)
+    source = Column(String(10), nullable=False, default="seed")  # seed, api or manual (never overwritten by the API)
+    updated_at = Column(DateTime, default=get_jakarta_time, onupdate=get_jakarta_time, nullable=False)
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, Text, UniqueConstraint
+from datetime import datetime
+import uuid
+import pytz
+from app.database import Base
+
+TZ = pytz.timezone('Asia/Jakarta')
+
+def get_jakarta_time():
+    return datetime.now(TZ)
+
+class IdempotencyKey(Base):
+    """Stored outcome of a request sent with an Idempotency-Key header"""
+    __tablename__ = "idempotency_keys"
+    
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    key = Column(String(255), nullable=False)  # Client-chosen, unique per user
+    scope = Column(String(100), nullable=False)  # Endpoint the key was first used on
+    status = Column(String(20), nullable=False, default="in_progress")  # in_progress, completed
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)  # JSON
+    created_at = Column(DateTime, default=get_jakarta_time)
+    expires_at = Column(DateTime, nullable=False, index=True)  # Lease while in progress, TTL once completed
+    
+    __table_args__ = (
+        UniqueConstraint('user_id', 'key', name='uq_idempotency_keys_user_key'),
+    )
@@ -0,0 +1,44 @@
+from sqlalchemy import Column, String, DateTime, Integer, BigInteger, ForeignKey, Index
+from datetime import datetime
+import pytz
+from app.database import Base
+
+TZ = pytz.timezone('Asia/Jakarta')
+
+def get_jakarta_time():
+    return datetime.now(TZ)
+
+class LeaveQuotaEntry(Base):
+    """
+    Append-only ledger of leave quota changes; rows are never updated or
+    deleted. A user's year is the sum of its entries: quota = sum of
+    quota_change, used = sum of used_change, remaining = quota - used.
+    """
+    __tablename__ = "leave_quota_entries"
+
+    # Increasing id = ledger order; snapshots cover entries up to an id
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    year = Column(Integer, nullable=False)
+    kind = Column(String(10), nullable=False)  # grant, debit (leave submitted) or credit (leave refunded)
+    quota_change = Column(Integer, nullable=False, default=0)
+    used_change = Column(Integer, nullable=False, default=0)
+    leave_id = Column(String(36), ForeignKey("leaves.id"), nullable=True)  # debits and credits
+    created_at = Column(DateTime, default=get_jakarta_time, nullable=False)
+
+    __table_args__ = (
+        Index('idx_leave_quota_entries_user_year', 'user_id', 'year', 'id'),  # Balance tail
+        Index('idx_leave_quota_entries_leave', 'leave_id'),
+        {'sqlite_autoincrement': True},
+    )
+
+class LeaveQuotaSnapshot(Base):
+    """Ledger totals of a user's year up to last_entry_id, refreshed periodically"""
+    __tablename__ = "leave_quota_snapshots"
+
+    user_id = Column(String(36), ForeignKey("users.id"), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    last_entry_id = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False)
+    quota = Column(Integer, nullable=False)
+    used = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=get_jakarta_time, onupdate=get_jakarta_time, nullable=False)
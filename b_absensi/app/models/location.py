@@ -0,0 +1,25 @@
+from sqlalchemy import Column, String, Boolean, DateTime, Float, Text
+from datetime import datetime
+import uuid
+import pytz
+from app.database import Base
+
+TZ = pytz.timezone('Asia/Jakarta')
+
+def get_jakarta_time():
+    return datetime.now(TZ)
+
+class Location(Base):
+    """Site where check-in/check-out is allowed (geofence)"""
+    __tablename__ = "locations"
+    
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    name = Column(String(255), unique=True, nullable=False)
+    latitude = Column(Float, nullable=False)  # Centre of a circular site; reference point of a polygon site
+    longitude = Column(Float, nullable=False)
+    radius = Column(Float, nullable=True)  # dalam km; circular site
+    boundary = Column(Text, nullable=True)  # GeoJSON Polygon/MultiPolygon ([lon, lat]); replaces radius when set
+    address = Column(Text, nullable=True)
+    is_active = Column(Boolean, default=True, nullable=False)
+    created_at = Column(DateTime, default=get_jakarta_time)
+    updated_at = Column(DateTime, default=get_jakarta_time, onupdate=get_jakarta_time, nullable=False)
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey
+from datetime import datetime
+import uuid
+import pytz
+from app.database import Base
+
+TZ = pytz.timezone('Asia/Jakarta')
+
+def get_jakarta_time():
+    return datetime.now(TZ)
+
+class RefreshToken(Base):
+    """
+    Issued refresh token (the JWT's jti). Each refresh rotates to a new row
+    in the same family; presenting a used token again revokes the family.
+    """
+    __tablename__ = "refresh_tokens"
+    
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))  # jti
+    user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    family_id = Column(String(36), nullable=False, index=True)  # All rotations of one login
+    replaced_by_id = Column(String(36), nullable=True)
+    created_at = Column(DateTime, default=get_jakarta_time)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    used_at = Column(DateTime, nullable=True)  # Rotated
+    revoked_at = Column(DateTime, nullable=True)
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, DateTime
+from datetime import datetime
+import pytz
+from app.database import Base
+
+TZ = pytz.timezone('Asia/Jakarta')
+
+def get_jakarta_time():
+    return datetime.now(TZ)
+
+class RevokedToken(Base):
+    """Access token (by jti) rejected before its expiry, e.g. after logout"""
+    __tablename__ = "revoked_tokens"
+    
+    jti = Column(String(36), primary_key=True)
+    user_id = Column(String(36), nullable=True, index=True)
+    revoked_at = Column(DateTime, default=get_jakarta_time, nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)  # The token's exp; row can be pruned after this
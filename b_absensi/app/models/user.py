@@ -46,6 +46,7 @@ class Position(Base):
     department = Column(String(255), nullable=True)  # e.g., "IT", "HR", "Fakultas Teknik"
     level = Column(Integer, default=1)  # 1=staff/dosen, 2=kepala, 3=dekan/direktur, etc
     approver_position_id = Column(String(36), ForeignKey('positions.id'), nullable=True)  # Who approves leaves for this position
+    annual_leave_quota = Column(Integer, nullable=True)  # Days per year; NULL = ANNUAL_LEAVE_QUOTA
     created_at = Column(DateTime, default=get_jakarta_time)
     
     users = relationship("User", secondary=user_positions, back_populates="positions")
@@ -61,6 +62,8 @@ class User(Base):
     nip = Column(String(50), unique=True, nullable=False, index=True)
     department = Column(String(255))  # Main department
     pin_hash = Column(String(255), nullable=True)
+    pin_failed_attempts = Column(Integer, default=0, nullable=False)
+    pin_locked_until = Column(DateTime, nullable=True)
     is_active = Column(Boolean, default=True)
     supervisor_id = Column(String(36), ForeignKey('users.id'), nullable=True)  # Direct supervisor
     created_at = Column(DateTime, default=get_jakarta_time)
@@ -4,9 +4,9 @@ from app.database import get_db
 from app.schemas import AttendanceResponse, AttendanceHistory
 from app.models import Attendance
 from app.services import LocationService
+from app.services.photo_store_service import PhotoStoreService
 from app.middleware.auth_middleware import get_current_user
 from datetime import datetime, time
-import os
 
 router = APIRouter()
 
@@ -60,16 +60,8 @@ async def check_in(
     # Calculate required checkout time
     required_checkout = calculate_required_checkout(now)
     
-    # Save photo with user folder and formatted filename
-    # Format: YYYY-MM-DD_HH-MM-SS_DayName_checkin.jpg
-    day_name = now.strftime('%A')  # Monday, Tuesday, etc
-    photo_filename = now.strftime(f'%Y-%m-%d_%H-%M-%S_{day_name}_checkin.jpg')
-    user_photo_dir = os.path.join("uploads", "photos", str(current_user.id))
-    os.makedirs(user_photo_dir, exist_ok=True)
-    photo_path = os.path.join(user_photo_dir, photo_filename)
-    
-    with open(photo_path, "wb") as f:
-        f.write(await photo.read())
+    # Save photo in the content-addressed photo store
+    photo_path = await PhotoStoreService.store(photo)
     
     # Determine status based on check-in time
     check_in_hour_minute = now.time()
@@ -83,6 +75,7 @@ async def check_in(
     attendance = Attendance(
         user_id=current_user.id,
         check_in_time=now,
+        work_date=now.date(),
         check_in_latitude=latitude,
         check_in_longitude=longitude,
         check_in_location=location_name,
@@ -91,6 +84,7 @@ async def check_in(
         status=attendance_status
     )
     
+    PhotoStoreService.add_ref(db, photo_path)
     db.add(attendance)
     db.commit()
     db.refresh(attendance)
@@ -141,16 +135,8 @@ async def check_out(
             detail=f"Lokasi tidak valid. Lokasi terdekat: {nearest['name']} ({nearest['distance']:.0f}m)"
         )
     
-    # Save photo with user folder and formatted filename
-    # Format: YYYY-MM-DD_HH-MM-SS_DayName_checkout.jpg
-    day_name = now.strftime('%A')  # Monday, Tuesday, etc
-    photo_filename = now.strftime(f'%Y-%m-%d_%H-%M-%S_{day_name}_checkout.jpg')
-    user_photo_dir = os.path.join("uploads", "photos", str(current_user.id))
-    os.makedirs(user_photo_dir, exist_ok=True)
-    photo_path = os.path.join(user_photo_dir, photo_filename)
-    
-    with open(photo_path, "wb") as f:
-        f.write(await photo.read())
+    # Save photo in the content-addressed photo store
+    photo_path = await PhotoStoreService.store(photo)
     
     # Update attendance
     attendance.check_out_time = now
@@ -159,6 +145,7 @@ async def check_out(
     attendance.check_out_location = location_name
     attendance.check_out_photo_url = photo_path
     attendance.status = "checked_out"
+    PhotoStoreService.add_ref(db, photo_path)
     
     db.commit()
     db.refresh(attendance)
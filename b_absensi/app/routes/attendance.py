@@ -1,51 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, status, UploadFile, File, Form
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, time, date, timedelta
 from typing import Optional
-import os
-import uuid
+import base64
+import json
 import pytz
-from app.database import get_db
-from app.models.user import User
+from app.config import settings
+from app.database import get_db, get_async_db
 from app.models.absensi import Attendance, AttendanceStatus
-from app.schemas.absensi import AttendanceResponse, AttendanceHistory
+from app.schemas.absensi import AttendanceResponse, AttendanceHistory, OfflineAttendanceEvent
 from app.services.location_service import LocationService
 from app.services.auto_checkout_service import AutoCheckoutService
-from app.middleware.auth_middleware import get_current_user
+from app.services.photo_store_service import PhotoStoreService
+from app.services.image_pipeline_service import ImagePipelineService
+from app.services.idempotency_service import IdempotencyService
+from app.services.checkin_journal_service import CheckinJournalService
+from app.services.token_revocation_service import TokenRevocationService
+from app.middleware.auth_middleware import get_current_principal, get_read_db
+from app.services.principal_service import Principal
+from app.utils import create_offline_key, decode_offline_key, verify_offline_signature
+from app.utils.timezone import to_jakarta_time, utc_to_jakarta
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
 TZ = pytz.timezone('Asia/Jakarta')
 
 def get_jakarta_time():
     """Get current datetime in Asia/Jakarta timezone"""
     return datetime.now(TZ)
 
-def save_photo(file: UploadFile) -> str:
-    """Save uploaded photo"""
-    try:
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-        ext = os.path.splitext(file.filename)[1]
-        filename = f"attendance_{uuid.uuid4()}{ext}"
-        filepath = os.path.join(UPLOAD_DIR, filename)
-        
-        # Read file content
-        content = file.file.read()
-        
-        # Write to disk
-        with open(filepath, "wb") as f:
-            f.write(content)
-        
-        # Reset file pointer
-        file.file.seek(0)
-        
-        return filename
-    except Exception as e:
-        print(f"Error saving photo: {e}")
-        raise Exception(f"Gagal menyimpan foto: {str(e)}")
-
 def calculate_required_checkout(check_in_time: datetime) -> datetime:
     """
     Calculate required checkout time based on check-in time (Jakarta timezone):
@@ -62,74 +51,122 @@ def calculate_required_checkout(check_in_time: datetime) -> datetime:
         # All other times (8:00-10:00 or after 10:00) -> Check out at 19:00
         return TZ.localize(datetime.combine(today, time(19, 0)))
 
+def determine_status(check_in_time: datetime) -> AttendanceStatus:
+    """Any check-in after 7:30 (Jakarta time) is marked as late"""
+    if check_in_time.time() <= time(7, 30):
+        return AttendanceStatus.ON_TIME
+    return AttendanceStatus.LATE
+
 @router.post("/check-in", response_model=AttendanceResponse)
 async def check_in(
     latitude: float = Form(...),
     longitude: float = Form(...),
     location: str = Form(...),
     photo: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
+    background_tasks: BackgroundTasks = None,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Check in with GPS and photo"""
-    # Check if already checked in today
-    today = date.today()
-    existing = db.query(Attendance).filter(
-        and_(
-            Attendance.user_id == current_user.id,
-            func.date(Attendance.check_in_time) == today
-        )
-    ).first()
-    
-    if existing:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Anda sudah check-in hari ini"
+    # A resend with the same Idempotency-Key gets the first response back
+    # without re-validating the location or storing the photo again
+    replay = await IdempotencyService.begin(db, current_user.id, idempotency_key, "attendance.check_in")
+    if replay is not None:
+        return replay
+        
+    try:
+        # Check time in Jakarta timezone; the work day key is derived from it
+        check_in_time = get_jakarta_time()
+        today = check_in_time.date()
+        
+        # Cheap index lookup so obvious duplicates don't upload a photo;
+        # the unique (user_id, work_date) index is the real guard below
+        existing = db.query(Attendance.id).filter(
+            and_(
+                Attendance.user_id == current_user.id,
+                Attendance.work_date == today
+            )
+        ).first()
+        
+        if existing or CheckinJournalService.get_pending(current_user.id, today):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Anda sudah check-in hari ini"
+            )
+        
+        # Validate location
+        match = LocationService.locate(latitude, longitude)
+        if not match.is_valid:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Lokasi Anda tidak valid untuk check-in. Lokasi terdekat: {LocationService.describe_mismatch(match)}"
+            )
+        location_name = match.name
+        
+        # Save photo (deduplicated by content)
+        photo_path = await PhotoStoreService.store(photo)
+        
+        # Determine status
+        status_value = determine_status(check_in_time)
+        
+        # Calculate required checkout time
+        required_checkout = calculate_required_checkout(check_in_time)
+        
+        # Create attendance
+        attendance = Attendance(
+            user_id=current_user.id,
+            check_in_time=check_in_time,
+            work_date=today,
+            check_in_latitude=latitude,
+            check_in_longitude=longitude,
+            check_in_location=location_name,
+            check_in_photo_url=photo_path,
+            required_checkout_time=required_checkout,
+            status=status_value
         )
-    
-    # Validate location
-    is_valid, location_name = LocationService.validate_location(latitude, longitude)
-    if not is_valid:
-        nearest = LocationService.get_nearest_location(latitude, longitude)
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Lokasi Anda tidak valid untuk check-in. Lokasi terdekat: {nearest['name']} ({nearest['distance']} km)"
+        
+        if CheckinJournalService.enabled():
+            # Write-behind mode: durable in the local journal now, in
+            # attendances once the journal writer commits its next batch
+            await run_in_threadpool(CheckinJournalService.submit, attendance)
+            response = AttendanceResponse.model_validate(attendance)
+            if idempotency_key:
+                IdempotencyService.complete(db, current_user.id, idempotency_key, response)
+                db.commit()
+            
+            background_tasks.add_task(
+                CheckinJournalService.run_after_write, attendance.id,
+                ImagePipelineService.process_attendance_photo, attendance.id, "check_in", photo_path
+            )
+            return response
+        
+        PhotoStoreService.add_ref(db, photo_path)
+        db.add(attendance)
+        try:
+            db.flush()
+        except IntegrityError:
+            # A concurrent request already checked in for this work day;
+            # the unreferenced photo is left to photo store garbage collection
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Anda sudah check-in hari ini"
+            )
+        
+        response = AttendanceResponse.model_validate(attendance)
+        IdempotencyService.complete(db, current_user.id, idempotency_key, response)
+        db.commit()
+        
+        # Review/thumbnail derivatives are built after the response is sent
+        background_tasks.add_task(
+            ImagePipelineService.process_attendance_photo, attendance.id, "check_in", photo_path
         )
-    
-    # Save photo
-    photo_filename = save_photo(photo)
-    
-    # Check time and calculate status (Jakarta timezone)
-    check_in_time = get_jakarta_time()
-    current_time = check_in_time.time()
-    
-    # Determine status
-    if current_time <= time(7, 30):
-        status_value = AttendanceStatus.ON_TIME
-    else:
-        # Any check-in after 7:30 is marked as late
-        status_value = AttendanceStatus.LATE
-    
-    # Calculate required checkout time
-    required_checkout = calculate_required_checkout(check_in_time)
-    
-    # Create attendance
-    attendance = Attendance(
-        user_id=current_user.id,
-        check_in_time=check_in_time,
-        check_in_latitude=latitude,
-        check_in_longitude=longitude,
-        check_in_location=location_name,
-        check_in_photo_url=photo_filename,
-        required_checkout_time=required_checkout,
-        status=status_value
-    )
-    
-    db.add(attendance)
-    db.commit()
-    db.refresh(attendance)
-    
-    return AttendanceResponse.model_validate(attendance)
+        
+        return response
+    except Exception:
+        await IdempotencyService.release(db, current_user.id, idempotency_key)
+        raise
 
 @router.post("/check-out", response_model=AttendanceResponse)
 async def check_out(
@@ -137,17 +174,24 @@ async def check_out(
     longitude: float = Form(...),
     location: str = Form(...),
     photo: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
+    background_tasks: BackgroundTasks = None,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Check out with GPS and photo"""
+    replay = await IdempotencyService.begin(db, current_user.id, idempotency_key, "attendance.check_out")
+    if replay is not None:
+        return replay
+    
     try:
         # Find today's attendance
-        today = date.today()
+        today = get_jakarta_time().date()
+        await CheckinJournalService.flush_user(current_user.id, today)
         attendance = db.query(Attendance).filter(
             and_(
                 Attendance.user_id == current_user.id,
-                func.date(Attendance.check_in_time) == today
+                Attendance.work_date == today
             )
         ).first()
         
@@ -165,8 +209,9 @@ async def check_out(
         
         # Check if it's time to check out
         now = get_jakarta_time()
-        if now < attendance.required_checkout_time:
-            diff = attendance.required_checkout_time - now
+        required_checkout = to_jakarta_time(attendance.required_checkout_time)
+        if now < required_checkout:
+            diff = required_checkout - now
             hours = int(diff.total_seconds() // 3600)
             minutes = int((diff.total_seconds() % 3600) // 60)
             raise HTTPException(
@@ -175,41 +220,346 @@ async def check_out(
             )
         
         # Validate location
-        is_valid, location_name = LocationService.validate_location(latitude, longitude)
-        if not is_valid:
-            nearest = LocationService.get_nearest_location(latitude, longitude)
+        match = LocationService.locate(latitude, longitude)
+        if not match.is_valid:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Lokasi Anda tidak valid untuk check-out. Lokasi terdekat: {nearest['name']} ({nearest['distance']} km)"
+                detail=f"Lokasi Anda tidak valid untuk check-out. Lokasi terdekat: {LocationService.describe_mismatch(match)}"
             )
+        location_name = match.name
         
-        # Save photo
-        photo_filename = save_photo(photo)
+        # Save photo (deduplicated by content)
+        photo_path = await PhotoStoreService.store(photo)
         
         # Update attendance
         attendance.check_out_time = now
         attendance.check_out_latitude = latitude
         attendance.check_out_longitude = longitude
         attendance.check_out_location = location_name
-        attendance.check_out_photo_url = photo_filename
+        attendance.check_out_photo_url = photo_path
+        PhotoStoreService.add_ref(db, photo_path)
+        db.flush()
+        db.refresh(attendance)
         
+        response = AttendanceResponse.model_validate(attendance)
+        IdempotencyService.complete(db, current_user.id, idempotency_key, response)
         db.commit()
-        db.refresh(attendance)
         
-        return AttendanceResponse.model_validate(attendance)
+        # Review/thumbnail derivatives are built after the response is sent
+        background_tasks.add_task(
+            ImagePipelineService.process_attendance_photo, attendance.id, "check_out", photo_path
+        )
+        
+        return response
     except HTTPException:
+        await IdempotencyService.release(db, current_user.id, idempotency_key)
         raise
     except Exception as e:
         db.rollback()
+        await IdempotencyService.release(db, current_user.id, idempotency_key)
         print(f"Check-out error: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Gagal check-out: {str(e)}"
         )
 
+@router.get("/offline-key")
+def get_offline_key(
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    New key for signing queued offline events sent to /batch; fetch one
+    while online. Events must carry its key_id, may not predate issued_at
+    and must be synced before expires_at.
+    """
+    issued = create_offline_key(current_user.id)
+    return {
+        "key": issued["key"],
+        "key_id": issued["key_id"],
+        "algorithm": "HMAC-SHA256",
+        "issued_at": utc_to_jakarta(issued["issued_at"]),
+        "expires_at": utc_to_jakarta(issued["expires_at"]),
+    }
+
+def _parse_event_lines(lines) -> list:
+    """JSON-decode NDJSON lines; undecodable lines become error strings"""
+    events = []
+    for line in lines:
+        _check_line_size(line)
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            event = json.loads(line)
+            events.append(event if isinstance(event, dict) else "Event must be a JSON object")
+        except ValueError:
+            events.append("Invalid JSON")
+    return events
+
+def _check_line_size(line):
+    if len(line) > settings.OFFLINE_EVENT_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Event melebihi batas {settings.OFFLINE_EVENT_MAX_BYTES} byte"
+        )
+
+def _check_batch_size(events: list):
+    if len(events) > settings.OFFLINE_BATCH_MAX_EVENTS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Maksimal {settings.OFFLINE_BATCH_MAX_EVENTS} event per batch"
+        )
+
+async def _read_offline_batch(request: Request):
+    """
+    Return (events, photos) from the request body:
+    - application/x-ndjson: one event per line, streamed
+    - multipart/form-data: "events" field (NDJSON or JSON array) plus photo files
+    """
+    photos = {}
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        for field, value in form.multi_items():
+            if isinstance(value, StarletteUploadFile):
+                photos[field] = value
+        text_events = form.get("events") or ""
+        if isinstance(text_events, str) and text_events.lstrip().startswith("["):
+            try:
+                lines = [json.dumps(item) for item in json.loads(text_events)]
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid events JSON")
+        else:
+            lines = str(text_events).splitlines()
+        events = _parse_event_lines(lines)
+        _check_batch_size(events)
+        return events, photos
+    
+    events = []
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        events.extend(_parse_event_lines(lines))
+        # An unterminated line must not grow without bound
+        _check_line_size(buffer)
+        _check_batch_size(events)
+    events.extend(_parse_event_lines([buffer]))
+    _check_batch_size(events)
+    return events, photos
+
+@router.post("/batch")
+async def ingest_offline_batch(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+    async_db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Ingest check-in/check-out events queued by the app while offline.
+    
+    Events (see OfflineAttendanceEvent) are signed with an unexpired,
+    unrevoked key from /offline-key issued before the event, applied in
+    timestamp order with the same geofence, status and required-checkout
+    rules as the online endpoints, and committed in one transaction. Each
+    event is reported as accepted or rejected; accepted times are flagged
+    check_in_offline / check_out_offline.
+    """
+    raw_events, photos = await _read_offline_batch(request)
+    
+    now = get_jakarta_time()
+    max_age = timedelta(hours=settings.OFFLINE_EVENT_MAX_AGE_HOURS)
+    skew = timedelta(seconds=settings.OFFLINE_CLOCK_SKEW_SECONDS)
+    
+    accepted = []
+    rejected = []
+    
+    def reject(index, client_event_id, reason, spooled=None):
+        if spooled:
+            PhotoStoreService.discard(spooled)
+        rejected.append({"index": index, "client_event_id": client_event_id, "reason": reason})
+    
+    keys = {}  # key_id -> decoded key, or None when unusable
+    
+    async def signing_key(key_id):
+        if key_id not in keys:
+            key = decode_offline_key(key_id)
+            if key is not None and (key.get("sub") != current_user.id
+                                    or await TokenRevocationService.is_revoked(async_db, key["jti"])):
+                key = None
+            keys[key_id] = key
+        return keys[key_id]
+    
+    # 1. Parse and verify signatures; photos stay spooled until their event is accepted
+    prepared = []
+    for index, raw in enumerate(raw_events):
+        if isinstance(raw, str):
+            reject(index, None, raw)
+            continue
+        try:
+            event = OfflineAttendanceEvent.model_validate(raw)
+        except ValidationError as e:
+            reject(index, raw.get("client_event_id"), f"Invalid event: {e.errors()[0]['msg']}")
+            continue
+        
+        try:
+            event_time = to_jakarta_time(datetime.fromisoformat(event.timestamp.replace('Z', '+00:00')))
+        except ValueError:
+            reject(index, event.client_event_id, "Invalid timestamp")
+            continue
+        if event_time > now + skew:
+            reject(index, event.client_event_id, "Timestamp is in the future")
+            continue
+        if event_time < now - max_age:
+            reject(index, event.client_event_id, "Event is too old to sync")
+            continue
+        
+        key = await signing_key(event.key_id)
+        if key is None:
+            reject(index, event.client_event_id, "Invalid, expired or revoked signing key")
+            continue
+        # A key cannot vouch for events recorded before it was issued
+        if event_time < utc_to_jakarta(datetime.utcfromtimestamp(key["iat"])) - skew:
+            reject(index, event.client_event_id, "Event predates its signing key")
+            continue
+        
+        # The signature covers the photo digest: hash it into a temp file,
+        # which only enters the store once the event is applied
+        spooled = None
+        if event.photo:
+            upload = photos.get(event.photo)
+            if upload is None:
+                reject(index, event.client_event_id, f"Photo field '{event.photo}' not found")
+                continue
+            try:
+                spooled = await PhotoStoreService.spool(upload)
+            except HTTPException as e:
+                reject(index, event.client_event_id, e.detail)
+                continue
+        
+        message = "|".join([
+            event.client_event_id,
+            event.type,
+            event.timestamp,
+            f"{event.latitude:.7f}",
+            f"{event.longitude:.7f}",
+            spooled[2] if spooled else "",
+        ])
+        if not verify_offline_signature(key["key"], message, event.signature):
+            reject(index, event.client_event_id, "Invalid signature", spooled)
+            continue
+        
+        prepared.append((index, event, event_time, spooled))
+    
+    # 2. Geofences in bulk, existing day rows in one query
+    geofences = LocationService.locate_many([(e.latitude, e.longitude) for _, e, _, _ in prepared])
+    by_day = {}
+    work_dates = {event_time.date() for _, _, event_time, _ in prepared}
+    if work_dates:
+        # Journaled online check-ins must be in attendances to be seen here
+        await CheckinJournalService.flush_user(current_user.id)
+        by_day = {
+            a.work_date: a for a in db.query(Attendance).filter(
+                Attendance.user_id == current_user.id,
+                Attendance.work_date.in_(work_dates)
+            )
+        }
+    
+    # 3. Apply in time order (check-in before check-out on ties)
+    order = sorted(
+        range(len(prepared)),
+        key=lambda i: (prepared[i][2], prepared[i][1].type != "check_in")
+    )
+    derivatives = []
+    for i in order:
+        index, event, event_time, spooled = prepared[i]
+        match = geofences[i]
+        location_name = match.name
+        work_date = event_time.date()
+        photo_path = PhotoStoreService.blob_path(spooled[2], spooled[1]) if spooled else None
+        
+        if not match.is_valid:
+            reject(index, event.client_event_id, f"Lokasi tidak valid. Lokasi terdekat: {LocationService.describe_mismatch(match)}", spooled)
+            continue
+        
+        if event.type == "check_in":
+            if work_date in by_day:
+                reject(index, event.client_event_id, f"Sudah check-in pada {work_date.isoformat()}", spooled)
+                continue
+            
+            attendance = Attendance(
+                user_id=current_user.id,
+                check_in_time=event_time,
+                work_date=work_date,
+                check_in_latitude=event.latitude,
+                check_in_longitude=event.longitude,
+                check_in_location=location_name,
+                check_in_photo_url=photo_path,
+                required_checkout_time=calculate_required_checkout(event_time),
+                status=determine_status(event_time),
+                notes="Offline sync",
+                check_in_offline=True
+            )
+            try:
+                # Savepoint per row: a concurrent online check-in only
+                # rejects this event, not the whole batch
+                with db.begin_nested():
+                    PhotoStoreService.add_ref(db, photo_path)
+                    db.add(attendance)
+            except IntegrityError:
+                reject(index, event.client_event_id, f"Sudah check-in pada {work_date.isoformat()}", spooled)
+                continue
+            by_day[work_date] = attendance
+            if spooled:
+                # The row is in; only now does its photo enter the store
+                await PhotoStoreService.place(spooled)
+        else:
+            attendance = by_day.get(work_date)
+            if attendance is None:
+                reject(index, event.client_event_id, f"Belum check-in pada {work_date.isoformat()}", spooled)
+                continue
+            if attendance.check_out_time:
+                reject(index, event.client_event_id, f"Sudah check-out pada {work_date.isoformat()}", spooled)
+                continue
+            if event_time < to_jakarta_time(attendance.required_checkout_time):
+                reject(index, event.client_event_id, "Belum waktunya check-out", spooled)
+                continue
+            
+            attendance.check_out_time = event_time
+            attendance.check_out_latitude = event.latitude
+            attendance.check_out_longitude = event.longitude
+            attendance.check_out_location = location_name
+            attendance.check_out_photo_url = photo_path
+            attendance.check_out_offline = True
+            if spooled:
+                await PhotoStoreService.place(spooled)
+            PhotoStoreService.add_ref(db, photo_path)
+        
+        accepted.append({"index": index, "client_event_id": event.client_event_id, "type": event.type, "attendance": attendance})
+        if photo_path:
+            derivatives.append((attendance, event.type, photo_path))
+    
+    db.commit()
+    
+    for attendance, kind, photo_path in derivatives:
+        background_tasks.add_task(ImagePipelineService.process_attendance_photo, attendance.id, kind, photo_path)
+    
+    return {
+        "accepted": [
+            {
+                "index": item["index"],
+                "client_event_id": item["client_event_id"],
+                "type": item["type"],
+                "attendance_id": item["attendance"].id,
+            }
+            for item in sorted(accepted, key=lambda item: item["index"])
+        ],
+        "rejected": sorted(rejected, key=lambda item: item["index"]),
+    }
+
 @router.get("/today", response_model=Optional[AttendanceResponse])
 def get_today_attendance(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """Get today's attendance"""
@@ -217,25 +567,53 @@ def get_today_attendance(
     attendance = db.query(Attendance).filter(
         and_(
             Attendance.user_id == current_user.id,
-            func.date(Attendance.check_in_time) == today
+            Attendance.work_date == today
         )
     ).first()
     
     if not attendance:
-        return None
+        # Check-in accepted but still waiting in the write-behind journal
+        attendance = CheckinJournalService.get_pending(current_user.id, today)
+        if not attendance:
+            return None
     
     return AttendanceResponse.model_validate(attendance)
 
+def encode_history_cursor(attendance: Attendance) -> str:
+    """Opaque cursor pointing just after attendance in (check_in_time, id) order"""
+    raw = json.dumps([attendance.check_in_time.isoformat(), attendance.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_history_cursor(cursor: str):
+    """Return (check_in_time, id) from a cursor made by encode_history_cursor"""
+    try:
+        check_in_iso, attendance_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(check_in_iso), str(attendance_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
 @router.get("/history", response_model=AttendanceHistory)
 def get_attendance_history(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     page: int = 1,
     page_size: int = 30,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_read_db)
 ):
-    """Get attendance history"""
+    """
+    Get attendance history, newest first.
+    
+    - Page mode (default): page/page_size with OFFSET, kept for existing clients
+    - Cursor mode: pass cursor (empty for the first page) and follow next_cursor;
+      each page is an index range scan regardless of depth
+    - include_total=false skips the COUNT query
+    """
     query = db.query(Attendance).filter(Attendance.user_id == current_user.id)
     
     if start_date:
@@ -246,23 +624,37 @@ def get_attendance_history(
         end = datetime.fromisoformat(end_date)
         query = query.filter(Attendance.check_in_time <= end)
     
-    total = query.count()
-    attendances = query.order_by(Attendance.check_in_time.desc()) \
-        .offset((page - 1) * page_size) \
-        .limit(page_size) \
-        .all()
+    total = query.count() if include_total else None
+    
+    if cursor is not None:
+        if cursor:
+            last_time, last_id = decode_history_cursor(cursor)
+            query = query.filter(or_(
+                Attendance.check_in_time < last_time,
+                and_(Attendance.check_in_time == last_time, Attendance.id < last_id)
+            ))
+        query = query.order_by(Attendance.check_in_time.desc(), Attendance.id.desc())
+    else:
+        query = query.order_by(Attendance.check_in_time.desc(), Attendance.id.desc()) \
+            .offset((page - 1) * page_size)
+    
+    # One extra row tells whether another page exists
+    attendances = query.limit(page_size + 1).all()
+    has_more = len(attendances) > page_size
+    attendances = attendances[:page_size]
     
     return AttendanceHistory(
         data=[AttendanceResponse.model_validate(a) for a in attendances],
         total=total,
         page=page,
-        page_size=page_size
+        page_size=page_size,
+        next_cursor=encode_history_cursor(attendances[-1]) if has_more else None
     )
 
 @router.post("/admin/auto-checkout")
 def manual_auto_checkout(
     target_date: Optional[str] = None,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """
@@ -282,12 +674,14 @@ def manual_auto_checkout(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid date format. Use YYYY-MM-DD"
             )
-    else:
+    
+    today = get_jakarta_time().date()
+    if not target_date:
         # Default to yesterday
-        target = date.today() - timedelta(days=1)
+        target = today - timedelta(days=1)
     
     # Don't allow future dates
-    if target > date.today():
+    if target > today:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot auto-checkout for future dates"
@@ -1,9 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.schemas import UserRegister, UserLogin, UserResponse, LoginResponse
+from app.database import get_db, get_async_db
+from app.schemas import UserRegister, UserLogin, UserPinLogin, UserPinUpdate, UserResponse, LoginResponse, TokenRefresh, TokenResponse, LogoutRequest
 from app.services import AuthService
-from app.utils import verify_token
+from app.middleware.auth_middleware import get_current_principal, get_current_user_async, get_optional_token_payload
+from app.models import User
+from app.services.principal_service import Principal
 
 router = APIRouter()
 
@@ -21,36 +25,83 @@ def register(user_data: UserRegister, db: Session = Depends(get_db)):
     return new_user
 
 @router.post("/login", response_model=LoginResponse)
-def login(credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """
     Login user dan dapatkan JWT token
     
     - **email**: Email user
     - **password**: Password user
     """
-    result = AuthService.login(db, credentials.email, credentials.password)
+    result = await AuthService.login_async(db, credentials.email, credentials.password)
     return result
 
+@router.post("/refresh", response_model=TokenResponse)
+async def refresh(body: TokenRefresh, db: AsyncSession = Depends(get_async_db)):
+    """
+    Tukar refresh token dengan access token baru
+    
+    - **refresh_token**: Refresh token dari login/refresh sebelumnya
+    
+    Refresh token hanya bisa dipakai sekali; simpan refresh token baru dari
+    response. Memakai refresh token lama lagi akan mencabut sesi tersebut.
+    """
+    result = await AuthService.refresh_async(db, body.refresh_token)
+    return result
+
+@router.post("/pin-login", response_model=LoginResponse)
+async def pin_login(credentials: UserPinLogin, db: AsyncSession = Depends(get_async_db)):
+    """
+    Login cepat dengan PIN untuk perangkat yang sudah pernah login
+    
+    - **user_id**: ID user (tersimpan di perangkat)
+    - **pin**: PIN 6 digit
+    """
+    result = await AuthService.pin_login_async(db, credentials.user_id, credentials.pin)
+    return result
+
+@router.put("/pin")
+async def set_pin(
+    body: UserPinUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """
+    Atur PIN login user yang sedang login
+    
+    - **pin**: PIN 6 digit
+    - **current_password**: Password akun saat ini
+    """
+    await AuthService.set_pin_async(db, current_user, body.pin, body.current_password)
+    return {"message": "PIN berhasil disimpan"}
+
 @router.get("/profile", response_model=UserResponse)
-def get_profile(token: str = None, db: Session = Depends(get_db)):
+def get_profile(
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+):
     """
     Get profil user yang sedang login
     
     Header: Authorization: Bearer {token}
     """
-    if not token:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token tidak ditemukan di header"
-        )
-    
-    user_id = verify_token(token)
-    user = AuthService.get_user_by_id(db, user_id)
-    return user
+    return AuthService.user_summary(AuthService.get_user_by_id(db, current_user.id))
 
 @router.post("/logout")
-def logout():
+async def logout(
+    body: Optional[LogoutRequest] = None,
+    payload: Optional[dict] = Depends(get_optional_token_payload),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Logout user (client-side only, hapus token di client)
+    Logout user: access token dicabut sampai masa berlakunya habis
+    
+    - **refresh_token** (opsional): ikut cabut sesi refresh token perangkat ini
+    - **offline_key_id** (opsional): ikut cabut kunci absensi offline perangkat ini
     """
-    return {"message": "Logout berhasil"}
\ No newline at end of file
+    if payload:
+        await AuthService.logout_async(
+            db, payload,
+            body.refresh_token if body else None,
+            body.offline_key_id if body else None
+        )
+    return {"message": "Logout berhasil"}
@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, Header, HTTPException, UploadFile, File, Form
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
 from datetime import datetime, date
@@ -6,14 +8,17 @@ from pydantic import BaseModel
 import os
 from pathlib import Path
 
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..models.user import User
 from ..services.notification_service import NotificationService
-from ..models.absensi import Leave, LeaveQuota, LeaveType, LeaveCategory, LeaveStatus
+from ..models.absensi import Leave, LeaveQuota, LeaveType, LeaveCategory, LeaveStatus, get_jakarta_time
 from ..services.leave_quota_service import LeaveQuotaService
+from ..services.leave_ledger_service import LeaveLedgerService
 from ..services.holiday_service import HolidayService
-from ..middleware.auth_middleware import get_current_user
-from ..config import UPLOAD_DIR
+from ..services.idempotency_service import IdempotencyService
+from ..middleware.auth_middleware import get_current_principal, get_async_read_db
+from ..services.principal_service import Principal
+from ..config import UPLOAD_DIR, settings
 
 router = APIRouter()
 
@@ -34,36 +39,74 @@ class RejectLeaveRequest(BaseModel):
 
 @router.get("/quota")
 async def get_leave_quota(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get leave quota for current user"""
     try:
-        quota = LeaveQuotaService.get_or_create_quota(db, current_user.id)
-        
-        return {
-            "year": quota.year,
-            "total_quota": quota.total_quota,
-            "used_quota": quota.used_quota,
-            "remaining_quota": quota.remaining_quota
-        }
+        quota = await LeaveQuotaService.get_user_quota_info_async(db, current_user.id)
+        await db.commit()
+        return quota
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting quota: {str(e)}")
 
 
+def _can_audit_quotas(principal: Principal) -> bool:
+    return bool(set(principal.position_codes) & set(settings.LEAVE_AUDIT_POSITIONS))
+
+
+@router.get("/quota/history")
+async def get_leave_quota_history(
+    year: Optional[int] = None,
+    user_id: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Quota ledger of a year (default: this year), oldest first, with the
+    balance after each entry. Other users' ledgers: LEAVE_AUDIT_POSITIONS only.
+    """
+    if user_id and user_id != current_user.id and not _can_audit_quotas(current_user):
+        raise HTTPException(status_code=403, detail="Anda tidak memiliki akses ke kuota cuti pengguna lain")
+    
+    year = year or get_jakarta_time().year
+    return {
+        "user_id": user_id or current_user.id,
+        "year": year,
+        "entries": await LeaveLedgerService.history_async(db, user_id or current_user.id, year)
+    }
+
+
+@router.get("/quota/audit")
+async def audit_leave_quotas(
+    year: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """Quotas of a year whose counters or snapshot disagree with the ledger (LEAVE_AUDIT_POSITIONS only)"""
+    if not _can_audit_quotas(current_user):
+        raise HTTPException(status_code=403, detail="Anda tidak memiliki akses untuk audit kuota cuti")
+    
+    year = year or get_jakarta_time().year
+    mismatches = await LeaveLedgerService.audit_async(db, year)
+    return {"year": year, "mismatches": mismatches}
+
+
 @router.get("/supervisors")
 async def get_supervisors(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get list of supervisors/managers for leave approval - filtered by same department"""
     try:
         # Get supervisors from the same department/faculty
-        supervisors = db.query(User).filter(
-            User.is_active == True,
-            User.id != current_user.id,  # Exclude current user
-            User.department == current_user.department,  # Same department/faculty
-        ).all()
+        supervisors = (await db.execute(
+            select(User).where(
+                User.is_active == True,
+                User.id != current_user.id,  # Exclude current user
+                User.department == current_user.department,  # Same department/faculty
+            )
+        )).scalars().all()
         
         result = []
         for supervisor in supervisors:
@@ -81,14 +124,16 @@ async def get_supervisors(
 
 @router.get("/list")
 async def get_leaves(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get all leaves for current user"""
     try:
-        leaves = db.query(Leave).filter(
-            Leave.user_id == current_user.id
-        ).order_by(Leave.created_at.desc()).all()
+        leaves = (await db.execute(
+            select(Leave).where(
+                Leave.user_id == current_user.id
+            ).order_by(Leave.created_at.desc())
+        )).scalars().all()
         
         result = []
         for leave in leaves:
@@ -125,21 +170,23 @@ async def get_leaves(
 
 @router.get("/pending-approvals")
 async def get_pending_approvals(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get all pending leave requests that require approval from current user"""
     try:
         # Get leaves where current user is the supervisor and status is pending
-        leaves = db.query(Leave).filter(
-            Leave.supervisor_id == current_user.id,
-            Leave.status == LeaveStatus.PENDING
-        ).order_by(Leave.created_at.desc()).all()
+        leaves = (await db.execute(
+            select(Leave).where(
+                Leave.supervisor_id == current_user.id,
+                Leave.status == LeaveStatus.PENDING
+            ).order_by(Leave.created_at.desc())
+        )).scalars().all()
         
         result = []
         for leave in leaves:
             # Get submitter info
-            submitter = db.query(User).filter(User.id == leave.user_id).first()
+            submitter = await db.get(User, leave.user_id)
             
             result.append({
                 "id": leave.id,
@@ -165,8 +212,8 @@ async def get_pending_approvals(
 
 @router.get("/active-leaves")
 async def get_active_leaves(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get all currently active leaves (approved leaves happening today)"""
     try:
@@ -174,22 +221,24 @@ async def get_active_leaves(
         tomorrow = date.fromordinal(today.toordinal() + 1)
         
         # Get leaves that are approved and currently active
-        leaves = db.query(Leave).filter(
-            Leave.status.in_([LeaveStatus.APPROVED_BY_SUPERVISOR, LeaveStatus.APPROVED_BY_HR]),
-            Leave.start_date < tomorrow,  # start_date is before tomorrow (i.e., today or earlier)
-            Leave.end_date >= tomorrow  # end_date is tomorrow or later (i.e., includes today)
-        ).order_by(Leave.start_date).all()
+        leaves = (await db.execute(
+            select(Leave).where(
+                Leave.status.in_([LeaveStatus.APPROVED_BY_SUPERVISOR, LeaveStatus.APPROVED_BY_HR]),
+                Leave.start_date < tomorrow,  # start_date is before tomorrow (i.e., today or earlier)
+                Leave.end_date >= tomorrow  # end_date is tomorrow or later (i.e., includes today)
+            ).order_by(Leave.start_date)
+        )).scalars().all()
         
         result = []
         for leave in leaves:
             try:
                 # Get user info
-                user = db.query(User).filter(User.id == leave.user_id).first()
+                user = await db.get(User, leave.user_id)
                 
                 # Get approver info
                 approved_by_name = None
                 if leave.approved_by_level_1:
-                    approver = db.query(User).filter(User.id == leave.approved_by_level_1).first()
+                    approver = await db.get(User, leave.approved_by_level_1)
                     if approver:
                         approved_by_name = approver.name
                 
@@ -228,10 +277,17 @@ async def submit_leave(
     reason: str = Form(...),
     supervisor_id: Optional[str] = Form(None),
     attachment: Optional[UploadFile] = File(None),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Submit a new leave request"""
+    # A resend with the same Idempotency-Key returns the first response
+    # instead of creating a second leave and deducting quota again
+    replay = await IdempotencyService.begin(db, current_user.id, idempotency_key, "leave.submit")
+    if replay is not None:
+        return replay
+    
     try:
         # Validate supervisor if provided
         if supervisor_id:
@@ -272,16 +328,6 @@ async def submit_leave(
             leave_category == LeaveCategory.SAKIT_TANPA_SURAT
         )
         
-        if should_deduct:
-            # Check quota availability
-            # NOTE: No employment duration validation - users can use CUTI immediately
-            quota = LeaveQuotaService.get_or_create_quota(db, current_user.id)
-            if quota.remaining_quota < total_days:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Insufficient leave quota. Available: {quota.remaining_quota} days, Required: {total_days} days"
-                )
-        
         # Handle attachment if provided
         attachment_path = None
         if attachment:
@@ -321,20 +367,26 @@ async def submit_leave(
         db.add(new_leave)
         db.flush()
         
-        # Deduct quota if applicable (will be refunded if rejected)
         if should_deduct:
-            LeaveQuotaService.deduct_quota(db, current_user.id, total_days)
-        
-        db.commit()
-        db.refresh(new_leave)
-        
-        # Send notification to supervisor about pending approval
-        NotificationService.notify_pending_approval(db, new_leave.id)
+            # Check and deduct in one statement, recorded against the leave and
+            # committed with it below (refunded if rejected)
+            # NOTE: No employment duration validation - users can use CUTI immediately
+            quota_year = get_jakarta_time().year
+            if not LeaveQuotaService.deduct_quota(db, current_user.id, total_days, quota_year, leave_id=new_leave.id):
+                quota = LeaveQuotaService.get_or_create_quota(db, current_user.id, quota_year)
+                raise HTTPException(
+                    status_code=400, 
+                    detail=f"Insufficient leave quota. Available: {quota.remaining_quota} days, Required: {total_days} days"
+                )
+            
+            # What reject refunds: this charge, not the category
+            new_leave.deducted_from_quota = True
+            new_leave.quota_year = quota_year
         
         # Get holidays in the range for info
         holidays_in_range = HolidayService.get_holidays_for_range(start, end)
         
-        return {
+        response = {
             "message": "Leave request submitted successfully",
             "leave_id": new_leave.id,
             "total_days": total_days,
@@ -342,11 +394,22 @@ async def submit_leave(
             "holidays_excluded": len(holidays_in_range),
             "info": f"Working days only. Weekends and {len(holidays_in_range)} public holidays are automatically excluded."
         }
+        IdempotencyService.complete(db, current_user.id, idempotency_key, response)
+        
+        db.commit()
+        
+        # Send notification to supervisor about pending approval
+        NotificationService.notify_pending_approval(db, new_leave.id)
+        
+        return response
         
     except HTTPException:
+        db.rollback()  # Undo a quota deduction made before the failure
+        await IdempotencyService.release(db, current_user.id, idempotency_key)
         raise
     except Exception as e:
         db.rollback()
+        await IdempotencyService.release(db, current_user.id, idempotency_key)
         raise HTTPException(status_code=500, detail=f"Error submitting leave: {str(e)}")
 
 
@@ -354,50 +417,64 @@ async def submit_leave(
 async def approve_leave(
     leave_id: str,
     request: ApproveLeaveRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Approve a leave request (supervisor or HR)"""
     try:
-        leave = db.query(Leave).filter(Leave.id == leave_id).first()
+        leave = await db.get(Leave, leave_id)
         if not leave:
             raise HTTPException(status_code=404, detail="Leave not found")
         
-        if leave.status != LeaveStatus.PENDING:
-            raise HTTPException(status_code=400, detail="Leave is not pending approval")
-        
-        from ..models.absensi import get_jakarta_time
         now = get_jakarta_time()
         
+        # Each level moves the leave on from the status the one before it
+        # leaves, in one conditional UPDATE so racing approvals and rejects
+        # cannot both act on the same leave
         if request.level == 1:
             # Supervisor approval
-            leave.approved_by_level_1 = current_user.id
-            leave.approved_at_level_1 = now
-            leave.approval_notes_level_1 = request.notes
-            leave.status = LeaveStatus.APPROVED_BY_SUPERVISOR
+            transition = update(Leave).where(
+                Leave.id == leave_id,
+                Leave.status == LeaveStatus.PENDING
+            ).values(
+                approved_by_level_1=current_user.id,
+                approved_at_level_1=now,
+                approval_notes_level_1=request.notes,
+                status=LeaveStatus.APPROVED_BY_SUPERVISOR
+            )
         elif request.level == 2:
             # HR approval
             if not leave.approved_at_level_1:
                 raise HTTPException(status_code=400, detail="Supervisor approval required first")
             
-            leave.approved_by_level_2 = current_user.id
-            leave.approved_at_level_2 = now
-            leave.approval_notes_level_2 = request.notes
-            leave.status = LeaveStatus.APPROVED_BY_HR
+            transition = update(Leave).where(
+                Leave.id == leave_id,
+                Leave.status == LeaveStatus.APPROVED_BY_SUPERVISOR
+            ).values(
+                approved_by_level_2=current_user.id,
+                approved_at_level_2=now,
+                approval_notes_level_2=request.notes,
+                status=LeaveStatus.APPROVED_BY_HR
+            )
         else:
             raise HTTPException(status_code=400, detail="Invalid approval level")
         
-        db.commit()
+        result = await db.execute(transition.execution_options(synchronize_session=False))
+        if result.rowcount != 1:
+            await db.rollback()
+            raise HTTPException(status_code=400, detail="Leave is not pending approval")
+        
+        await db.commit()
         
         # Send notification
-        NotificationService.notify_leave_approved(db, leave.id)
+        await NotificationService.notify_leave_approved_async(db, leave.id)
         
         return {"message": f"Leave approved at level {request.level}"}
         
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error approving leave: {str(e)}")
 
 
@@ -405,39 +482,48 @@ async def approve_leave(
 async def reject_leave(
     leave_id: str,
     request: RejectLeaveRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Reject a leave request"""
     try:
-        leave = db.query(Leave).filter(Leave.id == leave_id).first()
+        leave = await db.get(Leave, leave_id)
         if not leave:
             raise HTTPException(status_code=404, detail="Leave not found")
         
-        if leave.status != LeaveStatus.PENDING:
+        # Only the request that moves the leave out of pending refunds it
+        result = await db.execute(
+            update(Leave).where(
+                Leave.id == leave_id,
+                Leave.status == LeaveStatus.PENDING
+            ).values(
+                status=LeaveStatus.REJECTED,
+                rejection_reason=request.notes,
+                rejected_by=current_user.id,
+                rejected_at=get_jakarta_time()
+            ).execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            await db.rollback()
             raise HTTPException(status_code=400, detail="Leave is not pending approval")
         
-        # Refund quota if it was deducted
-        should_refund = (
-            leave.category == LeaveCategory.CUTI_TAHUNAN or 
-            leave.category == LeaveCategory.SAKIT_TANPA_SURAT
-        )
+        # Refund quota if it was deducted, into the year it was charged to
+        should_refund = bool(leave.deducted_from_quota)
         
         if should_refund:
-            LeaveQuotaService.restore_quota(db, leave.user_id, leave.total_days)
-        
-        leave.status = LeaveStatus.REJECTED
-        leave.rejection_reason = request.notes
+            should_refund = await LeaveQuotaService.restore_quota_async(
+                db, leave.user_id, leave.total_days, leave.quota_year, leave_id=leave.id
+            )
         
-        db.commit()
+        await db.commit()
         
         # Send notification
-        NotificationService.notify_leave_rejected(db, leave.id, request.notes)
+        await NotificationService.notify_leave_rejected_async(db, leave.id, request.notes)
         
         return {"message": "Leave rejected", "quota_refunded": should_refund}
         
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error rejecting leave: {str(e)}")
@@ -0,0 +1,135 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+import json
+
+from ..config import settings
+from ..database import get_async_db
+from ..models.location import Location
+from ..schemas import LocationCreate, LocationUpdate, LocationResponse
+from ..middleware.auth_middleware import get_current_principal
+from ..services.location_service import LocationService
+from ..services.principal_service import Principal
+from ..utils.geofence import PolygonGeofence
+
+router = APIRouter()
+
+
+def require_location_admin(current_user: Principal = Depends(get_current_principal)) -> Principal:
+    """Only LOCATION_ADMIN_POSITIONS may change sites"""
+    if not set(current_user.position_codes) & set(settings.LOCATION_ADMIN_POSITIONS):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Anda tidak memiliki akses untuk mengelola lokasi absensi"
+        )
+    return current_user
+
+
+def _apply(location: Location, fields: dict):
+    """Set fields on location, checking it still describes a usable site"""
+    if "boundary" in fields and fields["boundary"] is not None:
+        try:
+            fence = PolygonGeofence.from_geojson(fields["boundary"])
+        except (ValueError, TypeError) as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Boundary tidak valid: {e}"
+            )
+        fields["boundary"] = json.dumps(fields["boundary"])
+        # Reference point of a polygon site, unless given
+        fields.setdefault("latitude", location.latitude if location.latitude is not None else fence.center_lat)
+        fields.setdefault("longitude", location.longitude if location.longitude is not None else fence.center_lon)
+    
+    for field, value in fields.items():
+        setattr(location, field, value)
+    
+    if location.boundary is None and location.radius is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Lokasi harus memiliki radius atau boundary"
+        )
+    if location.latitude is None or location.longitude is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Latitude dan longitude wajib untuk lokasi dengan radius"
+        )
+
+
+async def _commit_and_reload(db: AsyncSession):
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Nama lokasi sudah digunakan"
+        )
+    # Serve the change from this process right away; others pick it up on their next sync
+    await LocationService.reload_async(db)
+
+
+@router.get("", response_model=List[LocationResponse])
+async def list_locations(
+    include_inactive: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """List attendance sites (active only unless include_inactive=true)"""
+    query = select(Location).order_by(Location.name)
+    if not include_inactive:
+        query = query.where(Location.is_active.is_(True))
+    return (await db.execute(query)).scalars().all()
+
+
+@router.post("", response_model=LocationResponse, status_code=status.HTTP_201_CREATED)
+async def create_location(
+    request: LocationCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(require_location_admin)
+):
+    """Add an attendance site"""
+    location = Location()
+    _apply(location, request.model_dump(exclude_none=True))
+    db.add(location)
+    await _commit_and_reload(db)
+    await db.refresh(location)
+    return location
+
+
+@router.put("/{location_id}", response_model=LocationResponse)
+async def update_location(
+    location_id: str,
+    request: LocationUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(require_location_admin)
+):
+    """Change an attendance site; only the fields sent are updated"""
+    location = await db.get(Location, location_id)
+    if not location:
+        raise HTTPException(status_code=404, detail="Lokasi tidak ditemukan")
+
+    _apply(location, request.model_dump(exclude_unset=True))
+    await _commit_and_reload(db)
+    await db.refresh(location)
+    return location
+
+
+@router.delete("/{location_id}")
+async def delete_location(
+    location_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(require_location_admin)
+):
+    """
+    Deactivate an attendance site. The row stays so attendances that
+    name it keep their meaning; PUT is_active=true brings it back.
+    """
+    location = await db.get(Location, location_id)
+    if not location:
+        raise HTTPException(status_code=404, detail="Lokasi tidak ditemukan")
+
+    location.is_active = False
+    await _commit_and_reload(db)
+    return {"message": "Lokasi dinonaktifkan"}
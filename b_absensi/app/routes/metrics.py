@@ -0,0 +1,87 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from app.config import settings
+from app.utils.pool_metrics import POOL_STATS
+from app.services.loop_monitor_service import LoopMonitorService
+from app.services.password_hash_service import PasswordHashService
+from app.services.token_revocation_service import TokenRevocationService
+from app.middleware.auth_middleware import get_current_principal
+from app.services.principal_service import Principal, PrincipalService
+from app.utils.security import token_cache_stats
+
+router = APIRouter()
+
+def require_metrics_admin(current_user: Principal = Depends(get_current_principal)) -> Principal:
+    """Only METRICS_ADMIN_POSITIONS may read (or reset) internals: stacks, pools, caches"""
+    if not set(current_user.position_codes) & set(settings.METRICS_ADMIN_POSITIONS):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Anda tidak memiliki akses ke metrics"
+        )
+    return current_user
+
+@router.get("/loop")
+async def get_loop_metrics(
+    reset: bool = False,
+    current_user: Principal = Depends(require_metrics_admin)
+):
+    """
+    Event-loop lag histogram, stall histograms per route (sorted by total
+    blocked time) and the most recent stalls with the blocking stack.
+    Pass reset=true to start a new measurement window after reading.
+    """
+    return LoopMonitorService.snapshot(reset=reset)
+
+@router.get("/db-pool")
+async def get_db_pool_metrics(
+    reset: bool = False,
+    current_user: Principal = Depends(require_metrics_admin)
+):
+    """
+    Connection pool statistics per engine: checkout wait histogram,
+    timeouts, connections in use/idle/overflow and their peaks.
+    Pass reset=true to start a new measurement window after reading.
+    """
+    pools = {}
+    for name, stats in POOL_STATS.items():
+        pools[name] = stats.snapshot()
+        if reset:
+            stats.reset()
+    
+    return {
+        "settings": {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        },
+        "pools": pools,
+    }
+
+@router.get("/auth-cache")
+async def get_auth_cache_metrics(
+    reset: bool = False,
+    current_user: Principal = Depends(require_metrics_admin)
+):
+    """
+    Size and hit rate of the verified-token cache and the principal cache,
+    plus the revocation filter (lookups, probable hits, false positives).
+    Pass reset=true to zero the cache counters after reading.
+    """
+    return {
+        "tokens": token_cache_stats(reset=reset),
+        "principals": PrincipalService.stats(reset=reset),
+        "revocation": TokenRevocationService.snapshot(),
+    }
+
+@router.get("/password-hashing")
+async def get_password_hashing_metrics(
+    reset: bool = False,
+    current_user: Principal = Depends(require_metrics_admin)
+):
+    """
+    bcrypt pool: jobs in flight (queued + running) and their peak, 503
+    rejections, rehash-on-login count, hash time and queue wait histograms.
+    Pass reset=true to start a new measurement window after reading.
+    """
+    return PasswordHashService.snapshot(reset=reset)
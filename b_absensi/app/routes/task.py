@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from pydantic import BaseModel
 from datetime import datetime
 
-from ..database import get_db
+from ..database import get_async_db
 from ..models.user import User
 from ..models.absensi import Task, TaskStatus
-from ..middleware.auth_middleware import get_current_user
+from ..middleware.auth_middleware import get_current_principal, get_async_read_db
+from ..services.principal_service import Principal
 from ..services.notification_service import NotificationService
 
 router = APIRouter()
@@ -30,13 +32,13 @@ class TaskUpdateRequest(BaseModel):
 @router.post("/submit")
 async def submit_task(
     request: TaskCreateRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Submit a new task to be assigned to someone"""
     try:
         # Verify assigned_to user exists
-        assigned_to = db.query(User).filter(User.id == request.assigned_to_id).first()
+        assigned_to = await db.get(User, request.assigned_to_id)
         if not assigned_to:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -54,11 +56,11 @@ async def submit_task(
         )
         
         db.add(task)
-        db.commit()
-        db.refresh(task)
+        await db.commit()
+        await db.refresh(task)
         
         # Send notification
-        NotificationService.notify_task_assigned(db, task.id)
+        await NotificationService.notify_task_assigned_async(db, task.id)
         
         return {
             "message": "Task submitted successfully",
@@ -67,24 +69,26 @@ async def submit_task(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error submitting task: {str(e)}")
 
 
 @router.get("/assigned-to-me")
 async def get_tasks_assigned_to_me(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get all tasks assigned to current user"""
     try:
-        tasks = db.query(Task).filter(
-            Task.assigned_to_id == current_user.id
-        ).order_by(Task.created_at.desc()).all()
+        tasks = (await db.execute(
+            select(Task).where(
+                Task.assigned_to_id == current_user.id
+            ).order_by(Task.created_at.desc())
+        )).scalars().all()
         
         result = []
         for task in tasks:
-            assigned_by = db.query(User).filter(User.id == task.assigned_by_id).first()
+            assigned_by = await db.get(User, task.assigned_by_id)
             
             result.append({
                 "id": task.id,
@@ -109,18 +113,20 @@ async def get_tasks_assigned_to_me(
 
 @router.get("/assigned-by-me")
 async def get_tasks_assigned_by_me(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get all tasks assigned by current user"""
     try:
-        tasks = db.query(Task).filter(
-            Task.assigned_by_id == current_user.id
-        ).order_by(Task.created_at.desc()).all()
+        tasks = (await db.execute(
+            select(Task).where(
+                Task.assigned_by_id == current_user.id
+            ).order_by(Task.created_at.desc())
+        )).scalars().all()
         
         result = []
         for task in tasks:
-            assigned_to = db.query(User).filter(User.id == task.assigned_to_id).first()
+            assigned_to = await db.get(User, task.assigned_to_id)
             
             result.append({
                 "id": task.id,
@@ -147,12 +153,12 @@ async def get_tasks_assigned_by_me(
 async def update_task_status(
     task_id: str,
     request: TaskUpdateRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Update task status - can only be done by assigned user"""
     try:
-        task = db.query(Task).filter(Task.id == task_id).first()
+        task = await db.get(Task, task_id)
         if not task:
             raise HTTPException(status_code=404, detail="Task not found")
         
@@ -167,37 +173,37 @@ async def update_task_status(
         if request.status == TaskStatus.COMPLETED:
             task.completed_at = get_jakarta_time()
         
-        db.commit()
+        await db.commit()
         
         # Send notification if task is completed
         if request.status == TaskStatus.COMPLETED:
-            NotificationService.notify_task_completed(db, task.id)
+            await NotificationService.notify_task_completed_async(db, task.id)
         
         return {"message": "Task status updated successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error updating task: {str(e)}")
 
 
 @router.get("/{task_id}")
 async def get_task_detail(
     task_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Get task detail - accessible by assigned user or assigner"""
     try:
-        task = db.query(Task).filter(Task.id == task_id).first()
+        task = await db.get(Task, task_id)
         if not task:
             raise HTTPException(status_code=404, detail="Task not found")
         
         if task.assigned_to_id != current_user.id and task.assigned_by_id != current_user.id:
             raise HTTPException(status_code=403, detail="You don't have access to this task")
         
-        assigned_by = db.query(User).filter(User.id == task.assigned_by_id).first()
-        assigned_to = db.query(User).filter(User.id == task.assigned_to_id).first()
+        assigned_by = await db.get(User, task.assigned_by_id)
+        assigned_to = await db.get(User, task.assigned_to_id)
         
         return {
             "id": task.id,
@@ -1,7 +1,16 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from app.services.auto_checkout_service import AutoCheckoutService
 from app.services.leave_quota_service import LeaveQuotaService
+from app.services.leave_ledger_service import LeaveLedgerService
+from app.services.photo_store_service import PhotoStoreService
+from app.services.idempotency_service import IdempotencyService
+from app.services.refresh_token_service import RefreshTokenService
+from app.services.token_revocation_service import TokenRevocationService
+from app.services.location_service import LocationService
+from app.services.holiday_service import HolidayService
+from app.config import settings
 from app.database import SessionLocal
 import logging
 import pytz
@@ -15,13 +24,108 @@ scheduler = BackgroundScheduler()
 JAKARTA_TZ = pytz.timezone('Asia/Jakarta')
 
 def reset_leave_quotas_job():
-    """Job to reset leave quotas at the start of new year"""
+    """Job to create missing leave quotas (new year rollover, new hires)"""
     db = SessionLocal()
     try:
         count = LeaveQuotaService.reset_annual_quotas(db)
         logger.info(f"Annual leave quotas reset completed: {count} users processed")
     except Exception as e:
         logger.error(f"Error in reset_leave_quotas_job: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+def collect_photo_garbage_job():
+    """Job to remove unreferenced photos from the photo store"""
+    db = SessionLocal()
+    try:
+        removed = PhotoStoreService.collect_garbage(db)
+        logger.info(f"Photo store garbage collection completed: {removed} files removed")
+    except Exception as e:
+        logger.error(f"Error in collect_photo_garbage_job: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+def prune_idempotency_keys_job():
+    """Job to delete expired Idempotency-Key records"""
+    db = SessionLocal()
+    try:
+        count = IdempotencyService.prune_expired(db)
+        logger.info(f"Idempotency key pruning completed: {count} keys removed")
+    except Exception as e:
+        logger.error(f"Error in prune_idempotency_keys_job: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+def prune_refresh_tokens_job():
+    """Job to delete expired refresh tokens"""
+    db = SessionLocal()
+    try:
+        count = RefreshTokenService.prune_expired(db)
+        logger.info(f"Refresh token pruning completed: {count} tokens removed")
+    except Exception as e:
+        logger.error(f"Error in prune_refresh_tokens_job: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+def sync_token_revocations_job():
+    """Job to add other processes' token revocations to the in-memory filter"""
+    db = SessionLocal()
+    try:
+        TokenRevocationService.sync(db)
+    except Exception as e:
+        logger.error(f"Error in sync_token_revocations_job: {e}")
+    finally:
+        db.close()
+
+def rebuild_token_revocations_job():
+    """Job to prune expired token revocations and rebuild the filter without them"""
+    db = SessionLocal()
+    try:
+        pruned = TokenRevocationService.prune_expired(db)
+        count = TokenRevocationService.rebuild(db)
+        logger.info(f"Token revocation filter rebuilt: {count} entries, {pruned} expired removed")
+    except Exception as e:
+        logger.error(f"Error in rebuild_token_revocations_job: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+def sync_locations_job():
+    """Job to reload the location index when sites were edited elsewhere"""
+    db = SessionLocal()
+    try:
+        if LocationService.reload(db):
+            logger.info("Location index reloaded")
+    except Exception as e:
+        logger.error(f"Error in sync_locations_job: {e}")
+    finally:
+        db.close()
+
+def refresh_holidays_job():
+    """Job to re-fetch stale holiday years from the API into the holidays table"""
+    db = SessionLocal()
+    try:
+        count = HolidayService.refresh(db)
+        logger.info(f"Holiday refresh completed: {count} years updated")
+    except Exception as e:
+        logger.error(f"Error in refresh_holidays_job: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+def snapshot_leave_quotas_job():
+    """Job to fold new leave quota ledger entries into the per-user snapshots"""
+    db = SessionLocal()
+    try:
+        count = LeaveLedgerService.materialize(db)
+        logger.info(f"Leave quota snapshots completed: {count} updated")
+    except Exception as e:
+        logger.error(f"Error in snapshot_leave_quotas_job: {e}")
+        db.rollback()
     finally:
         db.close()
 
@@ -39,12 +143,85 @@ def start_scheduler():
             replace_existing=True
         )
         
-        # Schedule leave quota reset to run on January 1st at 00:01 Jakarta time
+        # Schedule leave quota reset daily at 00:01 Jakarta time: the New Year
+        # rollover on January 1st, quotas for new hires on the other days
         scheduler.add_job(
             reset_leave_quotas_job,
-            CronTrigger(month=1, day=1, hour=0, minute=1, timezone=JAKARTA_TZ),  # January 1st at 00:01 Jakarta time
+            CronTrigger(hour=0, minute=1, timezone=JAKARTA_TZ),
             id='reset_leave_quotas',
-            name='Reset annual leave quotas for new year',
+            name='Create missing annual leave quotas (new year, new hires)',
+            replace_existing=True
+        )
+        
+        # Schedule photo store garbage collection daily at 02:00 Jakarta time
+        scheduler.add_job(
+            collect_photo_garbage_job,
+            CronTrigger(hour=2, minute=0, timezone=JAKARTA_TZ),
+            id='collect_photo_garbage',
+            name='Remove unreferenced photos from the photo store',
+            replace_existing=True
+        )
+        
+        # Schedule idempotency key pruning every hour
+        scheduler.add_job(
+            prune_idempotency_keys_job,
+            CronTrigger(minute=30, timezone=JAKARTA_TZ),
+            id='prune_idempotency_keys',
+            name='Delete expired idempotency keys',
+            replace_existing=True
+        )
+        
+        # Schedule refresh token pruning daily at 03:00 Jakarta time
+        scheduler.add_job(
+            prune_refresh_tokens_job,
+            CronTrigger(hour=3, minute=0, timezone=JAKARTA_TZ),
+            id='prune_refresh_tokens',
+            name='Delete expired refresh tokens',
+            replace_existing=True
+        )
+        
+        # Pick up token revocations made by other processes
+        scheduler.add_job(
+            sync_token_revocations_job,
+            IntervalTrigger(seconds=settings.REVOCATION_SYNC_SECONDS),
+            id='sync_token_revocations',
+            name='Sync token revocation filter',
+            replace_existing=True
+        )
+        
+        # Schedule token revocation pruning + filter rebuild every hour
+        scheduler.add_job(
+            rebuild_token_revocations_job,
+            CronTrigger(minute=45, timezone=JAKARTA_TZ),
+            id='rebuild_token_revocations',
+            name='Prune expired token revocations and rebuild the filter',
+            replace_existing=True
+        )
+        
+        # Pick up attendance site edits made by other processes or plain SQL
+        scheduler.add_job(
+            sync_locations_job,
+            IntervalTrigger(seconds=settings.LOCATION_SYNC_SECONDS),
+            id='sync_locations',
+            name='Sync location index',
+            replace_existing=True
+        )
+        
+        # Refresh public holidays (last, this and next year) daily at 04:00
+        scheduler.add_job(
+            refresh_holidays_job,
+            CronTrigger(hour=4, minute=0, timezone=JAKARTA_TZ),
+            id='refresh_holidays',
+            name='Refresh public holidays',
+            replace_existing=True
+        )
+        
+        # Keep leave quota balance reads to a short ledger tail: snapshot hourly
+        scheduler.add_job(
+            snapshot_leave_quotas_job,
+            CronTrigger(minute=15, timezone=JAKARTA_TZ),
+            id='snapshot_leave_quotas',
+            name='Snapshot leave quota ledger',
             replace_existing=True
         )
         
@@ -52,7 +229,15 @@ def start_scheduler():
         logger.info("Scheduler started successfully")
         logger.info("Scheduled jobs:")
         logger.info("  - Auto-checkout: Daily at 00:00 (Jakarta time)")
-        logger.info("  - Leave quota reset: January 1st at 00:01")
+        logger.info("  - Leave quota reset: Daily at 00:01 (new year rollover, new hires)")
+        logger.info("  - Photo store garbage collection: Daily at 02:00")
+        logger.info("  - Idempotency key pruning: Hourly at :30")
+        logger.info("  - Refresh token pruning: Daily at 03:00")
+        logger.info(f"  - Token revocation sync: Every {settings.REVOCATION_SYNC_SECONDS}s")
+        logger.info("  - Token revocation pruning/rebuild: Hourly at :45")
+        logger.info("  - Leave quota snapshots: Hourly at :15")
+        logger.info(f"  - Location index sync: Every {settings.LOCATION_SYNC_SECONDS}s")
+        logger.info("  - Holiday refresh: Daily at 04:00")
         
     except Exception as e:
         logger.error(f"Error starting scheduler: {e}")
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+import json
+from pydantic import BaseModel, Field, field_validator
+from typing import Literal, Optional
 from datetime import datetime
 
 class AttendanceCheckIn(BaseModel):
@@ -20,23 +21,50 @@ class AttendanceResponse(BaseModel):
     check_in_longitude: float
     check_in_location: str
     check_in_photo_url: Optional[str] = None
+    check_in_photo_review_url: Optional[str] = None
+    check_in_photo_thumb_url: Optional[str] = None
+    check_in_photo_width: Optional[int] = None
+    check_in_photo_height: Optional[int] = None
     check_out_time: Optional[datetime] = None
     check_out_latitude: Optional[float] = None
     check_out_longitude: Optional[float] = None
     check_out_location: Optional[str] = None
     check_out_photo_url: Optional[str] = None
+    check_out_photo_review_url: Optional[str] = None
+    check_out_photo_thumb_url: Optional[str] = None
+    check_out_photo_width: Optional[int] = None
+    check_out_photo_height: Optional[int] = None
     required_checkout_time: datetime
     status: str
     notes: Optional[str] = None
+    check_in_offline: bool = False
+    check_out_offline: bool = False
     
     class Config:
         from_attributes = True
 
 class AttendanceHistory(BaseModel):
     data: list[AttendanceResponse]
-    total: int
+    total: Optional[int] = None  # None when include_total=false
     page: int = 1
     page_size: int = 30
+    next_cursor: Optional[str] = None  # Pass as cursor to get the next page; None on the last page
+
+class OfflineAttendanceEvent(BaseModel):
+    """
+    One queued check-in/check-out from the app's offline queue.
+    signature = hex HMAC-SHA256 with a key from /offline-key over
+    "client_event_id|type|timestamp|latitude:.7f|longitude:.7f|photo sha256 or empty";
+    key_id is the key_id issued with that key
+    """
+    client_event_id: str = Field(..., min_length=1, max_length=64)
+    type: Literal["check_in", "check_out"]
+    timestamp: str  # ISO 8601 as recorded on the device; naive means Jakarta time
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    photo: Optional[str] = None  # Multipart field name of the photo, if any
+    key_id: str
+    signature: str
 
 class LeaveRequest(BaseModel):
     leave_type: str
@@ -69,3 +97,41 @@ class LeaveList(BaseModel):
     total: int
     page: int = 1
     page_size: int = 30
+
+class LocationCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=255)
+    latitude: Optional[float] = Field(None, ge=-90, le=90)  # Defaults to the boundary's centre
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    radius: Optional[float] = Field(None, gt=0, le=50)  # dalam km; circular site
+    boundary: Optional[dict] = None  # GeoJSON Polygon/MultiPolygon, [lon, lat]; polygon site
+    address: Optional[str] = None
+    is_active: bool = True
+
+class LocationUpdate(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=255)
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    radius: Optional[float] = Field(None, gt=0, le=50)
+    boundary: Optional[dict] = None  # Send null to turn a polygon site back into a circle
+    address: Optional[str] = None
+    is_active: Optional[bool] = None
+
+class LocationResponse(BaseModel):
+    id: str
+    name: str
+    latitude: float
+    longitude: float
+    radius: Optional[float] = None
+    boundary: Optional[dict] = None
+    address: Optional[str] = None
+    is_active: bool
+    updated_at: datetime
+    
+    @field_validator("boundary", mode="before")
+    @classmethod
+    def parse_boundary(cls, value):
+        # Stored as GeoJSON text
+        return json.loads(value) if isinstance(value, str) else value
+    
+    class Config:
+        from_attributes = True
@@ -42,8 +42,16 @@ class TokenResponse(BaseModel):
     refresh_token: str
     token_type: str = "bearer"
 
+class TokenRefresh(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None  # Also end this device's refresh token family
+    offline_key_id: Optional[str] = None  # Also revoke this device's offline signing key
+
 class UserPinUpdate(BaseModel):
     pin: str = Field(..., min_length=6, max_length=6)
+    current_password: str  # A token alone must not be enough to set up PIN login
 
 class UserProfileUpdate(BaseModel):
     name: Optional[str] = None
@@ -3,7 +3,8 @@ Script untuk membuat sample users dan positions saat aplikasi pertama kali dijal
 """
 from sqlalchemy.orm import Session
 from app.database import SessionLocal, engine, Base
-from app.models import User, Position
+from app.models import User, Position, Location
+from app.config import LOKASI_ABSENSI
 from app.models.user import user_positions
 from app.utils import hash_password
 import logging
@@ -81,6 +82,34 @@ def create_positions():
     finally:
         db.close()
 
+def create_locations():
+    """Seed the locations table from LOKASI_ABSENSI when it is empty"""
+    db = SessionLocal()
+    try:
+        existing = db.query(Location).count()
+        if existing > 0:
+            logger.info(f"Locations already exist ({existing} found), skipping creation")
+            return
+        
+        for name, data in LOKASI_ABSENSI.items():
+            db.add(Location(
+                name=name,
+                latitude=data["lat"],
+                longitude=data["lon"],
+                radius=data["radius"],
+                address=data.get("address")
+            ))
+            logger.info(f"Created location: {name}")
+        
+        db.commit()
+        logger.info(f"Successfully created {len(LOKASI_ABSENSI)} locations")
+        
+    except Exception as e:
+        logger.error(f"Error creating locations: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
 SAMPLE_USERS = [
     {
         "email": "jefry@mncu.ac.id",
@@ -232,3 +261,5 @@ if __name__ == "__main__":
     create_positions()
     # Then create sample users
     create_sample_users()
+    # Attendance sites
+    create_locations()
@@ -1,8 +1,29 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from fastapi import HTTPException, status
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+import pytz
+from app.config import settings
 from app.models import User
 from app.schemas import UserRegister, UserResponse
-from app.utils import hash_password, verify_password, create_access_token, create_refresh_token
+from app.services.password_hash_service import PasswordHashService
+from app.services.refresh_token_service import RefreshTokenService
+from app.services.token_revocation_service import TokenRevocationService
+from app.utils import create_access_token, decode_offline_key, hash_pin, verify_pin
+from app.utils.timezone import to_jakarta_time
+
+logger = logging.getLogger(__name__)
+
+TZ = pytz.timezone('Asia/Jakarta')
+
+def get_jakarta_time():
+    """Get current datetime in Asia/Jakarta timezone"""
+    return datetime.now(TZ)
+
+MAX_LOCKOUT_DOUBLINGS = 20  # PIN lockouts stop growing at PIN_LOCKOUT_MINUTES * 2**20 (~30 years at 15)
 
 class AuthService:
     @staticmethod
@@ -17,7 +38,7 @@ class AuthService:
             )
         
         # Create user baru
-        hashed_password = hash_password(user_data.password)
+        hashed_password = PasswordHashService.hash_sync(user_data.password)
         new_user = User(
             email=user_data.email,
             password_hash=hashed_password,
@@ -38,16 +59,40 @@ class AuthService:
         """Login user"""
         user = db.query(User).filter(User.email == email).first()
         
-        if not user or not verify_password(password, user.password_hash):
+        valid, new_hash = PasswordHashService.verify_sync(password, user.password_hash) if user else (False, None)
+        if not valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Email atau password salah"
             )
         
+        if new_hash:
+            # Stored with an old cost factor; replace it while we have the password
+            user.password_hash = new_hash
+        
+        refresh_token = RefreshTokenService.issue(db, user.id)
+        db.commit()
+        if new_hash:
+            PasswordHashService.record_rehash()
+        
+        return AuthService._login_response(user, refresh_token)
+    
+    @staticmethod
+    def _login_response(user: User, refresh_token: str) -> dict:
+        """Tokens and user summary returned by login (user.positions must be loaded)"""
         # Create JWT token
         access_token = create_access_token({"sub": user.id})
-        refresh_token = create_refresh_token({"sub": user.id})
         
+        return {
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "token_type": "bearer",
+            "user": AuthService.user_summary(user)
+        }
+    
+    @staticmethod
+    def user_summary(user: User) -> dict:
+        """UserResponse fields of a user (user.positions must be loaded)"""
         # Get primary position or first position
         primary_position = None
         if user.positions:
@@ -57,19 +102,14 @@ class AuthService:
                 break
         
         return {
-            "access_token": access_token,
-            "refresh_token": refresh_token,
-            "token_type": "bearer",
-            "user": {
-                "id": user.id,
-                "email": user.email,
-                "name": user.name,
-                "nip": user.nip,
-                "role": primary_position.code if primary_position else "STAFF",
-                "department": user.department,
-                "is_active": user.is_active,
-                "created_at": user.created_at
-            }
+            "id": user.id,
+            "email": user.email,
+            "name": user.name,
+            "nip": user.nip,
+            "role": primary_position.code if primary_position else "STAFF",
+            "department": user.department,
+            "is_active": user.is_active,
+            "created_at": user.created_at
         }
     
     @staticmethod
@@ -83,4 +123,158 @@ class AuthService:
                 detail="User tidak ditemukan"
             )
         
-        return user
\ No newline at end of file
+        return user
+    
+    # Async variants for endpoints on AsyncSession (get_async_db).
+    # bcrypt is CPU-bound, so it runs in PasswordHashService's process pool.
+    
+    @staticmethod
+    async def login_async(db: AsyncSession, email: str, password: str) -> dict:
+        """Login user (async)"""
+        result = await db.execute(
+            select(User).options(selectinload(User.positions)).where(User.email == email)
+        )
+        user = result.scalars().first()
+        
+        valid, new_hash = await PasswordHashService.verify(password, user.password_hash) if user else (False, None)
+        if not valid:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Email atau password salah"
+            )
+        
+        if new_hash:
+            user.password_hash = new_hash
+        
+        refresh_token = await RefreshTokenService.issue_async(db, user.id)
+        await db.commit()
+        if new_hash:
+            PasswordHashService.record_rehash()
+        
+        return AuthService._login_response(user, refresh_token)
+    
+    @staticmethod
+    async def refresh_async(db: AsyncSession, refresh_token: str) -> dict:
+        """Rotate a refresh token and issue a new access token (no password check)"""
+        user_id, new_refresh_token = await RefreshTokenService.rotate(db, refresh_token)
+        
+        return {
+            "access_token": create_access_token({"sub": user_id}),
+            "refresh_token": new_refresh_token,
+            "token_type": "bearer"
+        }
+    
+    @staticmethod
+    async def logout_async(db: AsyncSession, payload: dict, refresh_token: Optional[str] = None,
+                           offline_key_id: Optional[str] = None):
+        """
+        Revoke the access token (until its exp) and optionally the device's
+        refresh tokens and offline signing key
+        """
+        revoked = []
+        jti = payload.get("jti")
+        if jti:
+            revoked.append((jti, datetime.fromtimestamp(payload["exp"], TZ)))
+        offline_key = decode_offline_key(offline_key_id) if offline_key_id else None
+        if offline_key is not None and offline_key.get("sub") == payload["sub"]:
+            revoked.append((offline_key["jti"], datetime.fromtimestamp(offline_key["exp"], TZ)))
+        
+        for revoked_jti, expires_at in revoked:
+            await TokenRevocationService.revoke(db, revoked_jti, payload["sub"], expires_at)
+        if refresh_token:
+            await RefreshTokenService.revoke_token_family(db, refresh_token, payload["sub"])
+        await db.commit()
+        
+        for revoked_jti, expires_at in revoked:
+            TokenRevocationService.remember(revoked_jti, expires_at)
+    
+    @staticmethod
+    async def set_pin_async(db: AsyncSession, user: User, pin: str, current_password: str):
+        """
+        Set or replace the user's login PIN. Needs the current password:
+        a PIN yields refresh tokens, so a stolen access token must not be
+        able to set one.
+        """
+        if not pin.isdigit():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="PIN harus 6 digit angka"
+            )
+        
+        valid, _ = await PasswordHashService.verify(current_password, user.password_hash)
+        if not valid:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Password saat ini salah"
+            )
+        
+        user.pin_hash = hash_pin(user.id, pin)
+        user.pin_failed_attempts = 0
+        user.pin_locked_until = None
+        await db.commit()
+    
+    @staticmethod
+    async def pin_login_async(db: AsyncSession, user_id: str, pin: str) -> dict:
+        """
+        Login with user id + PIN from a device that has logged in before.
+        The PIN check is an HMAC, not bcrypt. Every PIN_MAX_ATTEMPTS
+        consecutive failures lock PIN login, for PIN_LOCKOUT_MINUTES the
+        first time and twice as long each time after that; only a correct
+        PIN or setting a new one (which needs the password) starts over.
+        """
+        # Row lock: concurrent guesses are counted one after another
+        result = await db.execute(
+            select(User).options(selectinload(User.positions)).where(User.id == user_id).with_for_update()
+        )
+        user = result.scalars().first()
+        
+        if not user or not user.is_active or not user.pin_hash:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User ID atau PIN salah"
+            )
+        
+        now = get_jakarta_time()
+        if user.pin_locked_until and to_jakarta_time(user.pin_locked_until) > now:
+            retry_after = int((to_jakarta_time(user.pin_locked_until) - now).total_seconds()) + 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="PIN terkunci karena terlalu banyak percobaan, login dengan password atau coba lagi nanti",
+                headers={"Retry-After": str(retry_after)}
+            )
+        
+        if not verify_pin(user.id, pin, user.pin_hash):
+            attempts = (user.pin_failed_attempts or 0) + 1
+            user.pin_failed_attempts = attempts
+            if attempts % settings.PIN_MAX_ATTEMPTS == 0:
+                lockouts = attempts // settings.PIN_MAX_ATTEMPTS
+                minutes = settings.PIN_LOCKOUT_MINUTES * 2 ** min(lockouts - 1, MAX_LOCKOUT_DOUBLINGS)
+                user.pin_locked_until = now + timedelta(minutes=minutes)
+                logger.warning(f"PIN login locked for user {user.id} for {minutes} minutes after {attempts} failed attempts")
+            await db.commit()
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User ID atau PIN salah"
+            )
+        
+        if user.pin_failed_attempts or user.pin_locked_until:
+            user.pin_failed_attempts = 0
+            user.pin_locked_until = None
+        
+        refresh_token = await RefreshTokenService.issue_async(db, user.id)
+        await db.commit()
+        
+        return AuthService._login_response(user, refresh_token)
+    
+    @staticmethod
+    async def get_user_by_id_async(db: AsyncSession, user_id: str) -> User:
+        """Get user by ID (async)"""
+        user = await db.get(User, user_id)
+        
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User tidak ditemukan"
+            )
+        
+        return user
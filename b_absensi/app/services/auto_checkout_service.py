@@ -1,10 +1,12 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
-from datetime import datetime, date, time
+from sqlalchemy import and_
+from datetime import datetime, date, time, timedelta
 import pytz
 from app.database import SessionLocal
 from app.models.absensi import Attendance, AttendanceStatus
 from app.models.user import User
+from app.services.checkin_journal_service import CheckinJournalService
+from app.services.photo_store_service import PhotoStoreService
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -28,14 +30,18 @@ class AutoCheckoutService:
         db: Session = SessionLocal()
         try:
             # Get yesterday's date (since this runs at midnight) in Jakarta timezone
-            yesterday = get_jakarta_time().date()
+            yesterday = get_jakarta_time().date() - timedelta(days=1)
             
             logger.info(f"Starting auto-checkout process for date: {yesterday}")
             
+            # Journaled check-ins must be in attendances to be checked out
+            if not CheckinJournalService.flush(yesterday):
+                logger.error(f"Journaled check-ins for {yesterday} not written yet; they are skipped")
+            
             # Find all attendances from yesterday that don't have check_out_time
             incomplete_attendances = db.query(Attendance).filter(
                 and_(
-                    func.date(Attendance.check_in_time) == yesterday,
+                    Attendance.work_date == yesterday,
                     Attendance.check_out_time.is_(None)
                 )
             ).all()
@@ -63,6 +69,11 @@ class AutoCheckoutService:
                     attendance.check_out_longitude = attendance.check_in_longitude
                     attendance.check_out_location = f"{attendance.check_in_location} (Auto Checkout)"
                     attendance.check_out_photo_url = attendance.check_in_photo_url  # Use same photo
+                    PhotoStoreService.add_ref(db, attendance.check_out_photo_url)  # Counted as a second reference
+                    attendance.check_out_photo_review_url = attendance.check_in_photo_review_url
+                    attendance.check_out_photo_thumb_url = attendance.check_in_photo_thumb_url
+                    attendance.check_out_photo_width = attendance.check_in_photo_width
+                    attendance.check_out_photo_height = attendance.check_in_photo_height
                     attendance.status = AttendanceStatus.INCOMPLETE  # Mark as incomplete
                     
                     db.commit()
@@ -95,9 +106,12 @@ class AutoCheckoutService:
         try:
             logger.info(f"Manual auto-checkout triggered for date: {target_date}")
             
+            if not CheckinJournalService.flush(target_date):
+                logger.error(f"Journaled check-ins for {target_date} not written yet; they are skipped")
+            
             incomplete_attendances = db.query(Attendance).filter(
                 and_(
-                    func.date(Attendance.check_in_time) == target_date,
+                    Attendance.work_date == target_date,
                     Attendance.check_out_time.is_(None)
                 )
             ).all()
@@ -119,6 +133,11 @@ class AutoCheckoutService:
                     attendance.check_out_longitude = attendance.check_in_longitude
                     attendance.check_out_location = f"{attendance.check_in_location} (Auto Checkout)"
                     attendance.check_out_photo_url = attendance.check_in_photo_url
+                    PhotoStoreService.add_ref(db, attendance.check_out_photo_url)
+                    attendance.check_out_photo_review_url = attendance.check_in_photo_review_url
+                    attendance.check_out_photo_thumb_url = attendance.check_in_photo_thumb_url
+                    attendance.check_out_photo_width = attendance.check_in_photo_width
+                    attendance.check_out_photo_height = attendance.check_in_photo_height
                     attendance.status = AttendanceStatus.INCOMPLETE
                     
                     db.commit()
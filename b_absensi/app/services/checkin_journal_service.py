@@ -0,0 +1,427 @@
+"""
+Check-in Journal Service - optional write-behind mode for check-ins.
+Accepted check-ins are appended to a local fsync'd journal and
+acknowledged right away; a background writer group-commits them to
+attendances and replays the journal after a crash or database outage.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from typing import Dict, List, Optional, Set, Tuple
+import pytz
+from fastapi import HTTPException, status
+from app.config import settings
+from app.database import ReadRouting, SessionLocal, insert_new_rows
+from app.models.absensi import Attendance
+from app.services.photo_store_service import PhotoStoreService
+from app.utils.timezone import to_jakarta_time
+
+logger = logging.getLogger(__name__)
+
+TZ = pytz.timezone('Asia/Jakarta')
+
+def get_jakarta_time():
+    """Get current datetime in Asia/Jakarta timezone"""
+    return datetime.now(TZ)
+
+JOURNAL_FILE = "checkins.jsonl"
+CHECKPOINT_FILE = "checkins.checkpoint"
+COMPACT_BYTES = 1024 * 1024  # Truncate the journal once fully written and at least this big
+MAX_READ_BYTES = 4 * 1024 * 1024
+MAX_RETRY_SECONDS = 30
+
+# Attendance columns carried in a journal entry
+ENTRY_FIELDS = (
+    "id", "user_id", "check_in_time", "work_date", "check_in_latitude",
+    "check_in_longitude", "check_in_location", "check_in_photo_url",
+    "required_checkout_time", "status", "created_at",
+)
+DATETIME_FIELDS = ("check_in_time", "required_checkout_time", "created_at")  # ISO 8601 with the +07:00 offset
+
+class CheckinJournalService:
+    """
+    Journal layout (CHECKIN_JOURNAL_DIR):
+      checkins.jsonl       one JSON check-in per line, append only
+      checkins.checkpoint  byte offset up to which entries are in attendances
+
+    The journal belongs to one API process (it is flock'ed); a second
+    process that cannot lock it writes check-ins directly instead. The
+    pending index only spares this process a round trip: the unique
+    (user_id, work_date) key decides which check-in of a day is kept.
+    """
+
+    _cond = threading.Condition()  # Guards the state below; writer wakeups
+    _sync_lock = threading.Lock()
+    _fd: Optional[int] = None
+    _dir: Optional[str] = None
+    _written = 0  # Bytes appended to the journal
+    _synced = 0  # Bytes known to be on disk
+    _checkpoint = 0  # Bytes already written to the database
+    _pending: Dict[Tuple[str, date], dict] = {}  # (user_id, work_date) -> entry
+    _pending_ids: Set[str] = set()
+    _thread: Optional[threading.Thread] = None
+    _stopping = False
+    _flush_requested = False  # Someone is waiting on a pending entry; skip the batching delay
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return cls._fd is not None
+
+    @classmethod
+    def start(cls):
+        """Open the journal, load unwritten entries and start the writer (application startup)"""
+        if not settings.CHECKIN_JOURNAL_ENABLED or cls._fd is not None:
+            return
+
+        os.makedirs(settings.CHECKIN_JOURNAL_DIR, exist_ok=True)
+        path = os.path.join(settings.CHECKIN_JOURNAL_DIR, JOURNAL_FILE)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            logger.error(f"Check-in journal {path} is locked by another process; writing check-ins directly")
+            return
+
+        cls._dir = settings.CHECKIN_JOURNAL_DIR
+        size = cls._discard_torn_tail(fd)
+        checkpoint = cls._read_checkpoint()
+        if checkpoint > size:
+            checkpoint = 0  # Journal replaced underneath us; replay it all (writes are deduplicated)
+
+        cls._fd = fd
+        cls._written = cls._synced = size
+        cls._checkpoint = checkpoint
+        cls._stopping = False
+        cls._pending.clear()
+        cls._pending_ids.clear()
+
+        entries, _ = cls._read_entries(checkpoint, size, limit=None)
+        for entry in entries:
+            cls._track(entry)
+        if entries:
+            logger.info(f"Replaying {len(entries)} check-ins from the journal")
+
+        cls._thread = threading.Thread(target=cls._run_writer, name="checkin-journal-writer", daemon=True)
+        cls._thread.start()
+        logger.info(f"Check-in journal enabled at {path}")
+
+    @classmethod
+    def stop(cls, timeout: float = 10.0):
+        """Let the writer drain what it can, then close the journal (application shutdown)"""
+        if cls._fd is None:
+            return
+
+        with cls._cond:
+            cls._stopping = True
+            cls._cond.notify_all()
+        if cls._thread is not None:
+            cls._thread.join(timeout)
+            cls._thread = None
+
+        with cls._cond:
+            os.close(cls._fd)
+            cls._fd = None
+            if cls._pending:
+                logger.warning(f"{len(cls._pending)} journaled check-ins will be written on next startup")
+
+    @classmethod
+    def submit(cls, attendance: Attendance):
+        """
+        Durably journal a new check-in (blocking; run in a threadpool).
+        Fills in the attendance id so the response can be built from it.
+        """
+        attendance.id = attendance.id or str(uuid.uuid4())
+        attendance.created_at = attendance.created_at or get_jakarta_time()
+        values = {field: getattr(attendance, field) for field in ENTRY_FIELDS}
+        for field in DATETIME_FIELDS:
+            values[field] = to_jakarta_time(values[field]).isoformat()
+
+        data = (json.dumps(values, default=str) + "\n").encode()
+        entry = json.loads(data)  # Same shape as entries replayed from the file
+
+        with cls._cond:
+            key = (attendance.user_id, attendance.work_date)
+            if key in cls._pending:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Anda sudah check-in hari ini"
+                )
+            os.write(cls._fd, data)
+            cls._written += len(data)
+            end = cls._written
+            cls._track(entry)
+
+        cls._sync(end)
+        with cls._cond:
+            cls._cond.notify_all()
+
+    @classmethod
+    def _sync(cls, end: int):
+        """
+        fsync until offset end is on disk. Requests arriving while an
+        fsync runs are covered by the next one (group commit).
+        """
+        with cls._sync_lock:
+            if cls._synced >= end:
+                return
+            with cls._cond:
+                target = cls._written
+            os.fsync(cls._fd)
+            with cls._cond:
+                cls._synced = max(cls._synced, target)
+
+    @classmethod
+    def get_pending(cls, user_id: str, work_date: date) -> Optional[Attendance]:
+        """Journaled check-in that is not in attendances yet, as a transient Attendance"""
+        with cls._cond:
+            entry = cls._pending.get((user_id, work_date))
+        return cls._attendance_from(entry) if entry else None
+
+    @classmethod
+    async def wait_until_written(cls, attendance_id: str, timeout: float = 10.0) -> bool:
+        """Wait (without blocking the event loop) until a journaled check-in is in attendances"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with cls._cond:
+                if attendance_id not in cls._pending_ids:
+                    return True
+                cls._flush_requested = True
+                cls._cond.notify_all()
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+
+    @classmethod
+    async def flush_user(cls, user_id: str, work_date: Optional[date] = None, timeout: float = 10.0):
+        """
+        Make sure the user's journaled check-in for work_date (or all of
+        them) is in attendances before attendances are read for update
+        """
+        with cls._cond:
+            ids = [
+                entry["id"] for (entry_user_id, entry_date), entry in cls._pending.items()
+                if entry_user_id == user_id and work_date in (None, entry_date)
+            ]
+        for attendance_id in ids:
+            if not await cls.wait_until_written(attendance_id, timeout):
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Check-in Anda masih diproses, coba lagi sebentar"
+                )
+
+    @classmethod
+    def flush(cls, work_date: Optional[date] = None, timeout: float = 60.0) -> bool:
+        """
+        Blocking flush_user() for every user, for jobs that read attendances
+        in bulk (auto-checkout); False if entries were still pending at timeout
+        """
+        deadline = time.monotonic() + timeout
+        with cls._cond:
+            while any(work_date in (None, entry_date) for _, entry_date in cls._pending):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or cls._fd is None:
+                    return False
+                cls._flush_requested = True
+                cls._cond.notify_all()
+                cls._cond.wait(remaining)
+        return True
+
+    @classmethod
+    async def run_after_write(cls, attendance_id: str, func, *args, timeout: float = 300.0):
+        """Background task: run func(*args) once the check-in has been written"""
+        if await cls.wait_until_written(attendance_id, timeout):
+            await func(*args)
+        else:
+            logger.warning(f"Journaled check-in {attendance_id} not written after {timeout}s; skipping {func.__name__}")
+
+    @classmethod
+    def _track(cls, entry: dict):
+        """Add an entry to the pending index (caller holds _cond)"""
+        cls._pending[(entry["user_id"], date.fromisoformat(entry["work_date"]))] = entry
+        cls._pending_ids.add(entry["id"])
+
+    @staticmethod
+    def _values_from(entry: dict) -> dict:
+        values = dict(entry)
+        for field in DATETIME_FIELDS:
+            # Entries journaled before the offset was kept are Jakarta wall time
+            values[field] = to_jakarta_time(datetime.fromisoformat(values[field]))
+        values["work_date"] = date.fromisoformat(values["work_date"])
+        return values
+
+    @staticmethod
+    def _attendance_from(entry: dict) -> Attendance:
+        return Attendance(**CheckinJournalService._values_from(entry))
+
+    @classmethod
+    def _run_writer(cls):
+        delay = 0.0
+        while True:
+            interval = settings.CHECKIN_JOURNAL_FLUSH_MS / 1000
+            with cls._cond:
+                while cls._checkpoint >= cls._synced and not cls._stopping:
+                    cls._cond.wait()
+                if cls._checkpoint >= cls._synced:
+                    return  # Stopping with nothing left to write
+
+                # Give the burst a moment to fill the batch
+                deadline = time.monotonic() + interval
+                while (not cls._stopping and not cls._flush_requested
+                        and len(cls._pending_ids) < settings.CHECKIN_JOURNAL_BATCH_SIZE):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    cls._cond.wait(remaining)
+                cls._flush_requested = False
+                start, end, stopping = cls._checkpoint, cls._synced, cls._stopping
+
+            entries, consumed = cls._read_entries(start, end, limit=settings.CHECKIN_JOURNAL_BATCH_SIZE)
+            try:
+                cls._write_batch(entries)
+            except Exception as e:
+                delay = min(max(delay * 2, 1.0), MAX_RETRY_SECONDS)
+                logger.error(f"Error writing {len(entries)} journaled check-ins, retrying in {delay:.0f}s: {e}")
+                if stopping:
+                    return
+                retry_at = time.monotonic() + delay
+                with cls._cond:
+                    while not cls._stopping and time.monotonic() < retry_at:
+                        cls._cond.wait(retry_at - time.monotonic())
+                continue
+
+            delay = 0.0
+            cls._advance(start + consumed, entries)
+
+    @staticmethod
+    def _write_batch(entries: List[dict]):
+        """
+        Insert entries in one transaction. The keys skip rows already
+        present (replay) and days already checked in some other way (e.g.
+        the offline batch endpoint); only rows inserted here count a photo
+        reference.
+        """
+        if not entries:
+            return
+
+        ids = [entry["id"] for entry in entries]
+        db = SessionLocal()
+        try:
+            existing = {row.id for row in db.query(Attendance.id).filter(Attendance.id.in_(ids))}
+            rows = [CheckinJournalService._values_from(entry) for entry in entries if entry["id"] not in existing]
+            if rows:
+                db.execute(insert_new_rows(db, Attendance.__table__), rows)
+            present = {row.id for row in db.query(Attendance.id).filter(Attendance.id.in_(ids))}
+
+            new_entries = []
+            for entry in entries:
+                if entry["id"] in existing:
+                    continue
+                if entry["id"] not in present:
+                    logger.warning(
+                        f"Dropping journaled check-in {entry['id']}: user {entry['user_id']} "
+                        f"already checked in on {entry['work_date']}"
+                    )
+                    continue
+                PhotoStoreService.add_ref(db, entry["check_in_photo_url"])
+                new_entries.append(entry)
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        # The writer's session isn't tied to one user; pin each user's reads
+        for user_id in {entry["user_id"] for entry in new_entries}:
+            ReadRouting.mark_write(user_id)
+
+    @classmethod
+    def _advance(cls, offset: int, entries: List[dict]):
+        """Record that the journal is in the database up to offset"""
+        cls._write_checkpoint(offset)
+        with cls._cond:
+            cls._checkpoint = offset
+            for entry in entries:
+                cls._pending_ids.discard(entry["id"])
+                key = (entry["user_id"], date.fromisoformat(entry["work_date"]))
+                if cls._pending.get(key, {}).get("id") == entry["id"]:
+                    del cls._pending[key]
+
+            # Only while no fsync is in flight, so _synced can't be set past the new end
+            if (cls._checkpoint == cls._written and cls._written >= COMPACT_BYTES
+                    and cls._sync_lock.acquire(blocking=False)):
+                try:
+                    # Checkpoint first: a crash in between replays entries that
+                    # are already written, which _write_batch skips
+                    cls._write_checkpoint(0)
+                    os.ftruncate(cls._fd, 0)
+                    os.fsync(cls._fd)
+                    cls._written = cls._synced = cls._checkpoint = 0
+                finally:
+                    cls._sync_lock.release()
+            cls._cond.notify_all()
+
+    @classmethod
+    def _read_entries(cls, start: int, end: int, limit: Optional[int]) -> Tuple[List[dict], int]:
+        """Parse whole lines between start and end; returns (entries, bytes consumed)"""
+        fd = cls._fd
+        entries = []
+        consumed = 0
+        while start + consumed < end and (limit is None or len(entries) < limit):
+            chunk = os.pread(fd, min(end - start - consumed, MAX_READ_BYTES), start + consumed)
+            lines = chunk.split(b"\n")[:-1]  # Last piece is partial (or empty)
+            if not lines:
+                break
+            for line in lines:
+                if limit is not None and len(entries) >= limit:
+                    break
+                consumed += len(line) + 1
+                if not line.strip():
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logger.error(f"Skipping unreadable check-in journal line at offset {start + consumed - len(line) - 1}")
+        return entries, consumed
+
+    @classmethod
+    def _discard_torn_tail(cls, fd: int) -> int:
+        """Cut off a partially written last line (crash mid-append); returns the journal size"""
+        size = os.fstat(fd).st_size
+        if size == 0:
+            return 0
+        tail_start = max(0, size - MAX_READ_BYTES)
+        tail = os.pread(fd, size - tail_start, tail_start)
+        if tail.endswith(b"\n"):
+            return size
+        cut = tail_start + tail.rfind(b"\n") + 1
+        logger.warning(f"Discarding {size - cut} bytes of a torn check-in journal entry")
+        os.ftruncate(fd, cut)
+        os.fsync(fd)
+        return cut
+
+    @classmethod
+    def _read_checkpoint(cls) -> int:
+        try:
+            with open(os.path.join(cls._dir, CHECKPOINT_FILE)) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    @classmethod
+    def _write_checkpoint(cls, offset: int):
+        path = os.path.join(cls._dir, CHECKPOINT_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
@@ -1,110 +1,307 @@
 import requests
-from datetime import date
-from typing import List, Dict, Set
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, FrozenSet, List, Optional, Sequence, Set
 import logging
-from functools import lru_cache
+import numpy as np
+import pytz
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal, upsert
+from app.models.holiday import Holiday
+from app.utils.business_calendar import DateLike, WorkdayCalendar
+from app.utils.timezone import to_jakarta_time
 
 logger = logging.getLogger(__name__)
 
+TZ = pytz.timezone('Asia/Jakarta')
+
+def get_jakarta_time():
+    """Get current datetime in Asia/Jakarta timezone"""
+    return datetime.now(TZ)
+
+SEED_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "holidays_id.json")
+
+def parse_holidays(data) -> Dict[date, str]:
+    """holiday_date -> name from an api-harilibur response (or the seed file, same shape)"""
+    items = []
+    if isinstance(data, list):
+        items = data
+    elif isinstance(data, dict):
+        # If response is object, iterate through values
+        for value in data.values():
+            if isinstance(value, list):
+                items.extend(value)
+
+    holidays = {}
+    for item in items:
+        try:
+            # Normalize date format (handle single-digit days/months)
+            year_part, month_part, day_part = item['holiday_date'].split('-')
+            holiday_date = date.fromisoformat(f"{year_part}-{month_part.zfill(2)}-{day_part.zfill(2)}")
+            holidays[holiday_date] = item.get('holiday_name') or "Hari libur"
+        except (KeyError, ValueError, AttributeError) as e:
+            logger.warning(f"Error parsing holiday: {e}")
+    return holidays
+
 class HolidayService:
-    """Service for fetching and caching Indonesian public holidays"""
-    
-    API_URL = "https://api-harilibur.vercel.app/api"
-    
+    """
+    Indonesian public holidays, stored in the holidays table (seeded from
+    app/data/holidays_id.json) and served from memory: lookups never touch
+    the network or the database. A year older than HOLIDAY_MAX_AGE_HOURS
+    is still served as is while a background thread re-fetches it from
+    the API (stale-while-revalidate). A failed fetch changes nothing and
+    is retried after HOLIDAY_RETRY_MINUTES. Working-day counts come from a
+    WorkdayCalendar built from the same set and rebuilt when it changes.
+    """
+
+    API_URL = settings.HOLIDAY_API_URL
+
+    _lock = threading.Lock()
+    _holidays: Dict[int, FrozenSet[date]] = {}  # year -> dates
+    _refreshed_at: Dict[int, datetime] = {}  # year -> last successful API refresh (any process)
+    _retry_at: Dict[int, datetime] = {}  # year -> no fetch attempt before this
+    _refreshing: Set[int] = set()
+    _calendar: Optional[WorkdayCalendar] = None  # Rebuilt on first use after the holidays change
+    _executor: Optional[ThreadPoolExecutor] = None
+
     @staticmethod
-    @lru_cache(maxsize=10)
-    def fetch_holidays(year: int) -> Set[date]:
+    def fetch_holidays(year: int) -> Optional[Dict[date, str]]:
         """
-        Fetch holidays for a specific year from API
-        Returns a set of dates for quick lookup
-        Cached to avoid repeated API calls
+        Fetch holidays for a specific year from the API.
+        Returns None on any failure; background refresh only, never on a request.
         """
         try:
             logger.info(f"Fetching holidays for year {year} from API")
-            response = requests.get(f"{HolidayService.API_URL}?year={year}", timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                holidays = set()
-                
-                # Parse response - could be array or object
-                if isinstance(data, list):
-                    for item in data:
-                        try:
-                            holiday_date_str = item['holiday_date']
-                            # Normalize date format (handle single-digit days/months)
-                            parts = holiday_date_str.split('-')
-                            if len(parts) == 3:
-                                year_part, month_part, day_part = parts
-                                normalized = f"{year_part}-{month_part.zfill(2)}-{day_part.zfill(2)}"
-                                holiday_date = date.fromisoformat(normalized)
-                                holidays.add(holiday_date)
-                        except (KeyError, ValueError) as e:
-                            logger.warning(f"Error parsing holiday: {e}")
-                elif isinstance(data, dict):
-                    # If response is object, iterate through values
-                    for value in data.values():
-                        if isinstance(value, list):
-                            for item in value:
-                                try:
-                                    holiday_date_str = item['holiday_date']
-                                    # Normalize date format (handle single-digit days/months)
-                                    parts = holiday_date_str.split('-')
-                                    if len(parts) == 3:
-                                        year_part, month_part, day_part = parts
-                                        normalized = f"{year_part}-{month_part.zfill(2)}-{day_part.zfill(2)}"
-                                        holiday_date = date.fromisoformat(normalized)
-                                        holidays.add(holiday_date)
-                                except (KeyError, ValueError) as e:
-                                    logger.warning(f"Error parsing holiday: {e}")
-                
-                logger.info(f"Successfully fetched {len(holidays)} holidays for year {year}")
-                return holidays
-            else:
+            response = requests.get(
+                f"{HolidayService.API_URL}?year={year}",
+                timeout=settings.HOLIDAY_API_TIMEOUT_SECONDS
+            )
+            if response.status_code != 200:
                 logger.error(f"Failed to fetch holidays: HTTP {response.status_code}")
-                return set()
-                
+                return None
+
+            holidays = {d: name for d, name in parse_holidays(response.json()).items() if d.year == year}
+            logger.info(f"Successfully fetched {len(holidays)} holidays for year {year}")
+            return holidays
+
         except requests.exceptions.RequestException as e:
             logger.error(f"Error fetching holidays from API: {e}")
-            return set()
+            return None
         except Exception as e:
             logger.error(f"Unexpected error fetching holidays: {e}")
-            return set()
-    
+            return None
+
+    @classmethod
+    def load(cls, db: Session):
+        """Replace the in-memory calendar with the holidays table"""
+        years: Dict[int, Set[date]] = {}
+        for (holiday_date,) in db.query(Holiday.holiday_date):
+            years.setdefault(holiday_date.year, set()).add(holiday_date)
+
+        refreshed = {
+            row.year: to_jakarta_time(row.refreshed_at)
+            for row in db.query(Holiday.year, func.max(Holiday.updated_at).label("refreshed_at"))
+            .filter(Holiday.source == "api")
+            .group_by(Holiday.year)
+        }
+
+        with cls._lock:
+            cls._holidays = {year: frozenset(dates) for year, dates in years.items()}
+            cls._refreshed_at = refreshed
+            cls._calendar = None
+
+    @staticmethod
+    def seed(db: Session) -> int:
+        """Insert seed-file holidays for years the table has nothing for; returns rows added"""
+        with open(SEED_FILE, encoding="utf-8") as f:
+            holidays = parse_holidays(json.load(f))
+
+        # Whole years only: a date the API has since moved must not come back
+        existing = {year for (year,) in db.query(Holiday.year).distinct()}
+        added = 0
+        for holiday_date, name in sorted(holidays.items()):
+            if holiday_date.year in existing:
+                continue
+            db.add(Holiday(holiday_date=holiday_date, year=holiday_date.year, name=name, source="seed"))
+            added += 1
+        db.commit()
+        return added
+
+    @classmethod
+    def refresh_year(cls, db: Session, year: int) -> bool:
+        """
+        Re-fetch one year from the API into the table and memory.
+        False (and nothing changed) when the fetch fails or comes back empty.
+        """
+        holidays = cls.fetch_holidays(year)
+        if not holidays:
+            # Not published yet, or an error: keep serving what we have
+            with cls._lock:
+                cls._retry_at[year] = get_jakarta_time() + timedelta(minutes=settings.HOLIDAY_RETRY_MINUTES)
+            return False
+
+        now = get_jakarta_time()
+        current = {row.holiday_date: row.source for row in db.query(Holiday).filter(Holiday.year == year)}
+        for holiday_date, name in holidays.items():
+            if current.get(holiday_date) == "manual":
+                continue
+            db.execute(upsert(
+                db, Holiday.__table__,
+                values={"holiday_date": holiday_date, "year": year, "name": name, "source": "api", "updated_at": now},
+                update={"name": name, "source": "api", "updated_at": now},
+                index_elements=["holiday_date"]
+            ))
+        # Seeded/fetched dates the API no longer lists (moved holidays)
+        removed = [d for d, source in current.items() if source != "manual" and d not in holidays]
+        if removed:
+            db.query(Holiday).filter(Holiday.holiday_date.in_(removed)).delete(synchronize_session=False)
+        db.commit()
+
+        cls.load(db)
+        with cls._lock:
+            cls._retry_at.pop(year, None)
+        logger.info(f"Holidays for {year} refreshed: {len(holidays)} from API, {len(removed)} removed")
+        return True
+
+    @classmethod
+    def _is_stale(cls, year: int) -> bool:
+        now = get_jakarta_time()
+        retry_at = cls._retry_at.get(year)
+        if retry_at is not None and now < retry_at:
+            return False
+        refreshed_at = cls._refreshed_at.get(year)
+        return refreshed_at is None or now - refreshed_at > timedelta(hours=settings.HOLIDAY_MAX_AGE_HOURS)
+
+    @classmethod
+    def refresh(cls, db: Session, years: Optional[List[int]] = None) -> int:
+        """Refresh the stale ones of years (default: last, this and next year); returns years refreshed"""
+        cls.load(db)  # Another process may have refreshed already
+        if years is None:
+            current = get_jakarta_time().year
+            years = [current - 1, current, current + 1]
+        return sum(1 for year in years if cls._is_stale(year) and cls.refresh_year(db, year))
+
+    @classmethod
+    def _revalidate(cls, year: int):
+        """Refresh a stale year in the background; at most one refresh per year at a time"""
+        with cls._lock:
+            if year in cls._refreshing:
+                return
+            cls._refreshing.add(year)
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="holiday-refresh")
+
+        def run():
+            db = SessionLocal()
+            try:
+                cls.refresh(db, [year])
+            except Exception as e:
+                logger.error(f"Error refreshing holidays for {year}: {e}")
+                db.rollback()
+            finally:
+                db.close()
+                with cls._lock:
+                    cls._refreshing.discard(year)
+
+        cls._executor.submit(run)
+
+    @classmethod
+    def start(cls):
+        """Load the table at startup (seeding it if needed); on failure lookups see no holidays until the next refresh"""
+        db = SessionLocal()
+        try:
+            added = cls.seed(db)
+            cls.load(db)
+            logger.info(f"Holiday calendar loaded for {sorted(cls._holidays)} ({added} seeded)")
+        except Exception as e:
+            logger.error(f"Error loading holidays: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+    @classmethod
+    def shutdown(cls):
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+
+    @classmethod
+    def get_holidays(cls, year: int) -> FrozenSet[date]:
+        """Holidays of a year from memory; a stale or missing year is refreshed in the background"""
+        if cls._is_stale(year):
+            cls._revalidate(year)
+        return cls._holidays.get(year, frozenset())
+
     @staticmethod
     def is_holiday(check_date: date) -> bool:
         """Check if a specific date is a public holiday"""
-        holidays = HolidayService.fetch_holidays(check_date.year)
-        return check_date in holidays
-    
+        return check_date in HolidayService.get_holidays(check_date.year)
+
     @staticmethod
     def is_weekend(check_date: date) -> bool:
         """Check if a date is weekend (Saturday or Sunday)"""
         return check_date.weekday() >= 5  # 5=Saturday, 6=Sunday
-    
+
     @staticmethod
     def is_non_working_day(check_date: date) -> bool:
         """Check if a date is non-working day (weekend or holiday)"""
         return HolidayService.is_weekend(check_date) or HolidayService.is_holiday(check_date)
-    
+
     @staticmethod
     def get_holidays_for_range(start_date: date, end_date: date) -> List[date]:
         """Get all holidays within a date range"""
         if start_date > end_date:
             return []
-        
-        # Get unique years in the range
-        years = set()
-        current = start_date
-        while current <= end_date:
-            years.add(current.year)
-            current = date(current.year + 1, 1, 1) if current.month == 12 else date(current.year, current.month + 1, 1)
-        
-        # Fetch holidays for all years
+
         all_holidays = set()
-        for year in years:
-            all_holidays.update(HolidayService.fetch_holidays(year))
-        
+        for year in range(start_date.year, end_date.year + 1):
+            all_holidays.update(HolidayService.get_holidays(year))
+
         # Filter holidays within range
         holidays_in_range = [h for h in all_holidays if start_date <= h <= end_date]
         return sorted(holidays_in_range)
+
+    @classmethod
+    def calendar(cls, first_year: int, last_year: int) -> WorkdayCalendar:
+        """Working-day calendar covering at least first_year..last_year"""
+        for year in range(first_year, last_year + 1):
+            if cls._is_stale(year):
+                cls._revalidate(year)
+
+        calendar = cls._calendar
+        if calendar is not None and calendar.first_year <= first_year and last_year <= calendar.last_year:
+            return calendar
+
+        holidays = cls._holidays
+        current = get_jakarta_time().year
+        years = [first_year, last_year, current - 1, current + 1, *holidays]
+        if calendar is not None:
+            years += [calendar.first_year, calendar.last_year]
+        calendar = WorkdayCalendar(min(years), max(years), (d for dates in holidays.values() for d in dates))
+        with cls._lock:
+            # Don't install a calendar built from holidays that were replaced meanwhile
+            if cls._holidays is holidays:
+                cls._calendar = calendar
+        return calendar
+
+    @classmethod
+    def count_working_days(cls, start_date: date, end_date: date) -> int:
+        """Weekdays that are not holidays from start_date to end_date, inclusive"""
+        if start_date > end_date:
+            return 0
+        return cls.calendar(start_date.year, end_date.year).count(start_date, end_date)
+
+    @classmethod
+    def count_working_days_many(cls, start_dates: Sequence[DateLike], end_dates: Sequence[DateLike]) -> np.ndarray:
+        """count_working_days() for many ranges at once, as an int array in input order"""
+        starts = np.asarray(start_dates, dtype="datetime64[D]")
+        ends = np.asarray(end_dates, dtype="datetime64[D]")
+        if starts.size == 0:
+            return np.zeros(0, dtype=np.int32)
+        years = np.concatenate([starts, ends]).astype("datetime64[Y]").astype(np.int64) + 1970
+        return cls.calendar(int(years.min()), int(years.max())).count_many(starts, ends)
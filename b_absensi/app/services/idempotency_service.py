@@ -0,0 +1,201 @@
+"""
+Idempotency Service - replay the stored response of a request that is
+resent with the same Idempotency-Key header
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Optional
+import pytz
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.models.idempotency import IdempotencyKey
+from app.utils.timezone import to_jakarta_time
+
+logger = logging.getLogger(__name__)
+
+TZ = pytz.timezone('Asia/Jakarta')
+
+def get_jakarta_time():
+    """Get current datetime in Asia/Jakarta timezone"""
+    return datetime.now(TZ)
+
+POLL_INTERVAL_SECONDS = 0.25
+MAX_KEY_LENGTH = 255
+MAX_CLAIM_ATTEMPTS = 3  # Inserts per poll; more only if the key keeps being released/expiring under us
+CLAIMS = "idempotency_claims"  # Session.info entry: (user_id, key) -> id of the row this request holds
+
+class IdempotencyService:
+    """
+    Usage in a route:
+        replay = await IdempotencyService.begin(db, user_id, key, scope)
+        if replay is not None:
+            return replay
+        try:
+            ... do the work, then before the final commit:
+            IdempotencyService.complete(db, user_id, key, response)
+        except Exception:
+            await IdempotencyService.release(db, user_id, key)
+            raise
+
+    Only successful responses are stored, so a request that failed
+    (invalid location, too early to check out, ...) can be retried
+    with the same key. The row's id is the claim token, kept in the
+    request's Session.info: complete() and release() only touch the row
+    this request inserted, never a later attempt's claim.
+    """
+
+    @staticmethod
+    async def begin(db: Session, user_id: str, key: Optional[str], scope: str) -> Optional[JSONResponse]:
+        """
+        Claim the key for this request. Returns the stored response when
+        the key was already completed, or None when the caller should do
+        the work. A duplicate arriving while the first attempt is still
+        running waits for it (up to IDEMPOTENCY_WAIT_SECONDS).
+        """
+        if not key:
+            return None
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Idempotency-Key maksimal {MAX_KEY_LENGTH} karakter"
+            )
+
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            record = await run_in_threadpool(IdempotencyService._claim, db, user_id, key, scope)
+            if record is None:
+                return None
+
+            if record.scope != scope:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key sudah dipakai untuk request lain"
+                )
+
+            if record.status == "completed":
+                logger.info(f"Replaying {scope} response for user {user_id} (key {key})")
+                return JSONResponse(
+                    content=json.loads(record.response_body),
+                    status_code=record.response_status,
+                    headers={"Idempotent-Replayed": "true"}
+                )
+
+            if time.monotonic() >= deadline:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Request dengan Idempotency-Key ini masih diproses, coba lagi nanti"
+                )
+
+            # End the read transaction so the next poll sees the first attempt's commit
+            await run_in_threadpool(db.rollback)
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+    @staticmethod
+    def _claim(db: Session, user_id: str, key: str, scope: str) -> Optional[IdempotencyKey]:
+        """Insert an in-progress row; return the existing row if someone else holds the key"""
+        for _ in range(MAX_CLAIM_ATTEMPTS):
+            now = get_jakarta_time()
+
+            # Expired rows: completed past their TTL, or an attempt that died
+            # holding its lease. Deleting by expiry keeps a concurrent
+            # re-claim from being removed.
+            db.query(IdempotencyKey).filter(
+                IdempotencyKey.user_id == user_id,
+                IdempotencyKey.key == key,
+                IdempotencyKey.expires_at < now
+            ).delete(synchronize_session=False)
+
+            claim_id = str(uuid.uuid4())
+            db.add(IdempotencyKey(
+                id=claim_id,
+                user_id=user_id,
+                key=key,
+                scope=scope,
+                status="in_progress",
+                created_at=now,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS)
+            ))
+            try:
+                db.commit()
+                db.info.setdefault(CLAIMS, {})[(user_id, key)] = claim_id
+                return None
+            except IntegrityError:
+                db.rollback()
+
+            record = db.query(IdempotencyKey).filter(
+                IdempotencyKey.user_id == user_id,
+                IdempotencyKey.key == key
+            ).first()
+            if record is not None and to_jakarta_time(record.expires_at) >= now:
+                return record
+            # Released or expired between our insert and read; claim again
+
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Request dengan Idempotency-Key ini masih diproses, coba lagi nanti"
+        )
+
+    @staticmethod
+    def complete(db: Session, user_id: str, key: Optional[str], response: Any, status_code: int = 200):
+        """
+        Store the response for replay (no commit). Call before the commit
+        that saves the work so both land in the same transaction.
+        """
+        if not key:
+            return
+
+        claim_id = db.info.get(CLAIMS, {}).get((user_id, key))
+        updated = db.query(IdempotencyKey).filter(
+            IdempotencyKey.id == claim_id,
+            IdempotencyKey.status == "in_progress"
+        ).update({
+            "status": "completed",
+            "response_status": status_code,
+            "response_body": json.dumps(jsonable_encoder(response)),
+            "expires_at": get_jakarta_time() + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+        }, synchronize_session=False)
+        if not updated:
+            logger.warning(f"Idempotency key {key} for user {user_id} no longer held; response not stored")
+
+    @staticmethod
+    async def release(db: Session, user_id: str, key: Optional[str]):
+        """Give the key back after a failed attempt so the client can retry"""
+        if not key:
+            return
+        claim_id = db.info.get(CLAIMS, {}).pop((user_id, key), None)
+        if claim_id is None:
+            return
+        await run_in_threadpool(IdempotencyService._delete_claim, db, user_id, key, claim_id)
+
+    @staticmethod
+    def _delete_claim(db: Session, user_id: str, key: str, claim_id: str):
+        try:
+            db.rollback()
+            # Only our own claim: after our lease expired the key may belong to a retry
+            db.query(IdempotencyKey).filter(
+                IdempotencyKey.id == claim_id,
+                IdempotencyKey.status == "in_progress"
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            # The lease expires on its own
+            logger.error(f"Error releasing idempotency key {key} for user {user_id}: {e}")
+            db.rollback()
+
+    @staticmethod
+    def prune_expired(db: Session) -> int:
+        """Delete expired keys; returns the number of rows removed"""
+        count = db.query(IdempotencyKey).filter(
+            IdempotencyKey.expires_at < get_jakarta_time()
+        ).delete(synchronize_session=False)
+        db.commit()
+        return count
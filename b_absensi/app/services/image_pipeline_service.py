@@ -0,0 +1,126 @@
+"""
+Image Pipeline Service - normalize uploaded selfies into review and
+thumbnail derivatives in a bounded process pool after the request returns
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.database import SessionLocal
+from app.models.absensi import Attendance
+from app.services.photo_store_service import PhotoStoreService
+from app.utils.image_processing import render_derivatives
+
+logger = logging.getLogger(__name__)
+
+# Attendance columns per photo kind
+PHOTO_COLUMNS = {
+    "check_in": {
+        "original": "check_in_photo_url",
+        "review": "check_in_photo_review_url",
+        "thumb": "check_in_photo_thumb_url",
+        "width": "check_in_photo_width",
+        "height": "check_in_photo_height",
+    },
+    "check_out": {
+        "original": "check_out_photo_url",
+        "review": "check_out_photo_review_url",
+        "thumb": "check_out_photo_thumb_url",
+        "width": "check_out_photo_width",
+        "height": "check_out_photo_height",
+    },
+}
+
+class ImagePipelineService:
+    """Runs render_derivatives in a process pool, at most IMAGE_WORKERS * 2 jobs in flight"""
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _slots: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def _get_executor(cls) -> ProcessPoolExecutor:
+        if cls._executor is None:
+            # spawn: don't fork the scheduler/threadpool threads into workers
+            cls._executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return cls._executor
+
+    @classmethod
+    def _get_slots(cls) -> asyncio.Semaphore:
+        if cls._slots is None:
+            cls._slots = asyncio.Semaphore(settings.IMAGE_WORKERS * 2)
+        return cls._slots
+
+    @classmethod
+    def shutdown(cls):
+        """Stop worker processes (called on application shutdown)"""
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+        cls._slots = None
+
+    @staticmethod
+    async def process_attendance_photo(attendance_id: str, kind: str, photo_path: str):
+        """
+        Background task: build derivatives for one attendance photo and
+        store their paths and the review image size on the attendance.
+        Failures are logged; the original photo stays usable.
+        """
+        digest = PhotoStoreService.digest_of(photo_path)
+        if not digest:
+            return
+
+        review_path = PhotoStoreService.derivative_path(photo_path, "review")
+        thumb_path = PhotoStoreService.derivative_path(photo_path, "thumb")
+        targets = [
+            ("review", os.path.join(settings.UPLOAD_DIR, review_path), settings.IMAGE_REVIEW_SIZE),
+            ("thumb", os.path.join(settings.UPLOAD_DIR, thumb_path), settings.IMAGE_THUMB_SIZE),
+        ]
+
+        try:
+            async with ImagePipelineService._get_slots():
+                loop = asyncio.get_running_loop()
+                sizes = await loop.run_in_executor(
+                    ImagePipelineService._get_executor(),
+                    render_derivatives,
+                    os.path.join(settings.UPLOAD_DIR, photo_path),
+                    targets,
+                    settings.IMAGE_JPEG_QUALITY
+                )
+        except Exception as e:
+            logger.error(f"Error processing {kind} photo for attendance {attendance_id}: {e}")
+            return
+
+        width, height = sizes["review"]
+        await run_in_threadpool(
+            ImagePipelineService._save_derivatives,
+            attendance_id, kind, photo_path, review_path, thumb_path, width, height
+        )
+
+    @staticmethod
+    def _save_derivatives(attendance_id, kind, photo_path, review_path, thumb_path, width, height):
+        columns = PHOTO_COLUMNS[kind]
+        db = SessionLocal()
+        try:
+            # Only if the attendance still points at the photo we processed
+            db.query(Attendance).filter(
+                Attendance.id == attendance_id,
+                getattr(Attendance, columns["original"]) == photo_path
+            ).update({
+                columns["review"]: review_path,
+                columns["thumb"]: thumb_path,
+                columns["width"]: width,
+                columns["height"]: height,
+            }, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            logger.error(f"Error saving photo derivatives for attendance {attendance_id}: {e}")
+            db.rollback()
+        finally:
+            db.close()
@@ -0,0 +1,259 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+import logging
+import pytz
+from sqlalchemy import and_, func, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.database import upsert_rows
+from app.models.absensi import LeaveQuota
+from app.models.leave_ledger import LeaveQuotaEntry, LeaveQuotaSnapshot
+
+logger = logging.getLogger(__name__)
+
+TZ = pytz.timezone('Asia/Jakarta')
+
+def get_jakarta_time():
+    """Get current datetime in Asia/Jakarta timezone"""
+    return datetime.now(TZ)
+
+SNAPSHOT_BATCH = 1000  # Snapshot rows per executemany
+
+@dataclass(frozen=True)
+class QuotaBalance:
+    year: int
+    total_quota: int
+    used_quota: int
+
+    @property
+    def remaining_quota(self) -> int:
+        return self.total_quota - self.used_quota
+
+class LeaveLedgerService:
+    """
+    Leave quota ledger: every quota change is appended to
+    leave_quota_entries in the same transaction as the leave_quotas update
+    (LeaveQuotaService), so the counters can always be checked against,
+    and rebuilt from, the entries. A balance is the user's snapshot plus
+    the entries after it; snapshots are advanced by a scheduler job so
+    that tail stays short.
+    """
+
+    # Writes (statements for the caller's transaction)
+
+    @staticmethod
+    def entry_stmt(user_id: str, year: int, kind: str, quota_change: int = 0,
+                   used_change: int = 0, leave_id: Optional[str] = None):
+        return insert(LeaveQuotaEntry).values(
+            user_id=user_id,
+            year=year,
+            kind=kind,
+            quota_change=quota_change,
+            used_change=used_change,
+            leave_id=leave_id,
+            created_at=get_jakarta_time()
+        )
+
+    @staticmethod
+    def open_stmt(*criteria):
+        """Grant entries for leave_quotas rows matching criteria that have no entries yet"""
+        opening = select(
+            LeaveQuota.user_id, LeaveQuota.year, literal("grant"),
+            LeaveQuota.total_quota, LeaveQuota.used_quota, literal(get_jakarta_time())
+        ).where(
+            *criteria,
+            ~select(LeaveQuotaEntry.id).where(
+                LeaveQuotaEntry.user_id == LeaveQuota.user_id,
+                LeaveQuotaEntry.year == LeaveQuota.year
+            ).exists()
+        )
+        return insert(LeaveQuotaEntry).from_select(
+            ["user_id", "year", "kind", "quota_change", "used_change", "created_at"], opening
+        )
+
+    # Balances
+
+    @staticmethod
+    def _snapshot_stmt(user_id: str, year: int):
+        return select(LeaveQuotaSnapshot).where(
+            LeaveQuotaSnapshot.user_id == user_id,
+            LeaveQuotaSnapshot.year == year
+        )
+
+    @staticmethod
+    def _tail_stmt(user_id: str, year: int, after: int):
+        return select(
+            func.coalesce(func.sum(LeaveQuotaEntry.quota_change), 0),
+            func.coalesce(func.sum(LeaveQuotaEntry.used_change), 0)
+        ).where(
+            LeaveQuotaEntry.user_id == user_id,
+            LeaveQuotaEntry.year == year,
+            LeaveQuotaEntry.id > after
+        )
+
+    @staticmethod
+    def _balance(year: int, snapshot: Optional[LeaveQuotaSnapshot], tail) -> QuotaBalance:
+        quota, used = (snapshot.quota, snapshot.used) if snapshot else (0, 0)
+        return QuotaBalance(year=year, total_quota=quota + int(tail[0]), used_quota=used + int(tail[1]))
+
+    @staticmethod
+    def balance(db: Session, user_id: str, year: int) -> QuotaBalance:
+        """Snapshot plus the entries after it"""
+        snapshot = db.execute(LeaveLedgerService._snapshot_stmt(user_id, year)).scalars().first()
+        after = snapshot.last_entry_id if snapshot else 0
+        tail = db.execute(LeaveLedgerService._tail_stmt(user_id, year, after)).one()
+        return LeaveLedgerService._balance(year, snapshot, tail)
+
+    @staticmethod
+    async def balance_async(db: AsyncSession, user_id: str, year: int) -> QuotaBalance:
+        """Snapshot plus the entries after it (async)"""
+        snapshot = (await db.execute(LeaveLedgerService._snapshot_stmt(user_id, year))).scalars().first()
+        after = snapshot.last_entry_id if snapshot else 0
+        tail = (await db.execute(LeaveLedgerService._tail_stmt(user_id, year, after))).one()
+        return LeaveLedgerService._balance(year, snapshot, tail)
+
+    # Snapshots
+
+    @staticmethod
+    def materialize(db: Session) -> int:
+        """
+        Fold the entries after each snapshot into it; returns the number of
+        snapshots written. The tail is taken per user and year: entries of
+        one user's year are written under the leave_quotas row lock, so
+        their ids follow commit order, while ids of different users do not.
+        """
+        snapshot = LeaveQuotaSnapshot
+        tails = db.execute(
+            select(
+                LeaveQuotaEntry.user_id,
+                LeaveQuotaEntry.year,
+                func.sum(LeaveQuotaEntry.quota_change),
+                func.sum(LeaveQuotaEntry.used_change),
+                func.max(LeaveQuotaEntry.id),
+                snapshot.quota,
+                snapshot.used
+            ).outerjoin(
+                snapshot, and_(snapshot.user_id == LeaveQuotaEntry.user_id, snapshot.year == LeaveQuotaEntry.year)
+            ).where(
+                LeaveQuotaEntry.id > func.coalesce(snapshot.last_entry_id, 0)
+            ).group_by(LeaveQuotaEntry.user_id, LeaveQuotaEntry.year, snapshot.quota, snapshot.used)
+        ).all()
+        if not tails:
+            return 0
+
+        now = get_jakarta_time()
+        rows = [
+            {
+                "user_id": user_id,
+                "year": year,
+                "last_entry_id": last_entry_id,
+                "quota": (quota or 0) + int(quota_change),
+                "used": (used or 0) + int(used_change),
+                "updated_at": now
+            }
+            for user_id, year, quota_change, used_change, last_entry_id, quota, used in tails
+        ]
+        stmt = upsert_rows(
+            db, snapshot.__table__,
+            update_columns=["last_entry_id", "quota", "used", "updated_at"],
+            index_elements=["user_id", "year"]
+        )
+        for i in range(0, len(rows), SNAPSHOT_BATCH):
+            db.execute(stmt, rows[i:i + SNAPSHOT_BATCH])
+        db.commit()
+        logger.info(f"Leave quota snapshots advanced: {len(rows)} updated")
+        return len(rows)
+
+    # Audit
+
+    @staticmethod
+    async def history_async(db: AsyncSession, user_id: str, year: int) -> List[dict]:
+        """Every entry of a user's year in order, replayed into a running balance"""
+        entries = (await db.execute(
+            select(LeaveQuotaEntry).where(
+                LeaveQuotaEntry.user_id == user_id,
+                LeaveQuotaEntry.year == year
+            ).order_by(LeaveQuotaEntry.id)
+        )).scalars().all()
+
+        quota = used = 0
+        history = []
+        for entry in entries:
+            quota += entry.quota_change
+            used += entry.used_change
+            history.append({
+                "id": entry.id,
+                "kind": entry.kind,
+                "quota_change": entry.quota_change,
+                "used_change": entry.used_change,
+                "leave_id": entry.leave_id,
+                "created_at": entry.created_at,
+                "total_quota": quota,
+                "used_quota": used,
+                "remaining_quota": quota - used
+            })
+        return history
+
+    @staticmethod
+    async def audit_async(db: AsyncSession, year: int) -> List[dict]:
+        """
+        User quotas of a year where the leave_quotas counters or the
+        snapshot disagree with a full replay of the ledger
+        """
+        ledger = select(
+            LeaveQuotaEntry.user_id,
+            func.sum(LeaveQuotaEntry.quota_change).label("quota"),
+            func.sum(LeaveQuotaEntry.used_change).label("used")
+        ).where(LeaveQuotaEntry.year == year).group_by(LeaveQuotaEntry.user_id)
+        replayed = {row.user_id: (int(row.quota), int(row.used)) for row in await db.execute(ledger)}
+
+        counters = {
+            row.user_id: (row.total_quota, row.used_quota)
+            for row in await db.execute(
+                select(LeaveQuota.user_id, LeaveQuota.total_quota, LeaveQuota.used_quota)
+                .where(LeaveQuota.year == year)
+            )
+        }
+
+        # Snapshots against the entries they cover
+        covered = select(
+            LeaveQuotaSnapshot.user_id,
+            LeaveQuotaSnapshot.quota,
+            LeaveQuotaSnapshot.used,
+            func.coalesce(func.sum(LeaveQuotaEntry.quota_change), 0).label("ledger_quota"),
+            func.coalesce(func.sum(LeaveQuotaEntry.used_change), 0).label("ledger_used")
+        ).outerjoin(
+            LeaveQuotaEntry,
+            and_(
+                LeaveQuotaEntry.user_id == LeaveQuotaSnapshot.user_id,
+                LeaveQuotaEntry.year == LeaveQuotaSnapshot.year,
+                LeaveQuotaEntry.id <= LeaveQuotaSnapshot.last_entry_id
+            )
+        ).where(LeaveQuotaSnapshot.year == year).group_by(
+            LeaveQuotaSnapshot.user_id, LeaveQuotaSnapshot.quota, LeaveQuotaSnapshot.used
+        )
+        bad_snapshots = {
+            row.user_id: (row.quota, row.used)
+            for row in await db.execute(covered)
+            if (row.quota, row.used) != (int(row.ledger_quota), int(row.ledger_used))
+        }
+
+        mismatches = []
+        for user_id in sorted(set(replayed) | set(counters) | set(bad_snapshots)):
+            ledger_balance = replayed.get(user_id)
+            counter_balance = counters.get(user_id)
+            if ledger_balance == counter_balance and user_id not in bad_snapshots:
+                continue
+            mismatches.append({
+                "user_id": user_id,
+                "year": year,
+                "ledger": ledger_balance and {"total_quota": ledger_balance[0], "used_quota": ledger_balance[1]},
+                "counters": counter_balance and {"total_quota": counter_balance[0], "used_quota": counter_balance[1]},
+                "snapshot": bad_snapshots.get(user_id) and {
+                    "total_quota": bad_snapshots[user_id][0], "used_quota": bad_snapshots[user_id][1]
+                }
+            })
+        if mismatches:
+            logger.warning(f"Leave quota audit for {year}: {len(mismatches)} mismatches")
+        return mismatches
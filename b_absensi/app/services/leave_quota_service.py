@@ -1,9 +1,16 @@
+from sqlalchemy import case, delete, extract, func, inspect, literal, select, text, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from datetime import datetime, date, timedelta
+from datetime import datetime, date
+from typing import List, Tuple
 import pytz
+from app.config import settings
+from app.database import insert_missing, new_id
 from app.models.absensi import LeaveQuota
-from app.models.user import User
+from app.models.user import Position, User, user_positions
 from app.services.holiday_service import HolidayService
+from app.services.leave_ledger_service import LeaveLedgerService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,108 +22,270 @@ def get_jakarta_time():
     return datetime.now(TZ)
 
 class LeaveQuotaService:
-    """Service for managing annual leave quotas"""
+    """
+    Service for managing annual leave quotas.
+    Quota changes are single conditional UPDATEs, so concurrent requests
+    cannot overdraw a quota, each recorded in the ledger (LeaveLedgerService)
+    by the same transaction. Nothing here commits: every change is part of
+    the caller's transaction.
+    """
     
     @staticmethod
-    def get_or_create_quota(db: Session, user_id: str, year: int = None) -> LeaveQuota:
-        """Get or create leave quota for a user for a specific year"""
-        if year is None:
-            year = get_jakarta_time().year
+    def _entitlement(year: int):
+        """
+        SQL expression for a user's quota in year: the largest
+        annual_leave_quota of their positions (ANNUAL_LEAVE_QUOTA if none),
+        prorated over the months left for users who joined during year
+        """
+        position_quota = select(func.max(Position.annual_leave_quota)).select_from(
+            user_positions.join(Position, Position.id == user_positions.c.position_id)
+        ).where(user_positions.c.user_id == User.id).scalar_subquery()
+        quota = func.coalesce(position_quota, settings.ANNUAL_LEAVE_QUOTA)
         
-        quota = db.query(LeaveQuota).filter(
+        if not settings.LEAVE_QUOTA_PRORATE_NEW_HIRES:
+            return quota
+        months_left = 13 - extract("month", User.created_at)
+        return case(
+            (extract("year", User.created_at) == year, quota * months_left // 12),
+            else_=quota
+        )
+    
+    @staticmethod
+    def _insert_quotas_stmt(db, year: int, *criteria):
+        """INSERT ... SELECT of the year's quota row for users matching criteria that have none"""
+        entitlement = LeaveQuotaService._entitlement(year)
+        now = get_jakarta_time()
+        missing = select(
+            new_id(db), User.id, literal(year), entitlement, literal(0), entitlement, literal(now), literal(now)
+        ).where(
+            *criteria,
+            ~select(LeaveQuota.id).where(
+                LeaveQuota.user_id == User.id,
+                LeaveQuota.year == year
+            ).exists()
+        )
+        return insert_missing(
+            db, LeaveQuota.__table__,
+            ["id", "user_id", "year", "total_quota", "used_quota", "remaining_quota", "created_at", "updated_at"],
+            missing,
+            index_elements=["user_id", "year"]
+        )
+    
+    @staticmethod
+    def _deduct_stmt(user_id: str, days: int, year: int):
+        return update(LeaveQuota).where(
+            LeaveQuota.user_id == user_id,
+            LeaveQuota.year == year,
+            LeaveQuota.remaining_quota >= days
+        ).values(
+            used_quota=LeaveQuota.used_quota + days,
+            remaining_quota=LeaveQuota.remaining_quota - days
+        ).execution_options(synchronize_session=False)
+    
+    @staticmethod
+    def _restore_stmt(user_id: str, days: int, year: int):
+        # Never give back more than was used
+        return update(LeaveQuota).where(
+            LeaveQuota.user_id == user_id,
+            LeaveQuota.year == year,
+            LeaveQuota.used_quota >= days
+        ).values(
+            used_quota=LeaveQuota.used_quota - days,
+            remaining_quota=LeaveQuota.remaining_quota + days
+        ).execution_options(synchronize_session=False)
+    
+    @staticmethod
+    def _select_quota(user_id: str, year: int):
+        # Re-read the row even if the session holds it: the UPDATEs above bypass the ORM
+        return select(LeaveQuota).where(
             LeaveQuota.user_id == user_id,
             LeaveQuota.year == year
-        ).first()
-        
-        if not quota:
-            quota = LeaveQuota(
-                user_id=user_id,
-                year=year,
-                total_quota=12,
-                used_quota=0,
-                remaining_quota=12
-            )
-            db.add(quota)
-            db.commit()
-            db.refresh(quota)
-            logger.info(f"Created new leave quota for user {user_id} for year {year}")
+        ).execution_options(populate_existing=True)
+    
+    @staticmethod
+    def _ensure_quota(db: Session, user_id: str, year: int):
+        """Create the user's quota for year, with its ledger grant, unless it exists"""
+        result = db.execute(LeaveQuotaService._insert_quotas_stmt(db, year, User.id == user_id))
+        if result.rowcount:
+            db.execute(LeaveLedgerService.open_stmt(LeaveQuota.user_id == user_id, LeaveQuota.year == year))
+    
+    @staticmethod
+    async def _ensure_quota_async(db: AsyncSession, user_id: str, year: int):
+        result = await db.execute(LeaveQuotaService._insert_quotas_stmt(db, year, User.id == user_id))
+        if result.rowcount:
+            await db.execute(LeaveLedgerService.open_stmt(LeaveQuota.user_id == user_id, LeaveQuota.year == year))
+    
+    @staticmethod
+    def get_or_create_quota(db: Session, user_id: str, year: int = None) -> LeaveQuota:
+        """Get or create leave quota for a user for a specific year (not committed)"""
+        if year is None:
+            year = get_jakarta_time().year
         
-        return quota
+        LeaveQuotaService._ensure_quota(db, user_id, year)
+        return db.execute(LeaveQuotaService._select_quota(user_id, year)).scalars().one()
     
     @staticmethod
-    def deduct_quota(db: Session, user_id: str, days: int, year: int = None) -> bool:
+    def deduct_quota(db: Session, user_id: str, days: int, year: int = None, leave_id: str = None) -> bool:
         """
         Deduct days from user's annual leave quota
         Returns True if successful, False if insufficient quota
         """
-        quota = LeaveQuotaService.get_or_create_quota(db, user_id, year)
+        if year is None:
+            year = get_jakarta_time().year
+        
+        result = db.execute(LeaveQuotaService._deduct_stmt(user_id, days, year))
+        if result.rowcount == 0:
+            # No row yet for this year, or not enough left: create it and try once more
+            LeaveQuotaService._ensure_quota(db, user_id, year)
+            result = db.execute(LeaveQuotaService._deduct_stmt(user_id, days, year))
+            if result.rowcount == 0:
+                logger.warning(f"Insufficient quota for user {user_id}: need {days} days in {year}")
+                return False
         
-        if quota.remaining_quota < days:
-            logger.warning(f"Insufficient quota for user {user_id}: need {days}, have {quota.remaining_quota}")
+        db.execute(LeaveLedgerService.entry_stmt(user_id, year, "debit", used_change=days, leave_id=leave_id))
+        logger.info(f"Deducted {days} days from user {user_id} quota for {year}")
+        return True
+    
+    @staticmethod
+    def restore_quota(db: Session, user_id: str, days: int, year: int = None, leave_id: str = None) -> bool:
+        """
+        Restore days to user's quota (e.g., when leave is cancelled)
+        Returns False, changing nothing, if fewer than days were used
+        """
+        if year is None:
+            year = get_jakarta_time().year
+        
+        result = db.execute(LeaveQuotaService._restore_stmt(user_id, days, year))
+        if result.rowcount == 0:
+            logger.warning(f"Cannot restore {days} days to user {user_id} quota for {year}: not that many used")
             return False
         
-        quota.used_quota += days
-        quota.remaining_quota -= days
-        db.commit()
-        logger.info(f"Deducted {days} days from user {user_id} quota. Remaining: {quota.remaining_quota}")
+        db.execute(LeaveLedgerService.entry_stmt(user_id, year, "credit", used_change=-days, leave_id=leave_id))
+        logger.info(f"Restored {days} days to user {user_id} quota for {year}")
         return True
     
+    # Async variants for endpoints on AsyncSession (get_async_db)
+    
     @staticmethod
-    def restore_quota(db: Session, user_id: str, days: int, year: int = None):
-        """Restore days to user's quota (e.g., when leave is cancelled)"""
-        quota = LeaveQuotaService.get_or_create_quota(db, user_id, year)
+    async def get_or_create_quota_async(db: AsyncSession, user_id: str, year: int = None) -> LeaveQuota:
+        """Get or create leave quota for a user for a specific year (async, not committed)"""
+        if year is None:
+            year = get_jakarta_time().year
         
-        quota.used_quota -= days
-        quota.remaining_quota += days
+        await LeaveQuotaService._ensure_quota_async(db, user_id, year)
+        result = await db.execute(LeaveQuotaService._select_quota(user_id, year))
+        return result.scalars().one()
+    
+    @staticmethod
+    async def deduct_quota_async(db: AsyncSession, user_id: str, days: int, year: int = None,
+                                 leave_id: str = None) -> bool:
+        """Deduct days from user's annual leave quota (async); False if insufficient quota"""
+        if year is None:
+            year = get_jakarta_time().year
         
-        # Ensure we don't exceed total quota
-        if quota.remaining_quota > quota.total_quota:
-            quota.remaining_quota = quota.total_quota
-            quota.used_quota = 0
+        result = await db.execute(LeaveQuotaService._deduct_stmt(user_id, days, year))
+        if result.rowcount == 0:
+            await LeaveQuotaService._ensure_quota_async(db, user_id, year)
+            result = await db.execute(LeaveQuotaService._deduct_stmt(user_id, days, year))
+            if result.rowcount == 0:
+                logger.warning(f"Insufficient quota for user {user_id}: need {days} days in {year}")
+                return False
         
-        db.commit()
-        logger.info(f"Restored {days} days to user {user_id} quota. Remaining: {quota.remaining_quota}")
+        await db.execute(LeaveLedgerService.entry_stmt(user_id, year, "debit", used_change=days, leave_id=leave_id))
+        logger.info(f"Deducted {days} days from user {user_id} quota for {year}")
+        return True
     
     @staticmethod
-    def reset_annual_quotas(db: Session):
+    async def restore_quota_async(db: AsyncSession, user_id: str, days: int, year: int = None,
+                                  leave_id: str = None) -> bool:
+        """Restore days to user's quota (async); False, changing nothing, if fewer than days were used"""
+        if year is None:
+            year = get_jakarta_time().year
+        
+        result = await db.execute(LeaveQuotaService._restore_stmt(user_id, days, year))
+        if result.rowcount == 0:
+            logger.warning(f"Cannot restore {days} days to user {user_id} quota for {year}: not that many used")
+            return False
+        
+        await db.execute(LeaveLedgerService.entry_stmt(user_id, year, "credit", used_change=-days, leave_id=leave_id))
+        logger.info(f"Restored {days} days to user {user_id} quota for {year}")
+        return True
+    
+    @staticmethod
+    async def get_user_quota_info_async(db: AsyncSession, user_id: str, year: int = None) -> dict:
+        """Get detailed quota information for a user from the ledger (async)"""
+        if year is None:
+            year = get_jakarta_time().year
+        
+        await LeaveQuotaService._ensure_quota_async(db, user_id, year)
+        quota = await LeaveLedgerService.balance_async(db, user_id, year)
+        
+        return {
+            "year": quota.year,
+            "total_quota": quota.total_quota,
+            "used_quota": quota.used_quota,
+            "remaining_quota": quota.remaining_quota,
+            "percentage_used": round((quota.used_quota / quota.total_quota) * 100, 2) if quota.total_quota > 0 else 0
+        }
+    
+    @staticmethod
+    def reset_annual_quotas(db: Session, year: int = None) -> int:
         """
-        Reset all users' leave quotas for the new year
-        This should run at the beginning of each year (e.g., January 1st)
+        Create the year's quota for every active user who has none yet:
+        the New Year rollover, and new hires on the runs after it.
+        One INSERT ... SELECT per LEAVE_QUOTA_ROLLOVER_CHUNK users (by id),
+        each committed on its own to keep locks short.
         Does NOT carry over remaining quota from previous year
+        Returns the number of quotas created
         """
-        current_year = get_jakarta_time().year
-        
-        # Get all active users
-        users = db.query(User).filter(User.is_active == True).all()
+        if year is None:
+            year = get_jakarta_time().year
+        chunk = settings.LEAVE_QUOTA_ROLLOVER_CHUNK
         
         count = 0
-        for user in users:
-            # Check if quota exists for current year
-            existing_quota = db.query(LeaveQuota).filter(
-                LeaveQuota.user_id == user.id,
-                LeaveQuota.year == current_year
-            ).first()
+        after = None
+        while True:
+            # Last id of the next chunk; None once fewer than chunk users are left
+            page = select(User.id).order_by(User.id).offset(chunk - 1).limit(1)
+            if after is not None:
+                page = page.where(User.id > after)
+            upto = db.execute(page).scalar()
             
-            if not existing_quota:
-                # Create new quota for the year
-                new_quota = LeaveQuota(
-                    user_id=user.id,
-                    year=current_year,
-                    total_quota=12,
-                    used_quota=0,
-                    remaining_quota=12
-                )
-                db.add(new_quota)
-                count += 1
-        
-        db.commit()
-        logger.info(f"Reset leave quotas for {count} users for year {current_year}")
+            criteria = [User.is_active == True]
+            if after is not None:
+                criteria.append(User.id > after)
+            if upto is not None:
+                criteria.append(User.id <= upto)
+            
+            chunk_quotas = [
+                LeaveQuota.year == year,
+                *([LeaveQuota.user_id > after] if after is not None else []),
+                *([LeaveQuota.user_id <= upto] if upto is not None else [])
+            ]
+            # Counted, not rowcount: MariaDB's found rows include skipped duplicates
+            existing = db.execute(select(func.count()).select_from(LeaveQuota).where(*chunk_quotas)).scalar()
+            db.execute(LeaveQuotaService._insert_quotas_stmt(db, year, *criteria))
+            created = db.execute(select(func.count()).select_from(LeaveQuota).where(*chunk_quotas)).scalar() - existing
+            if created:
+                db.execute(LeaveLedgerService.open_stmt(*chunk_quotas))
+            db.commit()
+            count += created
+            
+            if upto is None:
+                break
+            after = upto
+        
+        logger.info(f"Reset leave quotas for {count} users for year {year}")
         return count
     
     @staticmethod
     def get_user_quota_info(db: Session, user_id: str, year: int = None) -> dict:
-        """Get detailed quota information for a user"""
-        quota = LeaveQuotaService.get_or_create_quota(db, user_id, year)
+        """Get detailed quota information for a user from the ledger"""
+        if year is None:
+            year = get_jakarta_time().year
+        
+        LeaveQuotaService._ensure_quota(db, user_id, year)
+        quota = LeaveLedgerService.balance(db, user_id, year)
         
         return {
             "year": quota.year,
@@ -127,21 +296,58 @@ class LeaveQuotaService:
         }
     
     @staticmethod
-    def calculate_working_days(start_date: date, end_date: date) -> int:
+    def add_unique_key(conn: Connection) -> int:
         """
-        Calculate number of working days between two dates
-        Excludes weekends (Saturday and Sunday) and public holidays
+        Migration 008 for run_migrations(): merge duplicate (user_id, year)
+        rows the way migrations/008 does (the oldest row keeps the summed
+        used_quota, the others are deleted), then add unique_user_year.
+        Returns the number of rows deleted; does nothing if the key exists.
         """
-        if start_date > end_date:
+        inspector = inspect(conn)
+        if not inspector.has_table("leave_quotas"):
+            return 0
+        keys = inspector.get_indexes("leave_quotas") + inspector.get_unique_constraints("leave_quotas")
+        if any(key["name"] == "unique_user_year" for key in keys):
             return 0
         
-        days = 0
-        current = start_date
-        
-        while current <= end_date:
-            # Skip weekends and holidays
-            if not HolidayService.is_non_working_day(current):
-                days += 1
-            current = current + timedelta(days=1)
+        table = LeaveQuota.__table__
+        duplicates = conn.execute(
+            select(table.c.user_id, table.c.year, func.sum(table.c.used_quota))
+            .group_by(table.c.user_id, table.c.year)
+            .having(func.count() > 1)
+        ).all()
+        deleted = 0
+        for user_id, year, used in duplicates:
+            keep_id = conn.execute(
+                select(table.c.id).where(table.c.user_id == user_id, table.c.year == year)
+                .order_by(table.c.created_at, table.c.id).limit(1)
+            ).scalar()
+            conn.execute(
+                update(table).where(table.c.id == keep_id)
+                .values(used_quota=used, remaining_quota=table.c.total_quota - used)
+            )
+            deleted += conn.execute(
+                delete(table).where(table.c.user_id == user_id, table.c.year == year, table.c.id != keep_id)
+            ).rowcount
         
-        return days
+        conn.execute(text("CREATE UNIQUE INDEX unique_user_year ON leave_quotas(user_id, year)"))
+        conn.commit()
+        if deleted:
+            logger.warning(f"Merged duplicate leave quotas: {deleted} rows deleted for {len(duplicates)} user years")
+        return deleted
+    
+    @staticmethod
+    def calculate_working_days(start_date: date, end_date: date) -> int:
+        """
+        Calculate number of working days between two dates
+        Excludes weekends (Saturday and Sunday) and public holidays
+        """
+        return HolidayService.count_working_days(start_date, end_date)
+    
+    @staticmethod
+    def calculate_working_days_many(ranges: List[Tuple[date, date]]) -> List[int]:
+        """calculate_working_days() for many (start_date, end_date) ranges, e.g. for reports"""
+        if not ranges:
+            return []
+        starts, ends = zip(*ranges)
+        return HolidayService.count_working_days_many(starts, ends).tolist()
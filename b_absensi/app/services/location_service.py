@@ -1,66 +1,377 @@
+import json
+import logging
 import math
-from typing import Tuple
-from app.config import LOKASI_ABSENSI
+import threading
+from dataclasses import dataclass
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config import LOKASI_ABSENSI, settings
+from app.database import SessionLocal
+from app.models.location import Location
+from app.utils.geofence import PolygonGeofence
+from app.utils.spatial_index import EARTH_RADIUS_KM, SphereKDTree
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Site:
+    """An active attendance site as held in the index"""
+    name: str
+    lat: float
+    lon: float
+    radius: Optional[float] = None  # dalam km; circular site
+    address: Optional[str] = None
+    id: Optional[str] = None
+    boundary: Optional[str] = None  # GeoJSON Polygon/MultiPolygon text; polygon site (radius ignored)
+
+    def to_dict(self) -> dict:
+        """Same shape as the LOKASI_ABSENSI entries, plus the boundary when there is one"""
+        data = {'lat': self.lat, 'lon': self.lon, 'radius': self.radius, 'address': self.address}
+        if self.boundary:
+            data['boundary'] = json.loads(self.boundary)
+        return data
+
+class LocationMatch(NamedTuple):
+    is_valid: bool
+    site: Optional[Site]  # The site matched, or the nearest one when invalid
+    distance: float  # km from the point to the site's edge; 0 when inside
+
+    @property
+    def name(self) -> str:
+        return self.site.name if self.site else ""
+
+class BatchMatch(NamedTuple):
+    """locate() results for many points as arrays (one element per point)"""
+    sites: List[Site]  # What site_index refers to
+    site_index: np.ndarray  # int; matched site, or nearest when invalid; -1 if there are no sites
+    distance: np.ndarray  # float km to that site's edge; 0 when inside
+    is_valid: np.ndarray  # bool
+
+    def names(self) -> List[str]:
+        return [self.sites[i].name if i >= 0 else "" for i in self.site_index.tolist()]
+
+def _unit_vectors(lat_rad: np.ndarray, lon_rad: np.ndarray) -> np.ndarray:
+    cos_lat = np.cos(lat_rad)
+    return np.stack([cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)], axis=-1)
+
+def _haversine(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+class _SiteIndex:
+    """
+    Immutable snapshot of the active sites; replaced as a whole on reload.
+    Each site is indexed at a centre with a reach: the radius of a circular
+    site, or the circle around a polygon's bounding box. Nothing outside
+    the reach can match, so the reach is the first (and cheapest) filter.
+    """
+
+    def __init__(self, sites: List[Site], loaded: bool = False):
+        self.sites = sites
+        self.loaded = loaded  # False while serving LOKASI_ABSENSI
+        self.fences: List[Optional[PolygonGeofence]] = [
+            PolygonGeofence.from_geojson(site.boundary) if site.boundary else None for site in sites
+        ]
+        centers = [
+            (fence.center_lat, fence.center_lon) if fence else (site.lat, site.lon)
+            for site, fence in zip(sites, self.fences)
+        ]
+        self.reach = [fence.reach_km if fence else site.radius for site, fence in zip(sites, self.fences)]
+        self.max_reach = max(self.reach, default=0.0)
+        self.tree = SphereKDTree(centers, range(len(sites)))
+
+        # Batch (NumPy) path: centres as unit vectors; a point is within a
+        # site's reach when the dot product is >= cos(reach / R)
+        self.lat_rad = np.radians(np.array([lat for lat, _ in centers], dtype=np.float64))
+        self.lon_rad = np.radians(np.array([lon for _, lon in centers], dtype=np.float64))
+        self.vectors = _unit_vectors(self.lat_rad, self.lon_rad)
+        self.reach_km = np.array(self.reach, dtype=np.float64)
+        self.min_dot = np.cos(self.reach_km / EARTH_RADIUS_KM)
+        self.is_polygon = np.array([fence is not None for fence in self.fences], dtype=bool)
+        self.polygons = np.flatnonzero(self.is_polygon)
+
+    def contains(self, i: int, lat: float, lon: float, center_distance: float) -> bool:
+        if center_distance > self.reach[i]:
+            return False
+        fence = self.fences[i]
+        return fence is None or fence.contains(lat, lon)
+
+    def edge_distance(self, i: int, lat: float, lon: float, center_distance: float) -> float:
+        fence = self.fences[i]
+        if fence is None:
+            return max(0.0, center_distance - self.reach[i])
+        return fence.distance_km(lat, lon)
 
 class LocationService:
+    """
+    Sites live in the locations table and are served from an in-memory
+    k-d tree, so a check-in costs one O(log n) query whatever the number
+    of sites. A site is a circle (radius) or a GeoJSON polygon footprint,
+    holes and multipolygons included. Edits through the API reload the
+    index right away; edits made elsewhere are picked up every
+    LOCATION_SYNC_SECONDS.
+    """
+
+    _lock = threading.Lock()
+    # Until the table is loaded, serve the configured sites
+    _index = _SiteIndex([
+        Site(name=name, lat=data['lat'], lon=data['lon'], radius=data['radius'], address=data.get('address'))
+        for name, data in LOKASI_ABSENSI.items()
+    ])
+
     @staticmethod
     def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """Hitung jarak antara dua koordinat (Haversine formula) dalam km"""
         R = 6371  # Radius bumi dalam km
-        
+
         lat1_rad = math.radians(lat1)
         lat2_rad = math.radians(lat2)
         delta_lat = math.radians(lat2 - lat1)
         delta_lon = math.radians(lon2 - lon1)
-        
+
         a = math.sin(delta_lat / 2) ** 2 + \
             math.cos(lat1_rad) * math.cos(lat2_rad) * \
             math.sin(delta_lon / 2) ** 2
         c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        
+
         return R * c
-    
+
+    @classmethod
+    def locate(cls, latitude: float, longitude: float) -> LocationMatch:
+        """
+        The site containing the point (a polygon before a circle, then the
+        closest centre); if there is none, the site with the nearest edge
+        (is_valid=False) for the error message.
+        """
+        index = cls._index
+        matches = [
+            (index.fences[i] is None, distance, i)
+            for i, distance in index.tree.within(latitude, longitude, index.max_reach)
+            if index.contains(i, latitude, longitude, distance)
+        ]
+        if matches:
+            _, _, i = min(matches)
+            return LocationMatch(True, index.sites[i], 0.0)
+
+        i, distance = cls._nearest_edge(index, latitude, longitude)
+        if i is None:
+            return LocationMatch(False, None, float('inf'))
+        return LocationMatch(False, index.sites[i], distance)
+
     @staticmethod
-    def validate_location(latitude: float, longitude: float) -> Tuple[bool, str]:
-        """Validasi apakah koordinat berada dalam radius lokasi yang valid"""
-        for location_name, location_data in LOKASI_ABSENSI.items():
-            distance = LocationService.calculate_distance(
-                latitude, 
-                longitude,
-                location_data['lat'],
-                location_data['lon']
+    def _nearest_edge(index: _SiteIndex, latitude: float, longitude: float) -> Tuple[Optional[int], float]:
+        """(site, km) with the closest edge: the nearest centre bounds the search"""
+        nearest = index.tree.nearest(latitude, longitude)
+        if nearest is None:
+            return None, float('inf')
+        best = nearest[0]
+        best_distance = index.edge_distance(best, latitude, longitude, nearest[1])
+        # A site's edge is at least (centre distance - reach) away
+        for i, distance in index.tree.within(latitude, longitude, best_distance + index.max_reach):
+            if i == best or distance - index.reach[i] >= best_distance:
+                continue
+            edge = index.edge_distance(i, latitude, longitude, distance)
+            if edge < best_distance:
+                best, best_distance = i, edge
+        return best, best_distance
+
+    @classmethod
+    def locate_many(cls, points: List[Tuple[float, float]]) -> List[LocationMatch]:
+        """locate() for many coordinates, results in input order"""
+        return [cls.locate(latitude, longitude) for latitude, longitude in points]
+
+    @classmethod
+    def locate_batch(
+        cls,
+        latitudes: Sequence[float],
+        longitudes: Sequence[float],
+        max_cells: Optional[int] = None
+    ) -> BatchMatch:
+        """
+        locate() for coordinate arrays, GEOFENCE_BATCH_MAX_CELLS points x
+        sites at a time. The matrix is a single matrix product of unit
+        vectors (the dot product falls as great-circle distance grows);
+        polygons are only tested for points within their reach and
+        bounding box. Same answers as locate(); meant for audits and bulk jobs.
+        """
+        index = cls._index
+        lat_deg = np.asarray(latitudes, dtype=np.float64)
+        lon_deg = np.asarray(longitudes, dtype=np.float64)
+        lat = np.radians(lat_deg)
+        lon = np.radians(lon_deg)
+        count = lat.shape[0]
+        site_index = np.full(count, -1, dtype=np.int64)
+        distance = np.full(count, np.inf)
+        is_valid = np.zeros(count, dtype=bool)
+
+        n_sites = len(index.sites)
+        if n_sites == 0 or count == 0:
+            return BatchMatch(index.sites, site_index, distance, is_valid)
+
+        max_cells = max_cells or settings.GEOFENCE_BATCH_MAX_CELLS
+        rows = max(1, max_cells // n_sites)
+        for start in range(0, count, rows):
+            stop = min(start + rows, count)
+            dots = _unit_vectors(lat[start:stop], lon[start:stop]) @ index.vectors.T  # (rows, n_sites)
+
+            inside = dots >= index.min_dot
+            for j in index.polygons:
+                points = np.flatnonzero(inside[:, j])
+                if points.size:
+                    hit = index.fences[j].contains_many(lat_deg[start + points], lon_deg[start + points])
+                    inside[points[~hit], j] = False
+
+            # Containing site: polygons first (+2 outranks any dot), then the closest centre
+            score = np.where(inside, dots + 2 * index.is_polygon, -np.inf)
+            best = score.argmax(axis=1)
+            found = inside[np.arange(stop - start), best]
+            site_index[start:stop] = np.where(found, best, -1)
+            is_valid[start:stop] = found
+            distance[start:stop] = np.where(found, 0.0, np.inf)
+
+            missed = np.flatnonzero(~found)
+            if missed.size:
+                chosen, edge = cls._nearest_edge_batch(
+                    index, dots[missed], lat_deg[start + missed], lon_deg[start + missed]
+                )
+                site_index[start + missed] = chosen
+                distance[start + missed] = edge
+
+        return BatchMatch(index.sites, site_index, distance, is_valid)
+
+    @classmethod
+    def inside_named_batch(
+        cls,
+        names: Sequence[Optional[str]],
+        latitudes: Sequence[float],
+        longitudes: Sequence[float]
+    ) -> np.ndarray:
+        """
+        Whether each point lies inside the active site with the given name
+        (False for names that are not an active site). Unlike locate_batch
+        this holds for points in overlapping sites whichever one wins.
+        """
+        index = cls._index
+        lat_deg = np.asarray(latitudes, dtype=np.float64)
+        lon_deg = np.asarray(longitudes, dtype=np.float64)
+        inside = np.zeros(lat_deg.shape[0], dtype=bool)
+
+        by_name = {site.name: j for j, site in enumerate(index.sites)}
+        site_of = np.array([by_name.get(name, -1) for name in names], dtype=np.int64)
+        for j in np.unique(site_of[site_of >= 0]).tolist():
+            points = np.flatnonzero(site_of == j)
+            center = _haversine(
+                np.radians(lat_deg[points]), np.radians(lon_deg[points]), index.lat_rad[j], index.lon_rad[j]
             )
-            
-            if distance <= location_data['radius']:
-                return True, location_name
-        
-        return False, ""
-    
+            hit = center <= index.reach_km[j]
+            if index.fences[j] is not None:
+                hit[hit] = index.fences[j].contains_many(lat_deg[points[hit]], lon_deg[points[hit]])
+            inside[points] = hit
+        return inside
+
     @staticmethod
-    def get_nearest_location(latitude: float, longitude: float) -> dict:
-        """Dapatkan lokasi terdekat dari koordinat yang diberikan"""
-        nearest = None
-        min_distance = float('inf')
-        
-        for location_name, location_data in LOKASI_ABSENSI.items():
-            distance = LocationService.calculate_distance(
-                latitude,
-                longitude,
-                location_data['lat'],
-                location_data['lon']
-            )
-            
-            if distance < min_distance:
-                min_distance = distance
-                nearest = {
-                    'name': location_name,
-                    'distance': round(distance, 2),
-                    **location_data
-                }
-        
-        return nearest
-    
+    def _nearest_edge_batch(index: _SiteIndex, dots: np.ndarray, lat_deg: np.ndarray, lon_deg: np.ndarray):
+        """_nearest_edge() for the rows of dots; polygon edges only where they can win"""
+        center = EARTH_RADIUS_KM * np.arccos(np.clip(dots, -1.0, 1.0))
+        # Exact for circles, a lower bound for polygons
+        edge = np.maximum(0.0, center - index.reach_km)
+        exact = np.where(index.is_polygon, np.inf, edge)
+        best = exact.argmin(axis=1)
+        best_distance = exact[np.arange(dots.shape[0]), best]
+        for j in index.polygons:
+            points = np.flatnonzero(edge[:, j] < best_distance)
+            if points.size:
+                polygon_distance = index.fences[j].distance_many(lat_deg[points], lon_deg[points])
+                closer = polygon_distance < best_distance[points]
+                best[points[closer]] = j
+                best_distance[points[closer]] = polygon_distance[closer]
+        return best, best_distance
+
+    @classmethod
+    def validate_location(cls, latitude: float, longitude: float) -> Tuple[bool, str]:
+        """Validasi apakah koordinat berada dalam radius lokasi yang valid"""
+        match = cls.locate(latitude, longitude)
+        return match.is_valid, match.name if match.is_valid else ""
+
+    @classmethod
+    def validate_locations(cls, points: List[Tuple[float, float]]) -> List[Tuple[bool, str]]:
+        """Validasi banyak koordinat sekaligus, hasil sesuai urutan input"""
+        return [
+            (match.is_valid, match.name if match.is_valid else "")
+            for match in cls.locate_many(points)
+        ]
+
+    @classmethod
+    def get_nearest_location(cls, latitude: float, longitude: float) -> Optional[dict]:
+        """Dapatkan lokasi terdekat dari koordinat yang diberikan (jarak ke batas area)"""
+        i, distance = cls._nearest_edge(cls._index, latitude, longitude)
+        if i is None:
+            return None
+        site = cls._index.sites[i]
+        return {'name': site.name, 'distance': round(distance, 2), **site.to_dict()}
+
     @staticmethod
-    def get_all_locations() -> dict:
+    def describe_mismatch(match: LocationMatch) -> str:
+        """'Nama (x km di luar area)' of the nearest site, for rejection messages"""
+        if match.site is None:
+            return "tidak ada lokasi absensi aktif"
+        return f"{match.site.name} ({round(match.distance, 2)} km di luar area)"
+
+    @classmethod
+    def get_all_locations(cls) -> dict:
         """Dapatkan semua lokasi absensi yang tersedia"""
-        return LOKASI_ABSENSI
+        return {site.name: site.to_dict() for site in cls._index.sites}
+
+    @staticmethod
+    def _site_from_row(row: Location) -> Site:
+        return Site(
+            name=row.name,
+            lat=row.latitude,
+            lon=row.longitude,
+            radius=row.radius,
+            address=row.address,
+            id=row.id,
+            boundary=row.boundary
+        )
+
+    @staticmethod
+    def _active_query():
+        return select(Location).where(Location.is_active.is_(True)).order_by(Location.name)
+
+    @classmethod
+    def _swap(cls, rows: List[Location]) -> bool:
+        """Install the sites from rows unless they are what is already served"""
+        sites = [cls._site_from_row(row) for row in rows]
+        with cls._lock:
+            if cls._index.loaded and sites == cls._index.sites:
+                return False
+            cls._index = _SiteIndex(sites, loaded=True)
+        return True
+
+    @classmethod
+    def reload(cls, db: Session) -> bool:
+        """
+        Re-read the active sites and rebuild the index if they changed
+        (also catches edits made with plain SQL); True if rebuilt
+        """
+        return cls._swap(db.execute(cls._active_query()).scalars().all())
+
+    @classmethod
+    async def reload_async(cls, db: AsyncSession) -> bool:
+        """reload() for AsyncSession"""
+        return cls._swap((await db.execute(cls._active_query())).scalars().all())
+
+    @classmethod
+    def start(cls):
+        """Load the table at startup; on failure the configured sites stay in use"""
+        db = SessionLocal()
+        try:
+            cls.reload(db)
+            logger.info(f"Location index built with {len(cls._index.sites)} active sites")
+        except Exception as e:
+            logger.error(f"Error loading locations, using LOKASI_ABSENSI: {e}")
+        finally:
+            db.close()
@@ -0,0 +1,186 @@
+"""
+Loop Monitor Service - measure event-loop lag and attribute stalls to the
+route (and stack) that was blocking the loop
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional
+import pytz
+from app.config import settings
+from app.utils.histogram import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+TZ = pytz.timezone('Asia/Jakarta')
+
+def get_jakarta_time():
+    """Get current datetime in Asia/Jakarta timezone"""
+    return datetime.now(TZ)
+
+STACK_LIMIT = 25  # Innermost frames kept per stall
+
+class LoopMonitorService:
+    """
+    A heartbeat task sleeps LOOP_MONITOR_INTERVAL_MS at a time and records
+    how late it wakes up. A watchdog thread notices when the heartbeat is
+    overdue by LOOP_LAG_THRESHOLD_MS and captures the loop thread's stack
+    and the route of the request task that is running, while it is still
+    blocking. LoopMonitorMiddleware maps request tasks to routes.
+    """
+
+    _lock = threading.Lock()
+    _heartbeat: Optional[asyncio.Task] = None
+    _watchdog: Optional[threading.Thread] = None
+    _stop = threading.Event()
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _loop_thread_id: Optional[int] = None
+    _last_beat = 0.0
+    _started_at: Optional[datetime] = None
+    _lag = LatencyHistogram()
+    _route_stalls: Dict[str, LatencyHistogram] = {}
+    _recent_stalls: deque = deque(maxlen=50)
+    _stall: Optional[dict] = None  # Captured by the watchdog for the stall in progress
+    _requests: Dict[int, dict] = {}  # id(task) -> ASGI scope
+
+    @classmethod
+    def start(cls):
+        """Start the heartbeat and watchdog (call from the running loop)"""
+        if not settings.LOOP_MONITOR_ENABLED or cls._heartbeat is not None:
+            return
+
+        cls._loop = asyncio.get_running_loop()
+        cls._loop_thread_id = threading.get_ident()
+        cls._last_beat = time.monotonic()
+        cls._started_at = get_jakarta_time()
+        cls._recent_stalls = deque(maxlen=settings.LOOP_STALL_HISTORY)
+        cls._stop.clear()
+
+        cls._heartbeat = cls._loop.create_task(cls._run_heartbeat(), name="loop-monitor-heartbeat")
+        cls._watchdog = threading.Thread(target=cls._run_watchdog, name="loop-monitor-watchdog", daemon=True)
+        cls._watchdog.start()
+        logger.info(
+            f"Loop monitor started (interval {settings.LOOP_MONITOR_INTERVAL_MS} ms, "
+            f"threshold {settings.LOOP_LAG_THRESHOLD_MS} ms)"
+        )
+
+    @classmethod
+    async def stop(cls):
+        if cls._heartbeat is None:
+            return
+
+        cls._stop.set()
+        cls._heartbeat.cancel()
+        try:
+            await cls._heartbeat
+        except asyncio.CancelledError:
+            pass
+        cls._heartbeat = None
+        if cls._watchdog is not None:
+            cls._watchdog.join(1.0)
+            cls._watchdog = None
+
+    @classmethod
+    def request_started(cls, task: Optional[asyncio.Task], scope: dict):
+        if task is not None:
+            cls._requests[id(task)] = scope
+
+    @classmethod
+    def request_finished(cls, task: Optional[asyncio.Task]):
+        if task is not None:
+            cls._requests.pop(id(task), None)
+
+    @classmethod
+    async def _run_heartbeat(cls):
+        interval = settings.LOOP_MONITOR_INTERVAL_MS / 1000
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            lag_ms = max(0.0, (now - started - interval) * 1000)
+
+            with cls._lock:
+                cls._last_beat = now
+                cls._lag.observe(lag_ms)
+                stall, cls._stall = cls._stall, None
+                if stall is not None:
+                    stall["lag_ms"] = round(lag_ms, 1)
+                    cls._route_stalls.setdefault(stall["route"], LatencyHistogram()).observe(lag_ms)
+                    cls._recent_stalls.append(stall)
+
+            if stall is not None:
+                logger.warning(
+                    f"Event loop blocked {lag_ms:.0f} ms by {stall['route']}\n" + "".join(stall["stack"])
+                )
+
+    @classmethod
+    def _run_watchdog(cls):
+        threshold = settings.LOOP_LAG_THRESHOLD_MS / 1000
+        interval = settings.LOOP_MONITOR_INTERVAL_MS / 1000
+        check_every = max(interval, threshold) / 4
+
+        while not cls._stop.wait(check_every):
+            overdue = time.monotonic() - cls._last_beat - interval
+            if overdue < threshold or cls._stall is not None:
+                continue
+
+            stall = cls._capture_stall(overdue)
+            with cls._lock:
+                if cls._stall is None and time.monotonic() - cls._last_beat - interval >= threshold:
+                    cls._stall = stall
+
+    @classmethod
+    def _capture_stall(cls, overdue: float) -> dict:
+        """Route and stack of whatever is running on the loop thread right now"""
+        frame = sys._current_frames().get(cls._loop_thread_id)
+        stack = traceback.format_stack(frame, limit=None)[-STACK_LIMIT:] if frame is not None else []
+        del frame
+
+        task = asyncio.current_task(cls._loop)
+        scope = cls._requests.get(id(task)) if task is not None else None
+        if scope is not None:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or scope.get("path", "")
+            label = f"{scope.get('method', '')} {path}"
+        elif task is not None:
+            label = f"task {task.get_name()}"
+        else:
+            label = "(loop callback)"
+
+        return {
+            "route": label,
+            "detected_after_ms": round(overdue * 1000, 1),
+            "at": get_jakarta_time().isoformat(),
+            "stack": stack,
+        }
+
+    @classmethod
+    def snapshot(cls, reset: bool = False) -> dict:
+        """Histograms and recent stalls for the metrics endpoint"""
+        with cls._lock:
+            routes = sorted(
+                ((route, hist.snapshot()) for route, hist in cls._route_stalls.items()),
+                key=lambda item: item[1]["sum_ms"],
+                reverse=True
+            )
+            result = {
+                "enabled": cls._heartbeat is not None,
+                "since": cls._started_at.isoformat() if cls._started_at else None,
+                "interval_ms": settings.LOOP_MONITOR_INTERVAL_MS,
+                "threshold_ms": settings.LOOP_LAG_THRESHOLD_MS,
+                "lag": cls._lag.snapshot(),
+                "stalls_by_route": dict(routes),
+                "recent_stalls": list(reversed(cls._recent_stalls)),
+                "in_flight_requests": len(cls._requests),
+            }
+            if reset:
+                cls._lag = LatencyHistogram()
+                cls._route_stalls = {}
+                cls._recent_stalls.clear()
+                cls._started_at = get_jakarta_time()
+        return result
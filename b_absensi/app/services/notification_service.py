@@ -3,6 +3,7 @@ Notification Service - Handle push notifications to users
 """
 import logging
 from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime
 from app.database import SessionLocal
@@ -123,6 +124,100 @@ class NotificationService:
             
         except Exception as e:
             logger.error(f"Error sending pending approval notification: {e}")
+    
+    # Async variants for endpoints on AsyncSession (get_async_db)
+    
+    @staticmethod
+    async def notify_leave_approved_async(db: AsyncSession, leave_id: str):
+        """Send notification when leave is approved (async)"""
+        try:
+            leave = await db.get(Leave, leave_id)
+            if not leave:
+                return
+            
+            user = await db.get(User, leave.user_id)
+            if not user:
+                return
+            
+            message = f"Pengajuan {leave.leave_type} Anda telah disetujui"
+            logger.info(f"Notification: {message} to {user.email}")
+            
+        except Exception as e:
+            logger.error(f"Error sending leave approval notification: {e}")
+    
+    @staticmethod
+    async def notify_leave_rejected_async(db: AsyncSession, leave_id: str, reason: str = ""):
+        """Send notification when leave is rejected (async)"""
+        try:
+            leave = await db.get(Leave, leave_id)
+            if not leave:
+                return
+            
+            user = await db.get(User, leave.user_id)
+            if not user:
+                return
+            
+            message = f"Pengajuan {leave.leave_type} Anda ditolak. Alasan: {reason}" if reason else f"Pengajuan {leave.leave_type} Anda ditolak"
+            logger.info(f"Notification: {message} to {user.email}")
+            
+        except Exception as e:
+            logger.error(f"Error sending leave rejection notification: {e}")
+    
+    @staticmethod
+    async def notify_task_assigned_async(db: AsyncSession, task_id: str):
+        """Send notification when task is assigned (async)"""
+        try:
+            task = await db.get(Task, task_id)
+            if not task:
+                return
+            
+            user = await db.get(User, task.assigned_to_id)
+            if not user:
+                return
+            
+            message = f"Anda ditugaskan tugas baru: {task.title}"
+            logger.info(f"Notification: {message} to {user.email}")
+            
+        except Exception as e:
+            logger.error(f"Error sending task assignment notification: {e}")
+    
+    @staticmethod
+    async def notify_task_completed_async(db: AsyncSession, task_id: str):
+        """Send notification when assigned task is completed (async)"""
+        try:
+            task = await db.get(Task, task_id)
+            if not task:
+                return
+            
+            user = await db.get(User, task.assigned_by_id)
+            if not user:
+                return
+            
+            assignee = await db.get(User, task.assigned_to_id)
+            message = f"Tugas '{task.title}' telah diselesaikan oleh {assignee.name}"
+            logger.info(f"Notification: {message} to {user.email}")
+            
+        except Exception as e:
+            logger.error(f"Error sending task completion notification: {e}")
+    
+    @staticmethod
+    async def notify_pending_approval_async(db: AsyncSession, leave_id: str):
+        """Send notification to supervisor about pending leave approval (async)"""
+        try:
+            leave = await db.get(Leave, leave_id)
+            if not leave or not leave.supervisor_id:
+                return
+            
+            supervisor = await db.get(User, leave.supervisor_id)
+            if not supervisor:
+                return
+            
+            submitter = await db.get(User, leave.user_id)
+            message = f"Ada pengajuan {leave.leave_type} dari {submitter.name} yang menunggu persetujuan Anda"
+            logger.info(f"Notification: {message} to {supervisor.email}")
+            
+        except Exception as e:
+            logger.error(f"Error sending pending approval notification: {e}")
 
 
 # TODO: Implement Firebase Cloud Messaging integration
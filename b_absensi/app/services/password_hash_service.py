@@ -0,0 +1,145 @@
+"""
+Password Hash Service - run bcrypt in a bounded process pool so login
+bursts can't starve the request threadpool
+"""
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from app.config import settings
+from app.utils.histogram import LatencyHistogram
+from app.utils.process_pool import timed_call
+from app.utils.security import hash_password, verify_and_update_password
+
+logger = logging.getLogger(__name__)
+
+class PasswordHashService:
+    """
+    At most BCRYPT_QUEUE_LIMIT hash/verify jobs may be queued or running;
+    beyond that callers get 503 with Retry-After instead of piling up.
+    """
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _executor_lock = threading.Lock()  # One pool even if the first requests race
+    _lock = threading.Lock()
+    _in_flight = 0
+    _peak_in_flight = 0
+    _rejected = 0
+    _rehashed = 0
+    _hash_time = LatencyHistogram()  # Time in the worker
+    _wait_time = LatencyHistogram()  # Time queued for a worker
+
+    @classmethod
+    def _get_executor(cls) -> ProcessPoolExecutor:
+        executor = cls._executor
+        if executor is None:
+            with cls._executor_lock:
+                if cls._executor is None:
+                    # spawn: don't fork the scheduler/threadpool threads into workers
+                    cls._executor = ProcessPoolExecutor(
+                        max_workers=settings.BCRYPT_WORKERS,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+                executor = cls._executor
+        return executor
+
+    @classmethod
+    def shutdown(cls):
+        """Stop worker processes (called on application shutdown)"""
+        with cls._executor_lock:
+            executor, cls._executor = cls._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @classmethod
+    def _acquire(cls):
+        with cls._lock:
+            if cls._in_flight >= settings.BCRYPT_QUEUE_LIMIT:
+                cls._rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server sedang sibuk, silakan coba lagi",
+                    headers={"Retry-After": str(settings.BCRYPT_RETRY_AFTER_SECONDS)}
+                )
+            cls._in_flight += 1
+            cls._peak_in_flight = max(cls._peak_in_flight, cls._in_flight)
+
+    @classmethod
+    def _release(cls, started: float, hash_seconds: Optional[float]):
+        total = time.perf_counter() - started
+        with cls._lock:
+            cls._in_flight -= 1
+            if hash_seconds is not None:
+                cls._hash_time.observe(hash_seconds * 1000)
+                cls._wait_time.observe(max(0.0, total - hash_seconds) * 1000)
+
+    @classmethod
+    async def _run(cls, func, *args):
+        cls._acquire()
+        started = time.perf_counter()
+        hash_seconds = None
+        try:
+            loop = asyncio.get_running_loop()
+            result, hash_seconds = await loop.run_in_executor(cls._get_executor(), timed_call, func, *args)
+            return result
+        finally:
+            cls._release(started, hash_seconds)
+
+    @classmethod
+    def _run_sync(cls, func, *args):
+        """For sync endpoints (already in a threadpool thread): the thread waits, the CPU work is elsewhere"""
+        cls._acquire()
+        started = time.perf_counter()
+        hash_seconds = None
+        try:
+            result, hash_seconds = cls._get_executor().submit(timed_call, func, *args).result()
+            return result
+        finally:
+            cls._release(started, hash_seconds)
+
+    @classmethod
+    async def hash(cls, password: str) -> str:
+        return await cls._run(hash_password, password)
+
+    @classmethod
+    def hash_sync(cls, password: str) -> str:
+        return cls._run_sync(hash_password, password)
+
+    @classmethod
+    async def verify(cls, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Returns (valid, new_hash); new_hash is set when the stored hash should be replaced"""
+        return await cls._run(verify_and_update_password, password, hashed)
+
+    @classmethod
+    def verify_sync(cls, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        return cls._run_sync(verify_and_update_password, password, hashed)
+
+    @classmethod
+    def record_rehash(cls):
+        with cls._lock:
+            cls._rehashed += 1
+
+    @classmethod
+    def snapshot(cls, reset: bool = False) -> dict:
+        with cls._lock:
+            result = {
+                "workers": settings.BCRYPT_WORKERS,
+                "queue_limit": settings.BCRYPT_QUEUE_LIMIT,
+                "in_flight": cls._in_flight,
+                "peak_in_flight": cls._peak_in_flight,
+                "rejected": cls._rejected,
+                "rehashed": cls._rehashed,
+                "hash_time": cls._hash_time.snapshot(),
+                "queue_wait": cls._wait_time.snapshot(),
+            }
+            if reset:
+                cls._peak_in_flight = cls._in_flight
+                cls._rejected = 0
+                cls._rehashed = 0
+                cls._hash_time = LatencyHistogram()
+                cls._wait_time = LatencyHistogram()
+        return result
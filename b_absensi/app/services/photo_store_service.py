@@ -0,0 +1,213 @@
+"""
+Photo Store Service - content-addressed, sharded storage for attendance photos
+"""
+import logging
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+import pytz
+from fastapi import UploadFile
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.database import upsert
+from app.models.absensi import Attendance, PhotoBlob
+from app.utils.upload import spool_upload
+
+logger = logging.getLogger(__name__)
+
+TZ = pytz.timezone('Asia/Jakarta')
+
+def get_jakarta_time():
+    """Get current datetime in Asia/Jakarta timezone"""
+    return datetime.now(TZ)
+
+BLOB_NAME_RE = re.compile(r"^([0-9a-f]{64})\.[a-z]+$")
+DERIVATIVE_NAMES = ("review", "thumb")  # Written by ImagePipelineService
+
+class PhotoStoreService:
+    """
+    Stores each distinct photo once under photos/<aa>/<bb>/<sha256>.<ext>.
+    Attendance photo URLs hold that relative path; photo_blobs counts how
+    many attendance columns reference each file so unreferenced blobs can
+    be garbage collected.
+    """
+
+    @staticmethod
+    def blob_path(digest: str, ext: str) -> str:
+        """Relative path (from UPLOAD_DIR) of a blob in the two-level shard tree"""
+        return "/".join(["photos", digest[:2], digest[2:4], f"{digest}{ext}"])
+
+    @staticmethod
+    def derivative_path(photo_path: str, name: str) -> str:
+        """Relative path of a derived JPEG (review/thumb) next to its blob"""
+        digest = PhotoStoreService.digest_of(photo_path)
+        return "/".join([os.path.dirname(photo_path), f"{digest}_{name}.jpg"])
+
+    @staticmethod
+    def digest_of(photo_path: Optional[str]) -> Optional[str]:
+        """Return the sha256 of a store path, or None for legacy/empty paths"""
+        if not photo_path or not photo_path.startswith("photos/"):
+            return None
+        match = BLOB_NAME_RE.match(os.path.basename(photo_path))
+        return match.group(1) if match else None
+
+    @staticmethod
+    async def store(file: UploadFile) -> str:
+        """
+        Stream an upload into the store and return its relative path.
+        Identical content (e.g. client retries) maps to the same file.
+        Call add_ref() in the transaction that saves the reference.
+        """
+        return await PhotoStoreService.place(await PhotoStoreService.spool(file))
+
+    @staticmethod
+    async def spool(file: UploadFile) -> Tuple[str, str, str]:
+        """
+        First half of store(): stream an upload into a temp file and return
+        (temp path, extension, sha256), e.g. to check a signature over the
+        digest before anything is stored. Follow with place() or discard().
+        """
+        tmp_dir = os.path.join(settings.PHOTO_STORE_DIR, ".tmp")
+        return await spool_upload(file, tmp_dir)
+
+    @staticmethod
+    async def place(spooled: Tuple[str, str, str]) -> str:
+        """Second half of store(): move a spooled upload to its content address"""
+        tmp_path, ext, digest = spooled
+        return await run_in_threadpool(PhotoStoreService._place_blob, tmp_path, digest, ext)
+
+    @staticmethod
+    def discard(spooled: Tuple[str, str, str]):
+        """Remove a spooled upload that will not be stored"""
+        try:
+            os.remove(spooled[0])
+        except OSError:
+            pass
+
+    @staticmethod
+    def _place_blob(tmp_path: str, digest: str, ext: str) -> str:
+        """Move a spooled temp file to its content address"""
+        rel_path = PhotoStoreService.blob_path(digest, ext)
+        final_path = os.path.join(settings.UPLOAD_DIR, rel_path)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+
+        if os.path.exists(final_path):
+            # Already stored; refresh mtime so the GC grace period covers
+            # the reference that is about to be added
+            os.remove(tmp_path)
+            os.utime(final_path)
+        else:
+            os.replace(tmp_path, final_path)
+
+        return rel_path
+
+    @staticmethod
+    def add_ref(db: Session, photo_path: Optional[str]):
+        """Count one more reference to a stored photo (no commit)"""
+        digest = PhotoStoreService.digest_of(photo_path)
+        if not digest:
+            return
+
+        now = get_jakarta_time()
+        table = PhotoBlob.__table__
+        db.execute(upsert(
+            db,
+            table,
+            values={"sha256": digest, "path": photo_path, "ref_count": 1, "created_at": now, "updated_at": now},
+            update={"ref_count": table.c.ref_count + 1, "updated_at": now},
+            index_elements=["sha256"]
+        ))
+
+    @staticmethod
+    def release_ref(db: Session, photo_path: Optional[str]):
+        """Drop one reference to a stored photo (no commit)"""
+        digest = PhotoStoreService.digest_of(photo_path)
+        if not digest:
+            return
+
+        db.execute(_release_stmt(digest))
+
+    @staticmethod
+    def collect_garbage(db: Session, grace_hours: int = None) -> int:
+        """
+        Delete blobs that have no references and were not touched within
+        the grace period, plus stale temp files from aborted uploads.
+        Returns the number of files removed.
+        """
+        if grace_hours is None:
+            grace_hours = settings.PHOTO_GC_GRACE_HOURS
+
+        cutoff = time.time() - grace_hours * 3600
+        root = settings.PHOTO_STORE_DIR
+        removed = 0
+
+        if not os.path.isdir(root):
+            return 0
+
+        tmp_dir = os.path.join(root, ".tmp")
+        if os.path.isdir(tmp_dir):
+            for entry in os.scandir(tmp_dir):
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+
+        for level1 in os.scandir(root):
+            if not level1.is_dir() or len(level1.name) != 2:
+                continue
+            for level2 in os.scandir(level1.path):
+                if not level2.is_dir():
+                    continue
+
+                candidates = {}
+                for entry in os.scandir(level2.path):
+                    match = BLOB_NAME_RE.match(entry.name)
+                    if match and entry.is_file() and entry.stat().st_mtime < cutoff:
+                        candidates[match.group(1)] = entry.path
+
+                if not candidates:
+                    continue
+
+                live = {
+                    row.sha256 for row in db.query(PhotoBlob.sha256).filter(
+                        PhotoBlob.sha256.in_(list(candidates)),
+                        PhotoBlob.ref_count > 0
+                    )
+                }
+                for digest, path in candidates.items():
+                    if digest not in live:
+                        os.remove(path)
+                        removed += 1
+                        for name in DERIVATIVE_NAMES:
+                            try:
+                                os.remove(os.path.join(level2.path, f"{digest}_{name}.jpg"))
+                            except OSError:
+                                pass
+
+        cutoff_time = get_jakarta_time() - timedelta(hours=grace_hours)
+        db.query(PhotoBlob).filter(
+            PhotoBlob.ref_count <= 0,
+            PhotoBlob.updated_at < cutoff_time
+        ).delete(synchronize_session=False)
+        db.commit()
+
+        logger.info(f"Photo store garbage collection removed {removed} files")
+        return removed
+
+def _release_stmt(digest: str):
+    table = PhotoBlob.__table__
+    return update(table).where(
+        table.c.sha256 == digest,
+        table.c.ref_count > 0
+    ).values(ref_count=table.c.ref_count - 1, updated_at=get_jakarta_time())
+
+@event.listens_for(Attendance, "after_delete")
+def _release_attendance_photos(mapper, connection, target):
+    """Deleted attendances (e.g. user cascade) give up their photo references"""
+    for photo_path in (target.check_in_photo_url, target.check_out_photo_url):
+        digest = PhotoStoreService.digest_of(photo_path)
+        if digest:
+            connection.execute(_release_stmt(digest))
@@ -0,0 +1,127 @@
+"""
+Principal Service - cache the identity of authenticated users so requests
+don't look the user up on every call
+"""
+import logging
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from app.config import settings
+from app.models.user import User, Position
+from app.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Principal:
+    """Identity fields of an authenticated user (no ORM state, safe to share)"""
+    id: str
+    name: str
+    nip: str
+    department: Optional[str]
+    is_active: bool
+    position_codes: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            name=user.name,
+            nip=user.nip,
+            department=user.department,
+            is_active=bool(user.is_active),
+            position_codes=tuple(sorted(position.code for position in user.positions))
+        )
+
+class PrincipalService:
+    """
+    Principals are cached for PRINCIPAL_CACHE_TTL_SECONDS. Changes to users
+    or positions made through the ORM in this process invalidate them right
+    away; the TTL bounds staleness for changes made elsewhere.
+    """
+
+    _cache = TTLCache(settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL_SECONDS)
+
+    @classmethod
+    async def get(cls, db: AsyncSession, user_id: str) -> Optional[Principal]:
+        """Cached principal, loading the user (with positions) on a miss"""
+        principal = cls._cache.get(user_id)
+        if principal is not None:
+            return principal
+
+        user = await db.get(User, user_id, options=[selectinload(User.positions)])
+        if user is None:
+            return None
+
+        principal = Principal.from_user(user)
+        cls._cache.set(user_id, principal)
+        return principal
+
+    @classmethod
+    def invalidate(cls, user_id: str):
+        cls._cache.pop(user_id)
+
+    @classmethod
+    def clear(cls):
+        cls._cache.clear()
+
+    @classmethod
+    def stats(cls, reset: bool = False) -> dict:
+        stats = cls._cache.snapshot()
+        if reset:
+            cls._cache.reset_counters()
+        return stats
+
+def _mark(session: Session, user_id: Optional[str]):
+    """Invalidate now and again after commit, so a concurrent miss can't re-cache pre-commit state"""
+    pending = session.info.setdefault("principal_invalidations", set())
+    if user_id is None:
+        pending.add(None)
+        PrincipalService.clear()
+    else:
+        pending.add(user_id)
+        PrincipalService.invalidate(user_id)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        _mark(session, target.id)
+    else:
+        PrincipalService.invalidate(target.id)
+
+@event.listens_for(Position, "after_update")
+@event.listens_for(Position, "after_delete")
+def _position_changed(mapper, connection, target):
+    # Positions are shared by many users and change rarely; drop everything
+    session = Session.object_session(target)
+    if session is not None:
+        _mark(session, None)
+    else:
+        PrincipalService.clear()
+
+@event.listens_for(Session, "do_orm_execute")
+def _bulk_change(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mappers = orm_execute_state.all_mappers
+    if any(mapper.class_ in (User, Position) for mapper in mappers):
+        _mark(orm_execute_state.session, None)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    pending = session.info.pop("principal_invalidations", None)
+    if not pending:
+        return
+    if None in pending:
+        PrincipalService.clear()
+    else:
+        for user_id in pending:
+            PrincipalService.invalidate(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop("principal_invalidations", None)
@@ -0,0 +1,146 @@
+"""
+Refresh Token Service - persist refresh tokens so they can be rotated on
+use and a replayed (stolen) token can be detected
+"""
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+import pytz
+from fastapi import HTTPException, status
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.refresh_token import RefreshToken
+from app.models.user import User
+from app.utils.security import REFRESH_TOKEN_EXPIRE_DAYS, create_refresh_token, decode_token
+
+logger = logging.getLogger(__name__)
+
+TZ = pytz.timezone('Asia/Jakarta')
+
+def get_jakarta_time():
+    """Get current datetime in Asia/Jakarta timezone"""
+    return datetime.now(TZ)
+
+def _invalid_refresh_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Refresh token tidak valid atau sudah kedaluwarsa"
+    )
+
+class RefreshTokenService:
+    """
+    A refresh token is a JWT whose jti is a refresh_tokens row. /refresh
+    marks the row used and issues the next token of the same family; a
+    used token coming back means two parties hold it, so the whole family
+    is revoked and that device has to log in again.
+    """
+
+    @staticmethod
+    def _new_token(user_id: str, family_id: Optional[str] = None) -> Tuple[RefreshToken, str]:
+        now = get_jakarta_time()
+        row = RefreshToken(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            family_id=family_id or str(uuid.uuid4()),
+            created_at=now,
+            expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+        )
+        token = create_refresh_token({"sub": user_id, "jti": row.id})
+        return row, token
+
+    @staticmethod
+    def issue(db: Session, user_id: str) -> str:
+        """Start a new token family (login); no commit"""
+        row, token = RefreshTokenService._new_token(user_id)
+        db.add(row)
+        return token
+
+    @staticmethod
+    async def issue_async(db: AsyncSession, user_id: str) -> str:
+        """issue() for AsyncSession; no commit"""
+        row, token = RefreshTokenService._new_token(user_id)
+        db.add(row)
+        return token
+
+    @staticmethod
+    async def rotate(db: AsyncSession, token: str) -> Tuple[str, str]:
+        """
+        Exchange a refresh token for the next one in its family; refused
+        once the user is inactive or gone.
+        Returns (user_id, new_refresh_token) and commits.
+        """
+        payload = decode_token(token)
+        if not payload or payload.get("type") != "refresh" or not payload.get("jti"):
+            raise _invalid_refresh_token()
+
+        jti = payload["jti"]
+        now = get_jakarta_time()
+
+        # Claim the token; of two concurrent refreshes only one matches
+        result = await db.execute(
+            update(RefreshToken).where(
+                RefreshToken.id == jti,
+                RefreshToken.used_at.is_(None),
+                RefreshToken.revoked_at.is_(None),
+                RefreshToken.expires_at > now
+            ).values(used_at=now)
+        )
+
+        if result.rowcount != 1:
+            record = await db.get(RefreshToken, jti)
+            if record is not None and record.used_at is not None:
+                await RefreshTokenService._revoke_family(db, record.family_id, now)
+                await db.commit()
+                logger.warning(
+                    f"Refresh token reuse for user {record.user_id}; revoked token family {record.family_id}"
+                )
+            raise _invalid_refresh_token()
+
+        record = await db.get(RefreshToken, jti)
+        # Deactivating a user ends their sessions, as it blocks password and PIN login
+        user = await db.get(User, record.user_id)
+        if user is None or not user.is_active:
+            await RefreshTokenService._revoke_family(db, record.family_id, now)
+            await db.commit()
+            logger.warning(f"Refresh by missing or inactive user {record.user_id}; revoked token family {record.family_id}")
+            raise _invalid_refresh_token()
+        
+        row, new_token = RefreshTokenService._new_token(record.user_id, record.family_id)
+        db.add(row)
+        record.replaced_by_id = row.id
+        await db.commit()
+        return record.user_id, new_token
+
+    @staticmethod
+    async def _revoke_family(db: AsyncSession, family_id: str, now: datetime):
+        await db.execute(
+            update(RefreshToken).where(
+                RefreshToken.family_id == family_id,
+                RefreshToken.revoked_at.is_(None)
+            ).values(revoked_at=now)
+        )
+
+    @staticmethod
+    async def revoke_token_family(db: AsyncSession, token: str, user_id: str) -> bool:
+        """Revoke the family of a user's refresh token (logout); no commit"""
+        payload = decode_token(token)
+        if not payload or payload.get("type") != "refresh" or payload.get("sub") != user_id:
+            return False
+
+        record = await db.get(RefreshToken, payload.get("jti"))
+        if record is None:
+            return False
+
+        await RefreshTokenService._revoke_family(db, record.family_id, get_jakarta_time())
+        return True
+
+    @staticmethod
+    def prune_expired(db: Session) -> int:
+        """Delete expired refresh tokens; returns the number of rows removed"""
+        count = db.query(RefreshToken).filter(
+            RefreshToken.expires_at < get_jakarta_time()
+        ).delete(synchronize_session=False)
+        db.commit()
+        return count
@@ -0,0 +1,197 @@
+"""
+Token Revocation Service - reject revoked access tokens without a
+database query on every request
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+import pytz
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.revoked_token import RevokedToken
+from app.utils.bloom_filter import BloomFilter
+from app.utils.timezone import to_jakarta_time
+from app.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+TZ = pytz.timezone('Asia/Jakarta')
+
+def get_jakarta_time():
+    """Get current datetime in Asia/Jakarta timezone"""
+    return datetime.now(TZ)
+
+SYNC_OVERLAP = timedelta(seconds=10)  # Re-read rows committed late by other processes
+CLEARED_TTL_SECONDS = 60  # How long a Bloom false positive is remembered as not revoked
+
+class TokenRevocationService:
+    """
+    revoked_tokens holds revoked jti values until the token's own expiry.
+    An in-process Bloom filter over them answers "not revoked" for almost
+    every request with no I/O; only a probable hit is checked against the
+    table. The filter is synced with rows from other processes every
+    REVOCATION_SYNC_SECONDS and rebuilt (dropping expired jti) hourly.
+    """
+
+    _lock = threading.Lock()
+    _filter: Optional[BloomFilter] = None  # None until built: check the table instead
+    _watermark: Optional[datetime] = None  # Latest revoked_at seen
+    _added_during_rebuild: Optional[List[str]] = None
+    _revoked = TTLCache(10000, clock=time.time)  # jti confirmed revoked, until the token expires
+    _cleared = TTLCache(10000, CLEARED_TTL_SECONDS)  # Filter hits confirmed not revoked
+    _lookups = 0
+    _filter_hits = 0
+    _false_positives = 0
+
+    @classmethod
+    async def is_revoked(cls, db: AsyncSession, jti: Optional[str]) -> bool:
+        """True when the access token with this jti was revoked"""
+        if not jti:
+            return False  # Tokens issued before jti existed expire on their own
+
+        cls._lookups += 1
+        bloom = cls._filter
+        if bloom is not None and jti not in bloom:
+            return False
+
+        cls._filter_hits += 1
+        if cls._revoked.get(jti) is not None:
+            return True
+        if cls._cleared.get(jti) is not None:
+            return False
+
+        record = await db.get(RevokedToken, jti)
+        if record is not None and to_jakarta_time(record.expires_at) > get_jakarta_time():
+            cls._revoked.set(jti, True, expires_at=to_jakarta_time(record.expires_at).timestamp())
+            return True
+
+        cls._false_positives += 1
+        cls._cleared.set(jti, True)
+        return False
+
+    @classmethod
+    async def revoke(cls, db: AsyncSession, jti: str, user_id: Optional[str], expires_at: datetime):
+        """Record a revoked access token (no commit; call remember() once committed)"""
+        existing = await db.get(RevokedToken, jti)
+        if existing is None:
+            db.add(RevokedToken(
+                jti=jti,
+                user_id=user_id,
+                revoked_at=get_jakarta_time(),
+                expires_at=expires_at
+            ))
+
+    @classmethod
+    def remember(cls, jti: str, expires_at: datetime):
+        """Add a committed revocation to this process's filter and caches"""
+        cls._add_to_filter([jti])
+        cls._revoked.set(jti, True, expires_at=expires_at.timestamp())
+
+    @classmethod
+    def _add_to_filter(cls, jtis: List[str]):
+        with cls._lock:
+            bloom = cls._filter
+            if cls._added_during_rebuild is not None:
+                cls._added_during_rebuild.extend(jtis)
+        if bloom is not None:
+            for jti in jtis:
+                bloom.add(jti)
+            if bloom.count > bloom.capacity:
+                logger.warning(
+                    f"Revocation filter holds {bloom.count} entries (capacity {bloom.capacity}); "
+                    f"false positives will rise until the next rebuild"
+                )
+        for jti in jtis:
+            cls._cleared.pop(jti)
+
+    @classmethod
+    def rebuild(cls, db: Session) -> int:
+        """Build a new filter from unexpired revocations and swap it in; returns its size"""
+        with cls._lock:
+            cls._added_during_rebuild = []
+
+        try:
+            now = get_jakarta_time()
+            rows = db.query(RevokedToken.jti, RevokedToken.revoked_at).filter(
+                RevokedToken.expires_at > now
+            ).all()
+
+            bloom = BloomFilter(
+                max(settings.REVOCATION_BLOOM_CAPACITY, len(rows) * 2),
+                settings.REVOCATION_BLOOM_ERROR_RATE
+            )
+            watermark = cls._watermark
+            for row in rows:
+                bloom.add(row.jti)
+                revoked_at = to_jakarta_time(row.revoked_at)
+                if watermark is None or revoked_at > watermark:
+                    watermark = revoked_at
+
+            with cls._lock:
+                # Revocations remembered while we were reading
+                for jti in cls._added_during_rebuild:
+                    bloom.add(jti)
+                cls._added_during_rebuild = None
+                cls._filter = bloom
+                cls._watermark = watermark or now
+        finally:
+            with cls._lock:
+                cls._added_during_rebuild = None
+
+        cls._cleared.clear()
+        return len(rows)
+
+    @classmethod
+    def sync(cls, db: Session) -> int:
+        """Add revocations committed by other processes since the last sync"""
+        if cls._filter is None:
+            return cls.rebuild(db)
+
+        since = cls._watermark - SYNC_OVERLAP if cls._watermark else None
+        query = db.query(RevokedToken.jti, RevokedToken.revoked_at)
+        if since is not None:
+            query = query.filter(RevokedToken.revoked_at >= since)
+        rows = query.all()
+
+        if rows:
+            cls._add_to_filter([row.jti for row in rows])
+            latest = max(to_jakarta_time(row.revoked_at) for row in rows)
+            if cls._watermark is None or latest > cls._watermark:
+                cls._watermark = latest
+        return len(rows)
+
+    @classmethod
+    def start(cls):
+        """Build the filter at startup; on failure requests fall back to the table"""
+        db = SessionLocal()
+        try:
+            count = cls.rebuild(db)
+            logger.info(f"Token revocation filter built with {count} entries")
+        except Exception as e:
+            logger.error(f"Error building token revocation filter: {e}")
+        finally:
+            db.close()
+
+    @staticmethod
+    def prune_expired(db: Session) -> int:
+        """Delete revocations of tokens that have expired anyway"""
+        count = db.query(RevokedToken).filter(
+            RevokedToken.expires_at < get_jakarta_time()
+        ).delete(synchronize_session=False)
+        db.commit()
+        return count
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        bloom = cls._filter
+        return {
+            "filter": bloom.snapshot() if bloom is not None else None,
+            "watermark": cls._watermark.isoformat() if cls._watermark else None,
+            "lookups": cls._lookups,
+            "filter_hits": cls._filter_hits,
+            "false_positives": cls._false_positives,
+        }
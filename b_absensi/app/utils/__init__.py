@@ -3,7 +3,12 @@ from .security import (
     verify_password,
     create_access_token,
     create_refresh_token,
-    decode_token
+    decode_token,
+    hash_pin,
+    verify_pin,
+    create_offline_key,
+    decode_offline_key,
+    verify_offline_signature
 )
 from .constants import VALID_LOCATIONS
 
@@ -13,6 +18,11 @@ __all__ = [
     'create_access_token',
     'create_refresh_token',
     'decode_token',
+    'hash_pin',
+    'verify_pin',
+    'create_offline_key',
+    'decode_offline_key',
+    'verify_offline_signature',
     'VALID_LOCATIONS'
 ]
 
@@ -0,0 +1,50 @@
+"""
+Bloom filter: set membership with no false negatives and a tunable
+false-positive rate, in a fixed amount of memory
+"""
+import hashlib
+import math
+import threading
+
+class BloomFilter:
+    """
+    Sized for capacity items at error_rate false positives. Bits are set
+    under a lock (add may run on the scheduler thread); lookups don't lock.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item: str):
+        positions = self._positions(item)
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def snapshot(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "items": self.count,
+            "bits": self.num_bits,
+            "hashes": self.num_hashes,
+            "target_error_rate": self.error_rate,
+        }
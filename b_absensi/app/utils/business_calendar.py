@@ -0,0 +1,59 @@
+"""
+Working-day calendar as a cumulative count array: the number of working
+days in any date range is two lookups and a subtraction
+"""
+from datetime import date
+from typing import Iterable, Sequence, Union
+import numpy as np
+
+DateLike = Union[date, np.datetime64, str]
+
+class WorkdayCalendar:
+    """
+    Covers whole years first_year..last_year. cumulative[i] is the number
+    of working days (Monday-Friday, not a holiday) strictly before
+    origin + i days. Immutable: build a new one when the holidays change.
+    """
+
+    def __init__(self, first_year: int, last_year: int, holidays: Iterable[date]):
+        self.first_year = first_year
+        self.last_year = last_year
+        self.origin = date(first_year, 1, 1)
+        self.end = date(last_year, 12, 31)
+        size = (self.end - self.origin).days + 1
+
+        working = (self.origin.weekday() + np.arange(size)) % 7 < 5  # 5=Saturday, 6=Sunday
+        offsets = [(h - self.origin).days for h in holidays if self.origin <= h <= self.end]
+        if offsets:
+            working[np.array(offsets, dtype=np.int64)] = False
+
+        self._cumulative = np.zeros(size + 1, dtype=np.int32)
+        np.cumsum(working, out=self._cumulative[1:])
+        self._origin64 = np.datetime64(self.origin, "D")
+
+    def covers(self, start: date, end: date) -> bool:
+        return self.origin <= start and end <= self.end
+
+    def count(self, start: date, end: date) -> int:
+        """Working days from start to end, both inclusive (0 when start > end)"""
+        if start > end:
+            return 0
+        if not self.covers(start, end):
+            raise ValueError(f"Range {start}..{end} is outside {self.first_year}-{self.last_year}")
+        return int(
+            self._cumulative[(end - self.origin).days + 1] - self._cumulative[(start - self.origin).days]
+        )
+
+    def count_many(self, starts: Sequence[DateLike], ends: Sequence[DateLike]) -> np.ndarray:
+        """count() for many ranges at once, as an int array in input order"""
+        first = np.asarray(starts, dtype="datetime64[D]") - self._origin64
+        last = np.asarray(ends, dtype="datetime64[D]") - self._origin64
+        first = first.astype(np.int64)
+        last = last.astype(np.int64)
+        size = self._cumulative.size - 1
+        if first.size and (min(first.min(), last.min()) < 0 or max(first.max(), last.max()) >= size):
+            raise ValueError(f"Ranges reach outside {self.first_year}-{self.last_year}")
+
+        # Clip so empty ranges (start > end) index safely; they are zeroed below
+        counts = self._cumulative[np.maximum(last, first - 1) + 1] - self._cumulative[first]
+        return np.where(first > last, 0, counts)
@@ -0,0 +1,152 @@
+"""
+Polygon geofences (GeoJSON Polygon/MultiPolygon, holes included) with a
+bounding-box prefilter and edge arrays prepared once per polygon
+"""
+import json
+import math
+from typing import List, Sequence, Tuple, Union
+import numpy as np
+from app.utils.spatial_index import EARTH_RADIUS_KM
+
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+EDGE_CHUNK_CELLS = 1_000_000  # points x edges per NumPy step in the *_many methods
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    a = math.sin(math.radians(lat2 - lat1) / 2) ** 2 + \
+        math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * \
+        math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+class PolygonGeofence:
+    """
+    Every ring (exteriors and holes, of every part) becomes a row of one
+    edge array, so point-in-polygon is a single even-odd crossing count:
+    inside a hole is two crossings' worth of parity, i.e. outside. Edges
+    are projected to km on a plane tangent at the bounding-box centre,
+    which is exact enough for building- and campus-sized shapes.
+    """
+
+    def __init__(self, polygons: Sequence[Sequence[Sequence[Tuple[float, float]]]]):
+        """polygons: [[ring, ...], ...], rings as (lon, lat) pairs, exterior first"""
+        rings = []
+        for polygon in polygons:
+            if not polygon:
+                raise ValueError("Polygon without rings")
+            for ring in polygon:
+                ring = [(float(lon), float(lat)) for lon, lat, *_ in ring]
+                if ring and ring[0] == ring[-1]:
+                    ring = ring[:-1]
+                if len(ring) < 3:
+                    raise ValueError("A polygon ring needs at least 3 distinct points")
+                for lon, lat in ring:
+                    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                        raise ValueError(f"Coordinate out of range: [{lon}, {lat}]")
+                rings.append(ring)
+        if not rings:
+            raise ValueError("Geometry has no polygons")
+
+        lons = [lon for ring in rings for lon, _ in ring]
+        lats = [lat for ring in rings for _, lat in ring]
+        self.min_lat, self.max_lat = min(lats), max(lats)
+        self.min_lon, self.max_lon = min(lons), max(lons)
+        self.center_lat = (self.min_lat + self.max_lat) / 2
+        self.center_lon = (self.min_lon + self.max_lon) / 2
+        # Every point of the shape is within reach_km of the centre
+        self.reach_km = max(
+            _haversine_km(self.center_lat, self.center_lon, lat, lon)
+            for lat in (self.min_lat, self.max_lat)
+            for lon in (self.min_lon, self.max_lon)
+        )
+
+        self._x_scale = KM_PER_DEGREE * math.cos(math.radians(self.center_lat))
+        starts, ends = [], []
+        for ring in rings:
+            points = [self._project(lat, lon) for lon, lat in ring]
+            starts.extend(points)
+            ends.extend(points[1:] + points[:1])
+        start = np.array(starts, dtype=np.float64)
+        end = np.array(ends, dtype=np.float64)
+        self._x1, self._y1 = start[:, 0], start[:, 1]
+        self._dx, self._dy = end[:, 0] - self._x1, end[:, 1] - self._y1
+        self._length2 = self._dx ** 2 + self._dy ** 2
+        # Horizontal edges never cross the ray; avoid dividing by zero for them
+        self._safe_dy = np.where(self._dy == 0, 1.0, self._dy)
+        self.edge_count = len(starts)
+
+    @classmethod
+    def from_geojson(cls, geometry: Union[str, dict]) -> "PolygonGeofence":
+        """From a GeoJSON Polygon or MultiPolygon geometry (dict or JSON text)"""
+        if isinstance(geometry, str):
+            geometry = json.loads(geometry)
+        if not isinstance(geometry, dict):
+            raise ValueError("Geometry must be a GeoJSON object")
+        kind = geometry.get("type")
+        coordinates = geometry.get("coordinates")
+        if kind == "Polygon":
+            return cls([coordinates])
+        if kind == "MultiPolygon":
+            return cls(coordinates)
+        raise ValueError("Geometry type must be Polygon or MultiPolygon")
+
+    def _project(self, lat: float, lon: float) -> Tuple[float, float]:
+        return (lon - self.center_lon) * self._x_scale, (lat - self.center_lat) * KM_PER_DEGREE
+
+    def in_bbox(self, lat: float, lon: float) -> bool:
+        return self.min_lat <= lat <= self.max_lat and self.min_lon <= lon <= self.max_lon
+
+    def contains(self, lat: float, lon: float) -> bool:
+        if not self.in_bbox(lat, lon):
+            return False
+        x, y = self._project(lat, lon)
+        return bool(self._crossings(np.array([x]), np.array([y]))[0] & 1)
+
+    def distance_km(self, lat: float, lon: float) -> float:
+        """0 inside, otherwise the distance to the nearest edge"""
+        if self.contains(lat, lon):
+            return 0.0
+        x, y = self._project(lat, lon)
+        return float(self._edge_distance(np.array([x]), np.array([y]))[0])
+
+    def contains_many(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        inside = np.zeros(lats.shape[0], dtype=bool)
+        in_box = np.flatnonzero(
+            (lats >= self.min_lat) & (lats <= self.max_lat) & (lons >= self.min_lon) & (lons <= self.max_lon)
+        )
+        for chunk in self._chunks(in_box):
+            x = (lons[chunk] - self.center_lon) * self._x_scale
+            y = (lats[chunk] - self.center_lat) * KM_PER_DEGREE
+            inside[chunk] = (self._crossings(x, y) & 1).astype(bool)
+        return inside
+
+    def distance_many(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        distance = np.zeros(lats.shape[0])
+        outside = np.flatnonzero(~self.contains_many(lats, lons))
+        for chunk in self._chunks(outside):
+            x = (lons[chunk] - self.center_lon) * self._x_scale
+            y = (lats[chunk] - self.center_lat) * KM_PER_DEGREE
+            distance[chunk] = self._edge_distance(x, y)
+        return distance
+
+    def _chunks(self, indices: np.ndarray) -> List[np.ndarray]:
+        size = max(1, EDGE_CHUNK_CELLS // self.edge_count)
+        return [indices[i:i + size] for i in range(0, indices.shape[0], size)]
+
+    def _crossings(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Edges crossed by a ray from each point towards +x, (points,)"""
+        x = x[:, None]
+        y = y[:, None]
+        y2 = self._y1 + self._dy
+        straddles = (self._y1 > y) != (y2 > y)
+        x_at_y = self._x1 + (y - self._y1) * self._dx / self._safe_dy
+        return np.count_nonzero(straddles & (x < x_at_y), axis=1)
+
+    def _edge_distance(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Distance (km) from each point to the closest edge, (points,)"""
+        px = x[:, None] - self._x1
+        py = y[:, None] - self._y1
+        t = np.clip((px * self._dx + py * self._dy) / np.where(self._length2 == 0, 1.0, self._length2), 0.0, 1.0)
+        return np.sqrt((px - t * self._dx) ** 2 + (py - t * self._dy) ** 2).min(axis=1)
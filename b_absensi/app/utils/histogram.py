@@ -0,0 +1,53 @@
+"""
+Fixed-bucket latency histogram shared by the runtime metrics
+(event-loop lag, connection pool checkout wait, password hashing)
+"""
+from bisect import bisect_left
+from typing import Optional
+
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class LatencyHistogram:
+    """Counts of samples (in milliseconds) per bucket, plus count/sum/max"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.sum_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th sample (capped at the max seen)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return round(min(float(bound), self.max_ms), 1)
+        return round(self.max_ms, 1)
+
+    def snapshot(self) -> dict:
+        """Summary with cumulative (Prometheus-style "le") bucket counts"""
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum_ms, 1),
+            "max_ms": round(self.max_ms, 1),
+            "p50_ms": self.quantile(0.50),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets_le_ms": buckets,
+        }
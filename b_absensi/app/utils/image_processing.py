@@ -0,0 +1,54 @@
+"""
+CPU-bound image work run inside the image pipeline process pool.
+Kept free of app/database imports so worker processes start quickly.
+"""
+import os
+import tempfile
+from typing import Dict, List, Tuple
+from PIL import Image, ImageOps
+
+def render_derivatives(
+    src_path: str,
+    targets: List[Tuple[str, str, int]],
+    quality: int
+) -> Dict[str, Tuple[int, int]]:
+    """
+    Decode src_path once and write a downscaled JPEG per target.
+    targets: (name, absolute output path, max edge in pixels).
+    EXIF orientation is applied to the pixels and all metadata is dropped.
+    Returns {name: (width, height)}.
+    """
+    results = {}
+    with Image.open(src_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        for name, out_path, max_edge in targets:
+            if os.path.exists(out_path):
+                # Same content already processed (deduplicated upload)
+                with Image.open(out_path) as existing:
+                    results[name] = existing.size
+                continue
+
+            derivative = image.copy()
+            derivative.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+            out_dir = os.path.dirname(out_path)
+            os.makedirs(out_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=out_dir, prefix=".derive_", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    # No exif= argument, so metadata is not carried over
+                    derivative.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+                os.replace(tmp_path, out_path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+
+            results[name] = derivative.size
+
+    return results
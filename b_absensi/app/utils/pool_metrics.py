@@ -0,0 +1,123 @@
+"""
+Connection pool instrumentation: checkout wait time, timeouts, in-use and
+overflow peaks per engine, read by the metrics and readiness endpoints
+"""
+import threading
+import time
+from typing import Dict
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from app.utils.histogram import LatencyHistogram
+
+class PoolStats:
+    """Counters for one engine's pool (updated from pool events and checkouts)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None  # Current pool; replaced when the engine is disposed
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.wait = LatencyHistogram()
+            self.checkouts = 0
+            self.timeouts = 0
+            self.connects = 0
+            self.invalidations = 0
+            self.peak_in_use = 0
+            self.peak_overflow = 0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.wait.observe(seconds * 1000)
+            if timed_out:
+                self.timeouts += 1
+
+    def record_checkout(self, pool):
+        in_use = pool.checkedout()
+        overflow = max(0, pool.overflow())
+        with self._lock:
+            self.checkouts += 1
+            self.peak_in_use = max(self.peak_in_use, in_use)
+            self.peak_overflow = max(self.peak_overflow, overflow)
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def record_invalidation(self):
+        with self._lock:
+            self.invalidations += 1
+
+    def snapshot(self) -> dict:
+        pool = self.pool
+        with self._lock:
+            result = {
+                "checkouts": self.checkouts,
+                "checkout_wait": self.wait.snapshot(),
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "peak_in_use": self.peak_in_use,
+                "peak_overflow": self.peak_overflow,
+            }
+        if pool is not None and hasattr(pool, "checkedout"):
+            result.update({
+                "pool_size": pool.size(),
+                "max_overflow": getattr(pool, "_max_overflow", None),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+            })
+        return result
+
+# name -> PoolStats, one per instrumented engine
+POOL_STATS: Dict[str, PoolStats] = {}
+
+def timed_pool_class(base, stats: PoolStats):
+    """
+    Subclass of a queue pool class that times every checkout, including
+    the time spent waiting for a free connection. Survives engine.dispose(),
+    which recreates the pool from its class.
+    """
+    class TimedPool(base):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            stats.pool = self
+
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except PoolTimeoutError:
+                stats.record_wait(time.perf_counter() - started, timed_out=True)
+                raise
+            stats.record_wait(time.perf_counter() - started)
+            return conn
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+def instrument_pool(engine, stats: PoolStats):
+    """Attach pool event listeners that feed stats (sync Engine or AsyncEngine.sync_engine)"""
+    pool = engine.pool
+    stats.pool = pool
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        stats.record_connect()
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.record_checkout(stats.pool)
+
+    @event.listens_for(pool, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        stats.record_invalidation()
+
+def pool_stats(name: str) -> PoolStats:
+    """Get (or create) the stats for an engine name"""
+    if name not in POOL_STATS:
+        POOL_STATS[name] = PoolStats(name)
+    return POOL_STATS[name]
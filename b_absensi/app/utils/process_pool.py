@@ -0,0 +1,10 @@
+"""
+Helpers that run inside process-pool workers
+"""
+import time
+
+def timed_call(func, *args):
+    """Run func(*args) and return (result, seconds spent), excluding time queued for a worker"""
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
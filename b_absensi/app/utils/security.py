@@ -1,16 +1,32 @@
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from typing import Optional
+from typing import Optional, Tuple
+import hashlib
+import hmac
 import os
+import time
+import uuid
+from app.config import settings
+from app.utils.ttl_cache import TTLCache
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min = max = rounds: hashes with any other cost are flagged for rehash on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS
+)
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+# sha256(token) -> verified payload, kept until the token's exp (wall clock)
+_token_cache = TTLCache(settings.TOKEN_CACHE_SIZE, clock=time.time)
+
 def hash_password(password: str) -> str:
     """Hash password menggunakan bcrypt"""
     return pwd_context.hash(password)
@@ -19,6 +35,10 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password dengan hash"""
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify password; also returns a new hash when the stored one uses an old cost factor"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
@@ -27,7 +47,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire, "type": "access"})
+    # jti identifies the token for revocation (logout)
+    to_encode.update({"exp": expire, "type": "access", "jti": str(uuid.uuid4())})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -40,9 +61,90 @@ def create_refresh_token(data: dict) -> str:
     return encoded_jwt
 
 def decode_token(token: str) -> Optional[dict]:
-    """Decode JWT token"""
+    """
+    Decode JWT token. Verified payloads are cached until their exp, so
+    repeated requests with the same token skip the signature check.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    payload = _token_cache.get(key)
+    if payload is not None:
+        return dict(payload)
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         return None
+    
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        # jose accepts the token while int(now) <= exp, i.e. until exp + 1
+        _token_cache.set(key, payload, expires_at=exp + 1)
+    return dict(payload)
+
+def forget_token(token: str):
+    """Drop a token from the verified-token cache"""
+    _token_cache.pop(hashlib.sha256(token.encode()).digest())
+
+def token_cache_stats(reset: bool = False) -> dict:
+    """Size and hit-rate counters of the verified-token cache"""
+    stats = _token_cache.snapshot()
+    if reset:
+        _token_cache.reset_counters()
+    return stats
+
+def hash_pin(user_id: str, pin: str) -> str:
+    """
+    Hash a login PIN with HMAC-SHA256 keyed by SECRET_KEY (cheap to check,
+    unlike bcrypt). Guessing online is limited by the PIN lockout; offline
+    guessing needs the server secret, not just the database.
+    """
+    salt = os.urandom(16).hex()
+    digest = hmac.new(SECRET_KEY.encode(), f"pin:{salt}:{user_id}:{pin}".encode(), hashlib.sha256).hexdigest()
+    return f"hmac-sha256${salt}${digest}"
+
+def verify_pin(user_id: str, pin: str, pin_hash: Optional[str]) -> bool:
+    """Check a PIN against a hash made by hash_pin()"""
+    try:
+        scheme, salt, digest = (pin_hash or "").split("$")
+    except ValueError:
+        return False
+    if scheme != "hmac-sha256":
+        return False
+    expected = hmac.new(SECRET_KEY.encode(), f"pin:{salt}:{user_id}:{pin}".encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, digest)
+
+def _offline_signing_key(jti: str) -> str:
+    return hmac.new(SECRET_KEY.encode(), f"offline-attendance:{jti}".encode(), hashlib.sha256).hexdigest()
+
+def create_offline_key(user_id: str) -> dict:
+    """
+    Issue a key the app uses to sign queued offline attendance events.
+    key_id is a JWT carrying the key's jti, iat and exp; the key itself is
+    derived from the jti, so each call issues a new key and any one of them
+    can be revoked by jti like an access token.
+    """
+    issued_at = datetime.utcnow().replace(microsecond=0)
+    expires_at = issued_at + timedelta(hours=settings.OFFLINE_KEY_EXPIRE_HOURS)
+    jti = str(uuid.uuid4())
+    key_id = jwt.encode(
+        {"sub": user_id, "type": "offline", "jti": jti, "iat": issued_at, "exp": expires_at},
+        SECRET_KEY,
+        algorithm=ALGORITHM
+    )
+    return {"key": _offline_signing_key(jti), "key_id": key_id, "issued_at": issued_at, "expires_at": expires_at}
+
+def decode_offline_key(key_id: str) -> Optional[dict]:
+    """Payload of an unexpired key_id from create_offline_key() plus its "key"; None if invalid"""
+    try:
+        payload = jwt.decode(key_id, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("type") != "offline" or not payload.get("jti") or "iat" not in payload:
+        return None
+    payload["key"] = _offline_signing_key(payload["jti"])
+    return payload
+
+def verify_offline_signature(key: str, message: str, signature: str) -> bool:
+    """Check a hex HMAC-SHA256 signature of message made with create_offline_key()"""
+    expected = hmac.new(key.encode(), message.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, (signature or "").lower())
@@ -0,0 +1,103 @@
+"""
+Static k-d tree over points on the sphere for nearest-site and
+within-radius queries in O(log n) instead of a scan of every site
+"""
+import math
+from typing import Any, List, Optional, Sequence, Tuple
+
+EARTH_RADIUS_KM = 6371
+
+def unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    lat_rad = math.radians(lat)
+    lon_rad = math.radians(lon)
+    cos_lat = math.cos(lat_rad)
+    return (cos_lat * math.cos(lon_rad), cos_lat * math.sin(lon_rad), math.sin(lat_rad))
+
+def chord_to_km(chord: float) -> float:
+    """Great-circle distance (km) for a straight-line distance between unit vectors"""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+def km_to_chord(km: float) -> float:
+    return 2 * math.sin(min(math.pi, km / EARTH_RADIUS_KM) / 2)
+
+class SphereKDTree:
+    """
+    Points are stored as 3D unit vectors, so the straight-line (chord)
+    distance grows monotonically with the great-circle distance and a
+    plain Euclidean k-d tree gives exact haversine answers anywhere on
+    the globe. Built once and never mutated: swap in a new tree to update.
+    """
+
+    def __init__(self, points: Sequence[Tuple[float, float]], items: Sequence[Any]):
+        self._vectors = [unit_vector(lat, lon) for lat, lon in points]
+        self._items = list(items)
+        # Node = (index, axis, left, right); None for an empty subtree
+        self._root = self._build(list(range(len(self._vectors))), 0)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _build(self, indices: List[int], depth: int):
+        if not indices:
+            return None
+        axis = depth % 3
+        indices.sort(key=lambda i: self._vectors[i][axis])
+        mid = len(indices) // 2
+        return (
+            indices[mid],
+            axis,
+            self._build(indices[:mid], depth + 1),
+            self._build(indices[mid + 1:], depth + 1)
+        )
+
+    @staticmethod
+    def _chord(a, b) -> float:
+        return math.sqrt((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2)
+
+    def nearest(self, lat: float, lon: float) -> Optional[Tuple[Any, float]]:
+        """(item, distance_km) of the closest point, or None when empty"""
+        if self._root is None:
+            return None
+        target = unit_vector(lat, lon)
+        best = [None, float('inf')]
+
+        def visit(node):
+            if node is None:
+                return
+            index, axis, left, right = node
+            chord = self._chord(target, self._vectors[index])
+            if chord < best[1]:
+                best[0], best[1] = index, chord
+            diff = target[axis] - self._vectors[index][axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if abs(diff) < best[1]:
+                visit(far)
+
+        visit(self._root)
+        return self._items[best[0]], chord_to_km(best[1])
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[Any, float]]:
+        """(item, distance_km) of every point within radius_km, closest first"""
+        if self._root is None:
+            return []
+        target = unit_vector(lat, lon)
+        limit = km_to_chord(radius_km)
+        found = []
+
+        def visit(node):
+            if node is None:
+                return
+            index, axis, left, right = node
+            chord = self._chord(target, self._vectors[index])
+            if chord <= limit:
+                found.append((chord, index))
+            diff = target[axis] - self._vectors[index][axis]
+            if diff - limit <= 0:
+                visit(left)
+            if diff + limit >= 0:
+                visit(right)
+
+        visit(self._root)
+        found.sort()
+        return [(self._items[index], chord_to_km(chord)) for chord, index in found]
@@ -0,0 +1,88 @@
+"""
+Streaming upload writer - copy multipart files to disk in fixed-size chunks
+without blocking the event loop
+"""
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Optional, Tuple
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+
+# Magic bytes of accepted selfie formats -> stored file extension
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+]
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Return file extension for a known image header, or None"""
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"mif1"):
+        return ".heic"
+    return None
+
+def _stream_to_tempfile(src: BinaryIO, directory: str, max_size: int, chunk_size: int) -> Tuple[str, str, str]:
+    """
+    Copy src into a temp file in directory chunk by chunk.
+    Returns (temp path, sniffed extension, sha256 hex digest).
+    """
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            chunk = src.read(chunk_size)
+            ext = sniff_image_type(chunk)
+            if ext is None:
+                raise HTTPException(
+                    status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                    detail="Format foto tidak didukung. Gunakan JPEG, PNG, WebP atau HEIC"
+                )
+            
+            digest = hashlib.sha256()
+            size = 0
+            while chunk:
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Ukuran foto melebihi batas {max_size // (1024 * 1024)}MB"
+                    )
+                digest.update(chunk)
+                out.write(chunk)
+                chunk = src.read(chunk_size)
+            
+            out.flush()
+            os.fsync(out.fileno())
+        
+        return tmp_path, ext, digest.hexdigest()
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+async def spool_upload(
+    file: UploadFile,
+    directory: str,
+    max_size: Optional[int] = None,
+    chunk_size: Optional[int] = None
+) -> Tuple[str, str, str]:
+    """
+    Stream an uploaded image into a temp file in directory in a worker thread.
+    Returns (temp path, extension, sha256 hex digest); the caller renames it.
+    """
+    await file.seek(0)
+    return await run_in_threadpool(
+        _stream_to_tempfile,
+        file.file,
+        directory,
+        max_size or settings.MAX_PHOTO_SIZE,
+        chunk_size or settings.UPLOAD_CHUNK_SIZE
+    )
@@ -1,13 +1,32 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
-from app.database import Base, engine
-from app.routes import auth, attendance, leave, task
+import asyncio
+import logging
+import time
+from app.database import Base, engine, async_engine, read_engine, async_read_engine, has_replica
+from app.routes import auth, attendance, leave, task, metrics, location
+from app.middleware import LoopMonitorMiddleware
 from app.scheduler import start_scheduler, stop_scheduler
+from app.services.image_pipeline_service import ImagePipelineService
+from app.services.password_hash_service import PasswordHashService
+from app.services.token_revocation_service import TokenRevocationService
+from app.services.location_service import LocationService
+from app.services.holiday_service import HolidayService
+from app.services.leave_quota_service import LeaveQuotaService
+from app.services.checkin_journal_service import CheckinJournalService
+from app.services.loop_monitor_service import LoopMonitorService
+from app.utils.pool_metrics import POOL_STATS
 from sqlalchemy import text
 
 # Import models to ensure they are registered with SQLAlchemy
-from app.models import User, Attendance, Leave, Position, LeaveQuota, Task
+from app.models import User, Attendance, Leave, Position, LeaveQuota, Task, RefreshToken, RevokedToken, Location, Holiday, LeaveQuotaEntry, LeaveQuotaSnapshot
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_TIMEOUT = 5  # seconds
 
 # Create tables
 Base.metadata.create_all(bind=engine)
@@ -46,21 +65,229 @@ def run_migrations():
         except Exception as e:
             # Index might already exist
             pass
+        
+        # Add work_date day key to attendances (see migrations/003)
+        try:
+            conn.execute(text("""
+                ALTER TABLE attendances ADD COLUMN work_date DATE NULL;
+            """))
+            conn.commit()
+        except Exception as e:
+            # Column might already exist
+            pass
+        
+        # Backfill on every start while unkeyed rows exist, so a backfill
+        # that failed or was interrupted is finished by a later start. Keys
+        # the first check-in per user per day, skipping days already keyed
+        # (e.g. by a check-in made after the column was added)
+        try:
+            if conn.execute(text("SELECT 1 FROM attendances WHERE work_date IS NULL LIMIT 1")).first():
+                conn.execute(text("""
+                    UPDATE attendances a
+                    JOIN (
+                        SELECT MIN(id) AS id
+                        FROM attendances x
+                        WHERE x.check_in_time = (
+                            SELECT MIN(y.check_in_time) FROM attendances y
+                            WHERE y.user_id = x.user_id
+                            AND DATE(y.check_in_time) = DATE(x.check_in_time)
+                        )
+                        GROUP BY x.user_id, DATE(x.check_in_time)
+                    ) first_of_day ON first_of_day.id = a.id
+                    LEFT JOIN (
+                        SELECT DISTINCT user_id, work_date
+                        FROM attendances
+                        WHERE work_date IS NOT NULL
+                    ) keyed ON keyed.user_id = a.user_id AND keyed.work_date = DATE(a.check_in_time)
+                    SET a.work_date = DATE(a.check_in_time)
+                    WHERE a.work_date IS NULL
+                    AND keyed.user_id IS NULL;
+                """))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.exception("Migration 003 (attendances.work_date backfill) failed")
+        
+        try:
+            conn.execute(text("""
+                CREATE UNIQUE INDEX uq_attendances_user_work_date ON attendances(user_id, work_date);
+            """))
+            conn.commit()
+        except Exception as e:
+            # Index might already exist
+            pass
+        
+        try:
+            conn.execute(text("""
+                CREATE INDEX idx_attendances_work_date ON attendances(work_date);
+            """))
+            conn.commit()
+        except Exception as e:
+            # Index might already exist
+            pass
+        
+        # Add photo derivative columns to attendances (see migrations/004)
+        for column in [
+            "check_in_photo_review_url VARCHAR(512) NULL",
+            "check_in_photo_thumb_url VARCHAR(512) NULL",
+            "check_in_photo_width INT NULL",
+            "check_in_photo_height INT NULL",
+            "check_out_photo_review_url VARCHAR(512) NULL",
+            "check_out_photo_thumb_url VARCHAR(512) NULL",
+            "check_out_photo_width INT NULL",
+            "check_out_photo_height INT NULL",
+        ]:
+            try:
+                conn.execute(text(f"ALTER TABLE attendances ADD COLUMN {column};"))
+                conn.commit()
+            except Exception as e:
+                # Column might already exist
+                pass
+        
+        # Index for attendance history keyset pagination (see migrations/005)
+        try:
+            conn.execute(text("""
+                CREATE INDEX idx_attendances_user_check_in ON attendances(user_id, check_in_time, id);
+            """))
+            conn.commit()
+        except Exception as e:
+            # Index might already exist
+            pass
+        
+        # PIN login lockout columns on users (see migrations/006)
+        for column in [
+            "pin_failed_attempts INT NOT NULL DEFAULT 0",
+            "pin_locked_until DATETIME NULL",
+        ]:
+            try:
+                conn.execute(text(f"ALTER TABLE users ADD COLUMN {column};"))
+                conn.commit()
+            except Exception as e:
+                # Column might already exist
+                pass
+        
+        # Polygon boundaries for attendance sites (see migrations/007)
+        for statement in [
+            "ALTER TABLE locations ADD COLUMN boundary TEXT NULL;",
+            "ALTER TABLE locations MODIFY COLUMN radius FLOAT NULL;",
+        ]:
+            try:
+                conn.execute(text(statement))
+                conn.commit()
+            except Exception as e:
+                # Column might already exist / already nullable
+                pass
+        
+        # One leave quota row per user per year (see migrations/008). Not
+        # skipped on error: quota lookups expect a single row
+        try:
+            LeaveQuotaService.add_unique_key(conn)
+        except Exception:
+            logger.exception("Migration 008 (unique_user_year on leave_quotas) failed")
+            raise
+        
+        # Per-position annual leave quota (see migrations/009)
+        try:
+            conn.execute(text("ALTER TABLE positions ADD COLUMN annual_leave_quota INT NULL;"))
+            conn.commit()
+        except Exception as e:
+            # Column might already exist
+            pass
+        
+        # Opening ledger entries for quotas that predate the ledger (see migrations/010)
+        try:
+            conn.execute(text("""
+                INSERT INTO leave_quota_entries (user_id, year, kind, quota_change, used_change, created_at)
+                SELECT q.user_id, q.year, 'grant', q.total_quota, q.used_quota,
+                       COALESCE(q.updated_at, q.created_at, CURRENT_TIMESTAMP)
+                FROM leave_quotas q
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM leave_quota_entries e
+                    WHERE e.user_id = q.user_id AND e.year = q.year
+                );
+            """))
+            conn.commit()
+        except Exception as e:
+            # Tables might not exist yet
+            pass
+
+        
+        # Quota year charged by leaves submitted before it was recorded (see migrations/011)
+        try:
+            conn.execute(text("""
+                UPDATE leaves l
+                JOIN (
+                    SELECT leave_id, MIN(year) AS year
+                    FROM leave_quota_entries
+                    WHERE kind = 'debit' AND leave_id IS NOT NULL
+                    GROUP BY leave_id
+                ) debit ON debit.leave_id = l.id
+                SET l.deducted_from_quota = TRUE, l.quota_year = debit.year
+                WHERE l.quota_year IS NULL;
+            """))
+            conn.execute(text("""
+                UPDATE leaves l
+                SET l.deducted_from_quota = TRUE, l.quota_year = YEAR(l.created_at)
+                WHERE l.quota_year IS NULL
+                AND l.status = 'pending'
+                AND l.category IN ('cuti_tahunan', 'sakit_tanpa_surat')
+                AND NOT EXISTS (SELECT 1 FROM leave_quota_entries e WHERE e.leave_id = l.id);
+            """))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.exception("Migration 011 (leave quota year backfill) failed")
+        
+        # Offline sync flags on attendances (see migrations/012)
+        for column in [
+            "check_in_offline BOOLEAN NOT NULL DEFAULT FALSE",
+            "check_out_offline BOOLEAN NOT NULL DEFAULT FALSE",
+        ]:
+            try:
+                conn.execute(text(f"ALTER TABLE attendances ADD COLUMN {column};"))
+                conn.commit()
+            except Exception as e:
+                # Column might already exist
+                pass
+        try:
+            conn.execute(text("""
+                UPDATE attendances SET check_in_offline = TRUE
+                WHERE notes = 'Offline sync' AND check_in_offline = FALSE;
+            """))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.exception("Migration 012 (offline check-in backfill) failed")
 
 run_migrations()
 
 # Import and create sample data after tables are created
-from app.seed_data import create_positions, create_sample_users
+from app.seed_data import create_positions, create_sample_users, create_locations
 create_positions()
 create_sample_users()
+create_locations()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Start the scheduler
+    # Startup: Load token revocations, attendance sites and holidays, start the
+    # scheduler, replay/write the check-in journal and start sampling event-loop lag
+    await run_in_threadpool(TokenRevocationService.start)  # Reads revoked_tokens; keep it off the event loop
+    LocationService.start()
+    HolidayService.start()
     start_scheduler()
+    CheckinJournalService.start()
+    LoopMonitorService.start()
     yield
-    # Shutdown: Stop the scheduler
+    # Shutdown: Stop the loop monitor, scheduler, journal writer and image workers; close DB pools
+    await LoopMonitorService.stop()
     stop_scheduler()
+    CheckinJournalService.stop()
+    ImagePipelineService.shutdown()
+    PasswordHashService.shutdown()
+    HolidayService.shutdown()
+    await async_engine.dispose()
+    if has_replica():
+        await async_read_engine.dispose()
 
 app = FastAPI(
     title="Aplikasi Absensi API",
@@ -76,11 +303,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(LoopMonitorMiddleware)
 
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(attendance.router, prefix="/api/attendance", tags=["Attendance"])
 app.include_router(leave.router, prefix="/api/leave", tags=["Leave"])
 app.include_router(task.router, prefix="/api/tasks", tags=["Tasks"])
+app.include_router(location.router, prefix="/api/locations", tags=["Locations"])
+app.include_router(metrics.router, prefix="/api/metrics", tags=["Metrics"])
 
 @app.get("/")
 def read_root():
@@ -88,4 +318,54 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "API is running", "version": "1.0.0"}
\ No newline at end of file
+    return {"status": "API is running", "version": "1.0.0"}
+
+def _ping(target):
+    with target.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+async def _ping_async(target):
+    async with target.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+@app.get("/health/ready")
+async def readiness_check():
+    """
+    Readiness: a round trip through each connection pool plus pool usage.
+    Returns 503 when the database can't be reached within the timeout.
+    """
+    targets = [
+        ("primary", lambda: run_in_threadpool(_ping, engine)),
+        ("primary_async", lambda: _ping_async(async_engine)),
+    ]
+    if has_replica():
+        targets += [
+            ("replica", lambda: run_in_threadpool(_ping, read_engine)),
+            ("replica_async", lambda: _ping_async(async_read_engine)),
+        ]
+    
+    checks = {}
+    for name, ping in targets:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(ping(), timeout=HEALTH_CHECK_TIMEOUT)
+            checks[name] = {"ok": True}
+        except asyncio.TimeoutError:
+            logger.error(f"Readiness check {name}: no response within {HEALTH_CHECK_TIMEOUT}s")
+            checks[name] = {"ok": False, "error": "timeout"}
+        except Exception as e:
+            # Details go to the log only: this probe is unauthenticated
+            logger.error(f"Readiness check {name} failed: {e}")
+            checks[name] = {"ok": False, "error": "unavailable"}
+        checks[name]["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        
+        stats = POOL_STATS[name].snapshot()
+        checks[name]["pool"] = {
+            key: stats.get(key) for key in ("pool_size", "in_use", "idle", "overflow", "timeouts")
+        }
+    
+    ready = all(check["ok"] for check in checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "unavailable", "checks": checks}
+    )
\ No newline at end of file
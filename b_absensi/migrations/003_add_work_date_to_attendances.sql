@@ -0,0 +1,98 @@
+-- ====================================================================
+-- Migration: Add work_date day key to attendances
+-- Version: 003
+-- Date: 2026-10-17
+-- Description: Adds a persisted Jakarta-local work_date to attendances,
+--              backfills it from check_in_time and enforces one check-in
+--              per user per day with a unique (user_id, work_date) index.
+--              Day-scoped lookups use the index instead of DATE(check_in_time).
+-- ====================================================================
+-- NOTE: On a fresh database the attendances table is created later by
+--       SQLAlchemy (already including work_date), so every step is skipped
+--       when the table does not exist yet.
+
+SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='';
+
+SET @has_table = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+    WHERE table_schema=DATABASE() AND table_name='attendances');
+
+-- ====================================================================
+-- STEP 1: Add work_date column
+-- ====================================================================
+SET @s = (SELECT IF(
+    @has_table = 0 OR (SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS
+     WHERE table_schema=DATABASE()
+     AND table_name='attendances'
+     AND column_name='work_date') > 0,
+    'SELECT "Column work_date already exists or table missing, skipping..." as message',
+    'ALTER TABLE attendances ADD COLUMN work_date DATE NULL COMMENT "Jakarta-local day of check_in_time" AFTER check_in_time'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- ====================================================================
+-- STEP 2: Backfill work_date
+-- ====================================================================
+-- check_in_time is stored as Jakarta wall-clock time, so DATE() is the
+-- local work day. Only the earliest check-in per user per day gets the key;
+-- legacy duplicates keep NULL so the unique index can be built without
+-- deleting any rows. Days that already have a keyed row are skipped, so
+-- this step can be re-run after a failure.
+SET @s = (SELECT IF(
+    @has_table = 0,
+    'SELECT "Table attendances missing, skipping backfill..." as message',
+    'UPDATE attendances a
+     JOIN (
+         SELECT MIN(id) AS id
+         FROM attendances x
+         WHERE x.check_in_time = (
+             SELECT MIN(y.check_in_time) FROM attendances y
+             WHERE y.user_id = x.user_id
+             AND DATE(y.check_in_time) = DATE(x.check_in_time)
+         )
+         GROUP BY x.user_id, DATE(x.check_in_time)
+     ) first_of_day ON first_of_day.id = a.id
+     LEFT JOIN (
+         SELECT DISTINCT user_id, work_date
+         FROM attendances
+         WHERE work_date IS NOT NULL
+     ) keyed ON keyed.user_id = a.user_id AND keyed.work_date = DATE(a.check_in_time)
+     SET a.work_date = DATE(a.check_in_time)
+     WHERE a.work_date IS NULL
+     AND keyed.user_id IS NULL'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- ====================================================================
+-- STEP 3: Add indexes
+-- ====================================================================
+SET @s = (SELECT IF(
+    @has_table = 0 OR (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE table_schema=DATABASE()
+     AND table_name='attendances'
+     AND index_name='uq_attendances_user_work_date') > 0,
+    'SELECT "Index uq_attendances_user_work_date already exists, skipping..." as message',
+    'CREATE UNIQUE INDEX uq_attendances_user_work_date ON attendances (user_id, work_date)'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @s = (SELECT IF(
+    @has_table = 0 OR (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE table_schema=DATABASE()
+     AND table_name='attendances'
+     AND index_name='idx_attendances_work_date') > 0,
+    'SELECT "Index idx_attendances_work_date already exists, skipping..." as message',
+    'CREATE INDEX idx_attendances_work_date ON attendances (work_date)'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET SQL_MODE=@OLD_SQL_MODE;
+
+SELECT 'Migration 003 completed successfully!' as Status;
@@ -0,0 +1,35 @@
+-- ====================================================================
+-- Migration: Add photo derivative columns to attendances
+-- Version: 004
+-- Date: 2026-10-17
+-- Description: Stores the review/thumbnail JPEGs produced by the image
+--              pipeline next to the original photo, plus the review
+--              image size in pixels.
+-- ====================================================================
+-- NOTE: Skipped when attendances does not exist yet (fresh database);
+--       SQLAlchemy creates the table with these columns.
+
+SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='';
+
+SET @s = (SELECT IF(
+    (SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+     WHERE table_schema=DATABASE()
+     AND table_name='attendances') = 0,
+    'SELECT "Table attendances missing, skipping..." as message',
+    'ALTER TABLE attendances
+        ADD COLUMN IF NOT EXISTS check_in_photo_review_url VARCHAR(512) NULL COMMENT "Downscaled, EXIF-stripped check-in photo",
+        ADD COLUMN IF NOT EXISTS check_in_photo_thumb_url VARCHAR(512) NULL COMMENT "Check-in photo thumbnail",
+        ADD COLUMN IF NOT EXISTS check_in_photo_width INT NULL COMMENT "Review image width in pixels",
+        ADD COLUMN IF NOT EXISTS check_in_photo_height INT NULL COMMENT "Review image height in pixels",
+        ADD COLUMN IF NOT EXISTS check_out_photo_review_url VARCHAR(512) NULL COMMENT "Downscaled, EXIF-stripped check-out photo",
+        ADD COLUMN IF NOT EXISTS check_out_photo_thumb_url VARCHAR(512) NULL COMMENT "Check-out photo thumbnail",
+        ADD COLUMN IF NOT EXISTS check_out_photo_width INT NULL COMMENT "Review image width in pixels",
+        ADD COLUMN IF NOT EXISTS check_out_photo_height INT NULL COMMENT "Review image height in pixels"'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET SQL_MODE=@OLD_SQL_MODE;
+
+SELECT 'Migration 004 completed successfully!' as Status;
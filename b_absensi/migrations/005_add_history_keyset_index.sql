@@ -0,0 +1,24 @@
+-- ====================================================================
+-- Migration: Add keyset pagination index for attendance history
+-- Version: 005
+-- Date: 2026-10-17
+-- Description: (user_id, check_in_time, id) lets cursor-mode history pages
+--              seek directly to the next row instead of OFFSET scanning.
+-- ====================================================================
+
+SET @s = (SELECT IF(
+    (SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+     WHERE table_schema=DATABASE()
+     AND table_name='attendances') = 0
+    OR (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE table_schema=DATABASE()
+     AND table_name='attendances'
+     AND index_name='idx_attendances_user_check_in') > 0,
+    'SELECT "Index idx_attendances_user_check_in already exists or table missing, skipping..." as message',
+    'CREATE INDEX idx_attendances_user_check_in ON attendances (user_id, check_in_time, id)'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SELECT 'Migration 005 completed successfully!' as Status;
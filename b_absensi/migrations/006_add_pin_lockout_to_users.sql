@@ -0,0 +1,29 @@
+-- ====================================================================
+-- Migration: Add PIN lockout columns to users
+-- Version: 006
+-- Date: 2026-10-17
+-- Description: Failed PIN login counter and lockout deadline for
+--              /api/auth/pin-login. The refresh_tokens table is created
+--              by SQLAlchemy.
+-- ====================================================================
+-- NOTE: Skipped when users does not exist yet (fresh database);
+--       SQLAlchemy creates the table with these columns.
+
+SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='';
+
+SET @s = (SELECT IF(
+    (SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+     WHERE table_schema=DATABASE()
+     AND table_name='users') = 0,
+    'SELECT "Table users missing, skipping..." as message',
+    'ALTER TABLE users
+        ADD COLUMN IF NOT EXISTS pin_failed_attempts INT NOT NULL DEFAULT 0 COMMENT "Consecutive failed PIN logins",
+        ADD COLUMN IF NOT EXISTS pin_locked_until DATETIME NULL COMMENT "PIN login refused until this time"'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET SQL_MODE=@OLD_SQL_MODE;
+
+SELECT 'Migration 006 completed successfully!' as Status;
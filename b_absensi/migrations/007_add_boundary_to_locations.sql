@@ -0,0 +1,29 @@
+-- ====================================================================
+-- Migration: Polygon boundaries for attendance sites
+-- Version: 007
+-- Date: 2026-10-17
+-- Description: GeoJSON Polygon/MultiPolygon footprint per location.
+--              A site with a boundary is matched against the polygon
+--              (holes included) and needs no radius.
+-- ====================================================================
+-- NOTE: Skipped when locations does not exist yet (fresh database);
+--       SQLAlchemy creates the table with these columns.
+
+SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='';
+
+SET @s = (SELECT IF(
+    (SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+     WHERE table_schema=DATABASE()
+     AND table_name='locations') = 0,
+    'SELECT "Table locations missing, skipping..." as message',
+    'ALTER TABLE locations
+        ADD COLUMN IF NOT EXISTS boundary TEXT NULL COMMENT "GeoJSON Polygon/MultiPolygon, [lon, lat]",
+        MODIFY COLUMN radius FLOAT NULL COMMENT "km; circular sites only"'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET SQL_MODE=@OLD_SQL_MODE;
+
+SELECT 'Migration 007 completed successfully!' as Status;
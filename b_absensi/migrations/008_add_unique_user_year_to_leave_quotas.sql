@@ -0,0 +1,78 @@
+-- ====================================================================
+-- Migration: Enforce one leave quota row per user per year
+-- Version: 008
+-- Date: 2026-10-17
+-- Description: Quota rows are now created with an upsert on
+--              unique_user_year and changed with conditional UPDATEs,
+--              which needs the key on leave_quotas. Duplicate rows left
+--              by the old check-then-insert are merged first: the oldest
+--              row keeps the summed used_quota, the others are deleted.
+-- ====================================================================
+-- NOTE: Skipped when leave_quotas does not exist yet (fresh database);
+--       SQLAlchemy creates the table with the key.
+
+SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='';
+
+SET @has_table = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+    WHERE table_schema=DATABASE() AND table_name='leave_quotas');
+SET @has_key = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+    WHERE table_schema=DATABASE()
+    AND table_name='leave_quotas'
+    AND index_name='unique_user_year');
+
+-- ====================================================================
+-- STEP 1: Merge duplicate (user_id, year) rows
+-- ====================================================================
+SET @s = (SELECT IF(
+    @has_table = 0 OR @has_key > 0,
+    'SELECT "Key unique_user_year already exists or table missing, skipping merge..." as message',
+    'UPDATE leave_quotas q
+     JOIN (
+         SELECT x.user_id, x.year, SUM(x.used_quota) AS used_quota,
+                (SELECT y.id FROM leave_quotas y
+                 WHERE y.user_id = x.user_id AND y.year = x.year
+                 ORDER BY y.created_at, y.id LIMIT 1) AS keep_id
+         FROM leave_quotas x
+         GROUP BY x.user_id, x.year
+         HAVING COUNT(*) > 1
+     ) d ON q.id = d.keep_id
+     SET q.used_quota = d.used_quota,
+         q.remaining_quota = q.total_quota - d.used_quota'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @s = (SELECT IF(
+    @has_table = 0 OR @has_key > 0,
+    'SELECT "Key unique_user_year already exists or table missing, skipping cleanup..." as message',
+    'DELETE q FROM leave_quotas q
+     JOIN (
+         SELECT x.user_id, x.year,
+                (SELECT y.id FROM leave_quotas y
+                 WHERE y.user_id = x.user_id AND y.year = x.year
+                 ORDER BY y.created_at, y.id LIMIT 1) AS keep_id
+         FROM leave_quotas x
+         GROUP BY x.user_id, x.year
+         HAVING COUNT(*) > 1
+     ) d ON q.user_id = d.user_id AND q.year = d.year AND q.id <> d.keep_id'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- ====================================================================
+-- STEP 2: Add the key
+-- ====================================================================
+SET @s = (SELECT IF(
+    @has_table = 0 OR @has_key > 0,
+    'SELECT "Key unique_user_year already exists or table missing, skipping..." as message',
+    'CREATE UNIQUE INDEX unique_user_year ON leave_quotas (user_id, year)'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET SQL_MODE=@OLD_SQL_MODE;
+
+SELECT 'Migration 008 completed successfully!' as Status;
@@ -0,0 +1,29 @@
+-- ====================================================================
+-- Migration: Per-position annual leave quota
+-- Version: 009
+-- Date: 2026-10-17
+-- Description: Days of annual leave per year for holders of a position.
+--              NULL keeps the ANNUAL_LEAVE_QUOTA default; a user with
+--              several positions gets the largest.
+-- ====================================================================
+
+SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='';
+
+SET @s = (SELECT IF(
+    (SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+     WHERE table_schema=DATABASE()
+     AND table_name='positions') = 0
+    OR (SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS
+     WHERE table_schema=DATABASE()
+     AND table_name='positions'
+     AND column_name='annual_leave_quota') > 0,
+    'SELECT "Column annual_leave_quota already exists or table missing, skipping..." as message',
+    'ALTER TABLE positions ADD COLUMN annual_leave_quota INT NULL COMMENT "Days per year; NULL = ANNUAL_LEAVE_QUOTA" AFTER approver_position_id'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET SQL_MODE=@OLD_SQL_MODE;
+
+SELECT 'Migration 009 completed successfully!' as Status;
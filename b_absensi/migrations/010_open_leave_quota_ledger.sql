@@ -0,0 +1,37 @@
+-- ====================================================================
+-- Migration: Opening entries for the leave quota ledger
+-- Version: 010
+-- Date: 2026-10-17
+-- Description: Quota changes are now appended to leave_quota_entries and
+--              balances are read from leave_quota_snapshots plus the
+--              entries after them. Each existing leave_quotas row gets one
+--              'grant' entry carrying its current total_quota and
+--              used_quota, so replaying a year's entries gives the
+--              counters. Rows that already have entries are left alone.
+-- ====================================================================
+-- NOTE: leave_quota_entries and leave_quota_snapshots are created by
+--       SQLAlchemy; skipped when they do not exist yet.
+
+SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='';
+
+SET @s = (SELECT IF(
+    (SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+     WHERE table_schema=DATABASE()
+     AND table_name IN ('leave_quotas', 'leave_quota_entries')) < 2,
+    'SELECT "Table leave_quotas or leave_quota_entries missing, skipping..." as message',
+    'INSERT INTO leave_quota_entries (user_id, year, kind, quota_change, used_change, created_at)
+     SELECT q.user_id, q.year, ''grant'', q.total_quota, q.used_quota,
+            COALESCE(q.updated_at, q.created_at, NOW())
+     FROM leave_quotas q
+     WHERE NOT EXISTS (
+         SELECT 1 FROM leave_quota_entries e
+         WHERE e.user_id = q.user_id AND e.year = q.year
+     )'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET SQL_MODE=@OLD_SQL_MODE;
+
+SELECT 'Migration 010 completed successfully!' as Status;
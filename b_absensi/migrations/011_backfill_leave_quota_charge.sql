@@ -0,0 +1,59 @@
+-- ====================================================================
+-- Migration: Record which quota year each leave was charged to
+-- Version: 011
+-- Date: 2026-10-17
+-- Description: Rejecting a leave now refunds only leaves with
+--              deducted_from_quota set, into their quota_year. Both are
+--              set by submit from now on; this backfills them for leaves
+--              submitted before. Leaves with a ledger debit take its year.
+--              Pending leaves older than the ledger were charged in full
+--              to their submission year, so they take YEAR(created_at).
+-- ====================================================================
+-- NOTE: leave_quota_entries is created by SQLAlchemy; skipped when it
+--       does not exist yet.
+
+SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='';
+
+SET @has_tables = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+    WHERE table_schema=DATABASE() AND table_name IN ('leaves', 'leave_quota_entries'));
+
+-- ====================================================================
+-- STEP 1: Leaves with a ledger debit
+-- ====================================================================
+SET @s = (SELECT IF(
+    @has_tables < 2,
+    'SELECT "Table leaves or leave_quota_entries missing, skipping..." as message',
+    'UPDATE leaves l
+     JOIN (
+         SELECT leave_id, MIN(year) AS year
+         FROM leave_quota_entries
+         WHERE kind = ''debit'' AND leave_id IS NOT NULL
+         GROUP BY leave_id
+     ) debit ON debit.leave_id = l.id
+     SET l.deducted_from_quota = TRUE, l.quota_year = debit.year
+     WHERE l.quota_year IS NULL'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- ====================================================================
+-- STEP 2: Pending leaves from before the ledger
+-- ====================================================================
+SET @s = (SELECT IF(
+    @has_tables < 2,
+    'SELECT "Table leaves or leave_quota_entries missing, skipping..." as message',
+    'UPDATE leaves l
+     SET l.deducted_from_quota = TRUE, l.quota_year = YEAR(l.created_at)
+     WHERE l.quota_year IS NULL
+     AND l.status = ''pending''
+     AND l.category IN (''cuti_tahunan'', ''sakit_tanpa_surat'')
+     AND NOT EXISTS (SELECT 1 FROM leave_quota_entries e WHERE e.leave_id = l.id)'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET SQL_MODE=@OLD_SQL_MODE;
+
+SELECT 'Migration 011 completed successfully!' as Status;
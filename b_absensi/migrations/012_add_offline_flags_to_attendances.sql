@@ -0,0 +1,42 @@
+-- ====================================================================
+-- Migration: Mark attendance check-ins/check-outs synced from offline
+-- Version: 012
+-- Date: 2026-10-17
+-- Description: check_in_offline and check_out_offline are set when the
+--              time came from the app's offline queue (/attendance/batch)
+--              rather than the server clock, so reports and supervisors
+--              can tell those rows apart. Earlier offline check-ins are
+--              recognised by the "Offline sync" note; earlier offline
+--              check-outs left no trace and stay unmarked.
+-- ====================================================================
+-- NOTE: Skipped when attendances does not exist yet (fresh database);
+--       SQLAlchemy creates the table with these columns.
+
+SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='';
+
+SET @has_table = (SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+    WHERE table_schema=DATABASE() AND table_name='attendances');
+
+SET @s = (SELECT IF(
+    @has_table = 0,
+    'SELECT "Table attendances missing, skipping..." as message',
+    'ALTER TABLE attendances
+        ADD COLUMN IF NOT EXISTS check_in_offline BOOLEAN NOT NULL DEFAULT FALSE COMMENT "Check-in synced from the offline queue",
+        ADD COLUMN IF NOT EXISTS check_out_offline BOOLEAN NOT NULL DEFAULT FALSE COMMENT "Check-out synced from the offline queue"'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @s = (SELECT IF(
+    @has_table = 0,
+    'SELECT "Table attendances missing, skipping backfill..." as message',
+    'UPDATE attendances SET check_in_offline = TRUE WHERE notes = ''Offline sync'' AND check_in_offline = FALSE'
+));
+PREPARE stmt FROM @s;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET SQL_MODE=@OLD_SQL_MODE;
+
+SELECT 'Migration 012 completed successfully!' as Status;
@@ -0,0 +1,117 @@
+"""
+Shared fixtures: the app's engines are rebound to a SQLite file per test
+run (tables recreated for every test), so the suite needs no MariaDB.
+"""
+import os
+import sys
+
+os.environ.setdefault("BCRYPT_ROUNDS", "4")  # Cheapest cost bcrypt allows
+os.environ.setdefault("LOOP_MONITOR_ENABLED", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import app.database as database
+
+
+@pytest.fixture(scope="session")
+def engines(tmp_path_factory):
+    path = tmp_path_factory.mktemp("db") / "test.db"
+    sync_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+    database.engine = database.read_engine = sync_engine
+    database.async_engine = database.async_read_engine = async_engine
+    database.SessionLocal.configure(bind=sync_engine)
+    database.ReadSessionLocal.configure(bind=sync_engine)
+    database.AsyncSessionLocal.configure(bind=async_engine)
+    database.AsyncReadSessionLocal.configure(bind=async_engine)
+    return sync_engine, async_engine
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(engines, tmp_path, monkeypatch):
+    import app.models  # noqa: F401 (registers the tables)
+    from app.config import settings
+    from app.services.holiday_service import HolidayService
+    from app.services.principal_service import PrincipalService
+
+    sync_engine, _ = engines
+    database.Base.metadata.drop_all(bind=sync_engine)
+    database.Base.metadata.create_all(bind=sync_engine)
+
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "PHOTO_STORE_DIR", str(tmp_path / "uploads" / "photos"))
+    # Holidays come from what a test loads, never from the network
+    monkeypatch.setattr(HolidayService, "_revalidate", classmethod(lambda cls, year: None))
+    monkeypatch.setattr(HolidayService, "_holidays", {})
+    monkeypatch.setattr(HolidayService, "_calendar", None)
+    PrincipalService.clear()
+    yield
+
+
+@pytest.fixture
+def db(fresh_db):
+    session = database.SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def app(fresh_db):
+    from fastapi import FastAPI
+    from app.routes import auth, attendance, leave, location, metrics, task
+
+    application = FastAPI()
+    application.include_router(auth.router, prefix="/api/auth")
+    application.include_router(attendance.router, prefix="/api/attendance")
+    application.include_router(leave.router, prefix="/api/leave")
+    application.include_router(task.router, prefix="/api/tasks")
+    application.include_router(location.router, prefix="/api/locations")
+    application.include_router(metrics.router, prefix="/api/metrics")
+    return application
+
+
+@pytest.fixture
+def client(app):
+    from fastapi.testclient import TestClient
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def make_user(fresh_db):
+    """make_user(nip, positions=(), password=None, **fields) -> (user_id, auth headers)"""
+    from app.models import Position, User, user_positions
+    from app.utils import create_access_token, hash_password
+
+    def make(nip="N1", positions=(), password=None, **fields):
+        session = database.SessionLocal()
+        try:
+            user = User(**{
+                "email": f"{nip.lower()}@example.com",
+                "password_hash": hash_password(password) if password else "x",
+                "name": f"User {nip}",
+                "nip": nip,
+                "department": "IT",
+                "is_active": True,
+                **fields
+            })
+            session.add(user)
+            session.flush()
+            for code in positions:
+                position = session.query(Position).filter(Position.code == code).first()
+                if position is None:
+                    position = Position(code=code, name=code, category="non_akademik")
+                    session.add(position)
+                    session.flush()
+                session.execute(insert(user_positions).values(user_id=user.id, position_id=position.id))
+            session.commit()
+            user_id = user.id
+        finally:
+            session.close()
+        return user_id, {"Authorization": "Bearer " + create_access_token({"sub": user_id})}
+
+    return make
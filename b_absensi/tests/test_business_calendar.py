@@ -0,0 +1,78 @@
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from app.services.holiday_service import HolidayService
+from app.services.leave_quota_service import LeaveQuotaService
+from app.utils.business_calendar import WorkdayCalendar
+
+HOLIDAYS = {date(2025, 12, 25), date(2026, 1, 1), date(2026, 3, 20), date(2026, 8, 17), date(2026, 8, 15)}
+
+
+def naive_count(start, end, holidays):
+    days = 0
+    day = start
+    while day <= end:
+        if day.weekday() < 5 and day not in holidays:
+            days += 1
+        day += timedelta(days=1)
+    return days
+
+
+def random_ranges(count, seed=7):
+    rng = random.Random(seed)
+    origin = date(2025, 1, 1)
+    ranges = []
+    for _ in range(count):
+        start = origin + timedelta(days=rng.randrange(730))
+        ranges.append((start, start + timedelta(days=rng.randrange(-3, 60))))
+    return ranges
+
+
+def test_count_matches_day_by_day_loop():
+    calendar = WorkdayCalendar(2025, 2027, HOLIDAYS)
+    for start, end in random_ranges(300):
+        assert calendar.count(start, end) == naive_count(start, end, HOLIDAYS)
+
+    starts, ends = zip(*random_ranges(300))
+    assert calendar.count_many(starts, ends).tolist() == [calendar.count(s, e) for s, e in zip(starts, ends)]
+
+
+def test_edges_and_bounds():
+    calendar = WorkdayCalendar(2026, 2026, HOLIDAYS)
+    assert calendar.count(date(2026, 1, 1), date(2026, 1, 1)) == 0  # Holiday
+    assert calendar.count(date(2026, 1, 2), date(2026, 1, 2)) == 1  # Friday
+    assert calendar.count(date(2026, 1, 3), date(2026, 1, 4)) == 0  # Weekend
+    assert calendar.count(date(2026, 1, 9), date(2026, 1, 5)) == 0  # start > end
+    assert calendar.count(date(2026, 1, 1), date(2026, 12, 31)) == naive_count(
+        date(2026, 1, 1), date(2026, 12, 31), HOLIDAYS
+    )
+    with pytest.raises(ValueError):
+        calendar.count(date(2025, 12, 31), date(2026, 1, 2))
+    with pytest.raises(ValueError):
+        calendar.count_many([date(2026, 12, 30)], [date(2027, 1, 1)])
+    assert calendar.count_many(np.array([], dtype="datetime64[D]"), []).size == 0
+
+
+def test_holiday_service_counts_with_loaded_holidays(monkeypatch):
+    by_year = {}
+    for day in HOLIDAYS:
+        by_year.setdefault(day.year, set()).add(day)
+    monkeypatch.setattr(HolidayService, "_holidays", {year: frozenset(days) for year, days in by_year.items()})
+
+    for start, end in random_ranges(100):
+        assert LeaveQuotaService.calculate_working_days(start, end) == naive_count(start, end, HOLIDAYS)
+    ranges = random_ranges(100, seed=3)
+    assert LeaveQuotaService.calculate_working_days_many(ranges) == [naive_count(s, e, HOLIDAYS) for s, e in ranges]
+
+    # A range past the cached calendar grows it instead of failing
+    far = (date(2031, 1, 1), date(2031, 1, 31))
+    assert HolidayService.count_working_days(*far) == naive_count(*far, set())
+    assert HolidayService._calendar.last_year >= 2031
+
+    # New holidays drop the cached calendar
+    monkeypatch.setattr(HolidayService, "_holidays", {2026: frozenset({date(2026, 1, 2)})})
+    monkeypatch.setattr(HolidayService, "_calendar", None)
+    assert HolidayService.count_working_days(date(2026, 1, 1), date(2026, 1, 2)) == 1
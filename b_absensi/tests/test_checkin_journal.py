@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.models.absensi import Attendance, AttendanceStatus, PhotoBlob
+from app.services.auto_checkout_service import AutoCheckoutService
+from app.services.checkin_journal_service import TZ, CheckinJournalService
+
+PHOTO = "photos/ab/cd/" + "ab" * 32 + ".jpg"
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CHECKIN_JOURNAL_ENABLED", True)
+    monkeypatch.setattr(settings, "CHECKIN_JOURNAL_DIR", str(tmp_path / "journal"))
+    monkeypatch.setattr(settings, "CHECKIN_JOURNAL_FLUSH_MS", 10000)  # Written only when flushed
+    CheckinJournalService.start()
+    assert CheckinJournalService.enabled()
+    yield CheckinJournalService
+    CheckinJournalService.stop()
+
+
+def check_in(user_id, when):
+    return Attendance(
+        user_id=user_id,
+        check_in_time=when,
+        work_date=when.date(),
+        check_in_latitude=-6.18,
+        check_in_longitude=106.82,
+        check_in_location="MNC Tower",
+        check_in_photo_url=PHOTO,
+        required_checkout_time=when.replace(hour=17),
+        status=AttendanceStatus.ON_TIME
+    )
+
+
+def test_submit_keeps_jakarta_time(journal, make_user, db):
+    user_id, _ = make_user()
+    when = TZ.localize(datetime(2026, 10, 16, 7, 15))
+    attendance = check_in(user_id, when)
+    journal.submit(attendance)
+
+    assert attendance.check_in_time == when and attendance.check_in_time.tzinfo is not None
+    pending = journal.get_pending(user_id, when.date())
+    assert pending.check_in_time == when and pending.check_in_time.utcoffset() == timedelta(hours=7)
+
+    assert journal.flush(when.date(), timeout=5)
+    row = db.get(Attendance, attendance.id)
+    assert row.check_in_time == when.replace(tzinfo=None)  # Jakarta wall time in the column
+    assert db.get(PhotoBlob, "ab" * 32).ref_count == 1
+
+
+def test_day_already_in_database_is_dropped(journal, make_user, db):
+    user_id, _ = make_user()
+    when = TZ.localize(datetime(2026, 10, 16, 7, 15))
+    # Written directly (e.g. by the offline batch endpoint) behind the journal's back
+    db.add(check_in(user_id, when - timedelta(minutes=5)))
+    db.commit()
+
+    journaled = check_in(user_id, when)
+    journal.submit(journaled)
+    assert journal.flush(when.date(), timeout=5)
+
+    db.expire_all()
+    [row] = db.query(Attendance).filter(Attendance.user_id == user_id).all()
+    assert row.id != journaled.id
+    assert db.get(PhotoBlob, "ab" * 32) is None  # The dropped entry counted no reference
+
+
+def test_auto_checkout_includes_journaled_check_ins(journal, make_user, db):
+    user_id, _ = make_user()
+    yesterday = datetime.now(TZ).date() - timedelta(days=1)
+    attendance = check_in(user_id, TZ.localize(datetime.combine(yesterday, datetime.min.time()).replace(hour=8)))
+    journal.submit(attendance)
+
+    AutoCheckoutService.auto_checkout_users()
+
+    db.expire_all()
+    row = db.get(Attendance, attendance.id)
+    assert row.check_out_time is not None
+    assert row.status == AttendanceStatus.INCOMPLETE
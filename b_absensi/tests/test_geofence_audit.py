@@ -0,0 +1,63 @@
+import csv
+import io
+from datetime import date, datetime
+
+import pytest
+
+from app.config import LOKASI_ABSENSI
+from app.geofence_audit import audit
+from app.models.absensi import Attendance
+from app.services.location_service import LocationService, Site, _SiteIndex
+
+MNC_TOWER = (LOKASI_ABSENSI["MNC Tower"]["lat"], LOKASI_ABSENSI["MNC Tower"]["lon"])
+MNC_UNIVERSITY = (LOKASI_ABSENSI["MNC University"]["lat"], LOKASI_ABSENSI["MNC University"]["lon"])
+FAR_AWAY = (-7.25, 112.75)
+
+
+@pytest.fixture(autouse=True)
+def configured_sites(monkeypatch):
+    monkeypatch.setattr(LocationService, "_index", _SiteIndex([
+        Site(name=name, lat=data["lat"], lon=data["lon"], radius=data["radius"])
+        for name, data in LOKASI_ABSENSI.items()
+    ]))
+
+
+def add_attendance(db, user_id, day, point, location):
+    db.add(Attendance(
+        user_id=user_id,
+        check_in_time=datetime(2026, 10, day, 8),
+        work_date=date(2026, 10, day),
+        check_in_latitude=point[0],
+        check_in_longitude=point[1],
+        check_in_location=location,
+        required_checkout_time=datetime(2026, 10, day, 17)
+    ))
+
+
+def test_overlapping_sites_are_not_flagged(db, make_user):
+    user_id, _ = make_user()
+    # MNC Tower and iNews Tower overlap: MNC Tower's centre is inside both
+    assert LocationService.locate(*MNC_TOWER).name == "MNC Tower"
+    add_attendance(db, user_id, 1, MNC_TOWER, "iNews Tower")
+    add_attendance(db, user_id, 2, MNC_UNIVERSITY, "MNC Tower")
+    add_attendance(db, user_id, 3, FAR_AWAY, "MNC Tower")
+    db.commit()
+
+    out = io.StringIO()
+    counts = audit(db, out, batch_size=2)
+    assert counts == {"attendances": 3, "checked": 3, "outside": 1, "different_site": 1}
+
+    rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+    assert sorted((row["recorded_location"], row["matched_location"], row["reason"]) for row in rows) == [
+        ("MNC Tower", "", "outside"),
+        ("MNC Tower", "MNC University", "different_site"),
+    ]
+
+
+def test_inside_named_batch():
+    inside = LocationService.inside_named_batch(
+        ["MNC Tower", "iNews Tower", "MNC University", "Gedung Lain", None],
+        [MNC_TOWER[0]] * 5,
+        [MNC_TOWER[1]] * 5
+    )
+    assert inside.tolist() == [True, True, False, False, False]
@@ -0,0 +1,101 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+import app.database as database
+from app.models.idempotency import IdempotencyKey
+from app.services.idempotency_service import IdempotencyService, get_jakarta_time
+
+
+@pytest.fixture
+def sessions(fresh_db):
+    opened = []
+
+    def open_session():
+        session = database.SessionLocal()
+        opened.append(session)
+        return session
+
+    yield open_session
+    for session in opened:
+        session.close()
+
+
+def begin(db, user_id, key="k1", scope="attendance.check_in"):
+    return asyncio.run(IdempotencyService.begin(db, user_id, key, scope))
+
+
+def rows(db):
+    db.expire_all()
+    return db.query(IdempotencyKey).all()
+
+
+def test_completed_response_is_replayed(sessions, make_user):
+    user_id, _ = make_user()
+    first = sessions()
+    assert begin(first, user_id) is None
+    IdempotencyService.complete(first, user_id, "k1", {"ok": True})
+    first.commit()
+
+    replay = begin(sessions(), user_id)
+    assert replay.body == b'{"ok":true}'
+    assert replay.headers["Idempotent-Replayed"] == "true"
+
+    with pytest.raises(HTTPException) as error:
+        begin(sessions(), user_id, scope="leave.submit")
+    assert error.value.status_code == 422
+
+
+def test_release_only_drops_own_claim(sessions, make_user):
+    user_id, _ = make_user()
+    first, second = sessions(), sessions()
+    assert begin(first, user_id) is None
+
+    # The first attempt outlives its lease and the retry takes the key over
+    claim = first.query(IdempotencyKey).one()
+    claim.expires_at = get_jakarta_time() - timedelta(seconds=1)
+    first.commit()
+    assert begin(second, user_id) is None
+
+    asyncio.run(IdempotencyService.release(first, user_id, "k1"))
+    [held] = rows(second)
+    assert held.id == second.info["idempotency_claims"][(user_id, "k1")]
+
+    # A request that never claimed the key cannot release it
+    asyncio.run(IdempotencyService.release(sessions(), user_id, "k1"))
+    assert len(rows(second)) == 1
+
+    asyncio.run(IdempotencyService.release(second, user_id, "k1"))
+    assert rows(second) == []
+
+
+def test_complete_after_lost_lease_keeps_new_claim(sessions, make_user):
+    user_id, _ = make_user()
+    first, second = sessions(), sessions()
+    assert begin(first, user_id) is None
+    claim = first.query(IdempotencyKey).one()
+    claim.expires_at = get_jakarta_time() - timedelta(seconds=1)
+    first.commit()
+    assert begin(second, user_id) is None
+
+    IdempotencyService.complete(first, user_id, "k1", {"ok": True})
+    first.commit()
+    [held] = rows(second)
+    assert held.status == "in_progress"
+
+
+def test_claim_gives_up_after_bounded_attempts(sessions, make_user, monkeypatch):
+    user_id, _ = make_user()
+    db = sessions()
+
+    def conflict():
+        raise IntegrityError("INSERT", {}, Exception("duplicate"))
+
+    # The key is taken on every insert but gone on every read
+    monkeypatch.setattr(db, "commit", conflict)
+    with pytest.raises(HTTPException) as error:
+        begin(db, user_id)
+    assert error.value.status_code == 409
@@ -0,0 +1,104 @@
+import asyncio
+
+from sqlalchemy import insert, select
+
+import app.database as database
+from app.models.absensi import LeaveQuota
+from app.models.leave_ledger import LeaveQuotaEntry, LeaveQuotaSnapshot
+from app.services.leave_ledger_service import LeaveLedgerService
+from app.services.leave_quota_service import LeaveQuotaService
+
+YEAR = 2026
+
+
+def counters(db, user_id):
+    db.expire_all()
+    quota = db.execute(select(LeaveQuota).where(LeaveQuota.user_id == user_id, LeaveQuota.year == YEAR)).scalar_one()
+    return quota.total_quota, quota.used_quota
+
+
+def ledger(db, user_id):
+    balance = LeaveLedgerService.balance(db, user_id, YEAR)
+    return balance.total_quota, balance.used_quota
+
+
+def audit():
+    async def run():
+        async with database.AsyncSessionLocal() as session:
+            return await LeaveLedgerService.audit_async(session, YEAR)
+    return asyncio.run(run())
+
+
+def test_ledger_matches_counters(db, make_user):
+    a, _ = make_user("A")
+    b, _ = make_user("B")
+
+    assert LeaveQuotaService.deduct_quota(db, a, 3, YEAR)
+    assert LeaveQuotaService.deduct_quota(db, b, 5, YEAR)
+    assert not LeaveQuotaService.deduct_quota(db, b, 20, YEAR)  # Refused: no entry either
+    db.commit()
+    assert LeaveLedgerService.materialize(db) == 2
+
+    assert LeaveQuotaService.restore_quota(db, a, 2, YEAR)
+    assert not LeaveQuotaService.restore_quota(db, b, 9, YEAR)
+    assert LeaveQuotaService.deduct_quota(db, b, 1, YEAR)
+    db.commit()
+
+    for user_id in (a, b):
+        assert ledger(db, user_id) == counters(db, user_id)
+    assert counters(db, a) == (12, 1)
+    assert counters(db, b) == (12, 6)
+
+    assert LeaveLedgerService.materialize(db) == 2
+    assert LeaveLedgerService.materialize(db) == 0  # Nothing new
+    for user_id in (a, b):
+        assert ledger(db, user_id) == counters(db, user_id)
+    assert audit() == []
+
+
+def test_materialize_keeps_entries_committed_out_of_order(db, make_user):
+    a, _ = make_user("A")
+    b, _ = make_user("B")
+    LeaveQuotaService.get_or_create_quota(db, a, YEAR)
+    LeaveQuotaService.get_or_create_quota(db, b, YEAR)
+    db.commit()
+    LeaveLedgerService.materialize(db)
+    last = db.execute(select(LeaveQuotaEntry.id).order_by(LeaveQuotaEntry.id.desc())).scalars().first()
+
+    # B's entry commits first with the higher id; A's (id allocated
+    # earlier, transaction still open) only commits after the snapshot run
+    db.execute(insert(LeaveQuotaEntry).values(
+        id=last + 2, user_id=b, year=YEAR, kind="debit", quota_change=0, used_change=4
+    ))
+    db.commit()
+    assert LeaveLedgerService.materialize(db) == 1
+
+    db.execute(insert(LeaveQuotaEntry).values(
+        id=last + 1, user_id=a, year=YEAR, kind="debit", quota_change=0, used_change=2
+    ))
+    db.commit()
+    assert LeaveLedgerService.materialize(db) == 1
+
+    snapshots = {
+        row.user_id: (row.quota, row.used)
+        for row in db.execute(select(LeaveQuotaSnapshot)).scalars()
+    }
+    assert snapshots == {a: (12, 2), b: (12, 4)}
+    assert ledger(db, a) == (12, 2)
+
+
+def test_audit_reports_counter_drift(db, make_user):
+    a, _ = make_user("A")
+    assert LeaveQuotaService.deduct_quota(db, a, 3, YEAR)
+    db.commit()
+    LeaveLedgerService.materialize(db)
+
+    quota = db.execute(select(LeaveQuota).where(LeaveQuota.user_id == a)).scalar_one()
+    quota.used_quota = 7
+    db.commit()
+
+    [mismatch] = audit()
+    assert mismatch["user_id"] == a
+    assert mismatch["ledger"] == {"total_quota": 12, "used_quota": 3}
+    assert mismatch["counters"] == {"total_quota": 12, "used_quota": 7}
+    assert mismatch["snapshot"] is None
@@ -0,0 +1,216 @@
+import asyncio
+import re
+from datetime import date, datetime, timedelta
+
+import httpx
+import pytest
+from sqlalchemy import exc, insert, select, text
+
+import app.database as database
+from app.config import settings
+from app.models.absensi import Leave, LeaveCategory, LeaveQuota, LeaveStatus, LeaveType, get_jakarta_time
+from app.models.leave_ledger import LeaveQuotaEntry
+from app.models.user import Position, User
+from app.services.leave_quota_service import LeaveQuotaService
+
+YEAR = 2026
+UUID4 = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}$")
+
+
+def quota_rows(db, user_id):
+    db.expire_all()
+    return db.execute(
+        select(LeaveQuota).where(LeaveQuota.user_id == user_id).order_by(LeaveQuota.created_at)
+    ).scalars().all()
+
+
+def test_add_unique_key_merges_duplicates(engines, make_user):
+    a, _ = make_user("A")
+    b, _ = make_user("B")
+    sync_engine, _ = engines
+    with sync_engine.connect() as conn:
+        # leave_quotas as created before migration 008: no key
+        conn.execute(text("DROP TABLE leave_quotas"))
+        conn.execute(text("""
+            CREATE TABLE leave_quotas (
+                id VARCHAR(36) PRIMARY KEY, user_id VARCHAR(36) NOT NULL, year INTEGER NOT NULL,
+                total_quota INTEGER, used_quota INTEGER, remaining_quota INTEGER,
+                created_at DATETIME, updated_at DATETIME
+            )
+        """))
+        rows = [
+            ("q1", a, 12, 2, datetime(2026, 1, 1)),
+            ("q2", a, 12, 3, datetime(2026, 2, 1)),
+            ("q0", a, 12, 1, datetime(2026, 3, 1)),
+            ("q3", b, 12, 4, datetime(2026, 1, 1)),
+        ]
+        for id_, user_id, total, used, created_at in rows:
+            conn.execute(insert(LeaveQuota.__table__).values(
+                id=id_, user_id=user_id, year=YEAR, total_quota=total, used_quota=used,
+                remaining_quota=total - used, created_at=created_at, updated_at=created_at
+            ))
+        conn.commit()
+
+        assert LeaveQuotaService.add_unique_key(conn) == 2
+        assert LeaveQuotaService.add_unique_key(conn) == 0  # Key exists now
+
+    db = database.SessionLocal()
+    try:
+        [kept] = quota_rows(db, a)
+        assert (kept.id, kept.used_quota, kept.remaining_quota) == ("q1", 6, 6)
+        [other] = quota_rows(db, b)
+        assert other.used_quota == 4
+        # get_or_create_quota finds the single row instead of failing
+        assert LeaveQuotaService.get_or_create_quota(db, a, YEAR).id == "q1"
+
+        with pytest.raises(exc.IntegrityError):
+            db.execute(insert(LeaveQuota.__table__).values(id="q9", user_id=a, year=YEAR))
+    finally:
+        db.close()
+
+
+def test_reset_annual_quotas_creates_missing_rows_in_chunks(db, make_user, monkeypatch):
+    monkeypatch.setattr(settings, "LEAVE_QUOTA_ROLLOVER_CHUNK", 2)
+    users = [make_user(f"N{i}")[0] for i in range(5)]
+    inactive, _ = make_user("OFF", is_active=False)
+    LeaveQuotaService.get_or_create_quota(db, users[0], YEAR)
+    db.commit()
+
+    assert LeaveQuotaService.reset_annual_quotas(db, YEAR) == 4
+    assert LeaveQuotaService.reset_annual_quotas(db, YEAR) == 0  # Nothing left to create
+
+    quotas = db.execute(select(LeaveQuota).where(LeaveQuota.year == YEAR)).scalars().all()
+    assert sorted(quota.user_id for quota in quotas) == sorted(users)
+    assert all(UUID4.match(quota.id) for quota in quotas)
+    assert all((quota.total_quota, quota.used_quota, quota.remaining_quota) == (12, 0, 12) for quota in quotas)
+    # One grant per quota
+    grants = db.execute(select(LeaveQuotaEntry.user_id).where(LeaveQuotaEntry.kind == "grant")).scalars().all()
+    assert sorted(grants) == sorted(users)
+    assert inactive not in grants
+
+
+def test_quota_follows_position_entitlement(db, make_user):
+    user_id, _ = make_user(positions=("DOSEN",))
+    db.query(Position).filter(Position.code == "DOSEN").update({"annual_leave_quota": 18})
+    db.commit()
+
+    quota = LeaveQuotaService.get_or_create_quota(db, user_id, YEAR)
+    assert (quota.total_quota, quota.remaining_quota) == (18, 18)
+
+
+def test_deduct_and_restore_never_overdraw(db, make_user):
+    user_id, _ = make_user()
+    assert LeaveQuotaService.deduct_quota(db, user_id, 10, YEAR)
+    assert not LeaveQuotaService.deduct_quota(db, user_id, 3, YEAR)  # Only 2 left
+    assert LeaveQuotaService.deduct_quota(db, user_id, 2, YEAR)
+    assert not LeaveQuotaService.restore_quota(db, user_id, 13, YEAR)  # Only 12 used
+    assert LeaveQuotaService.restore_quota(db, user_id, 5, YEAR)
+    db.commit()
+
+    info = LeaveQuotaService.get_user_quota_info(db, user_id, YEAR)
+    assert (info["total_quota"], info["used_quota"], info["remaining_quota"]) == (12, 7, 5)
+    [quota] = quota_rows(db, user_id)
+    assert (quota.used_quota, quota.remaining_quota) == (7, 5)
+
+
+def annual_leave(db, user_id, days):
+    leave = Leave(
+        user_id=user_id, leave_type=LeaveType.CUTI, category=LeaveCategory.CUTI_TAHUNAN,
+        start_date=datetime(YEAR, 3, 2), end_date=datetime(YEAR, 3, 2 + days), total_days=days,
+        reason="Cuti", status=LeaveStatus.PENDING, created_at=datetime(YEAR, 3, 1),
+        deducted_from_quota=True, quota_year=YEAR
+    )
+    db.add(leave)
+    db.flush()
+    assert LeaveQuotaService.deduct_quota(db, user_id, days, YEAR, leave_id=leave.id)
+    db.commit()
+    return leave.id
+
+
+def post_concurrently(app, headers, *requests):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post(url, json=body, headers=headers) for url, body in requests))
+    return asyncio.run(run())
+
+
+def test_concurrent_rejects_refund_once(db, app, make_user):
+    user_id, headers = make_user()
+    annual_leave(db, user_id, 3)  # Holds used days a second refund could take
+    leave_id = annual_leave(db, user_id, 3)
+
+    reject = (f"/api/leave/{leave_id}/reject", {"notes": "Tidak bisa"})
+    responses = post_concurrently(app, headers, reject, reject)
+    assert sorted(response.status_code for response in responses) == [200, 400]
+
+    [quota] = quota_rows(db, user_id)
+    assert quota.used_quota == 3
+    credits = db.execute(select(LeaveQuotaEntry).where(LeaveQuotaEntry.kind == "credit")).scalars().all()
+    assert [entry.leave_id for entry in credits] == [leave_id]
+    assert db.get(Leave, leave_id).status == LeaveStatus.REJECTED
+
+
+def test_reject_racing_approve_changes_leave_once(db, app, make_user):
+    user_id, headers = make_user()
+    leave_id = annual_leave(db, user_id, 2)
+
+    responses = post_concurrently(
+        app, headers,
+        (f"/api/leave/{leave_id}/approve", {"level": 1}),
+        (f"/api/leave/{leave_id}/reject", {"notes": "Tidak bisa"})
+    )
+    approved, rejected = (response.status_code == 200 for response in responses)
+    assert approved != rejected
+
+    db.expire_all()
+    leave = db.get(Leave, leave_id)
+    [quota] = quota_rows(db, user_id)
+    if approved:
+        assert (leave.status, quota.used_quota) == (LeaveStatus.APPROVED_BY_SUPERVISOR, 2)
+    else:
+        assert (leave.status, quota.used_quota) == (LeaveStatus.REJECTED, 0)
+
+
+def test_submit_records_the_charged_year(db, client, make_user):
+    user_id, headers = make_user()
+    year = get_jakarta_time().year
+    monday = date(year, 6, 1) + timedelta(days=-date(year, 6, 1).weekday() % 7)
+    response = client.post("/api/leave/submit", headers=headers, data={
+        "type": "cuti", "category": "cuti_tahunan", "reason": "Cuti",
+        "start_date": monday.isoformat(), "end_date": (monday + timedelta(days=2)).isoformat()
+    })
+    assert response.status_code == 200, response.text
+
+    leave = db.get(Leave, response.json()["leave_id"])
+    assert (leave.deducted_from_quota, leave.quota_year, leave.total_days) == (True, year, 3)
+
+    personal = client.post("/api/leave/submit", headers=headers, data={
+        "type": "izin", "category": "keperluan_pribadi", "reason": "Izin",
+        "start_date": monday.isoformat(), "end_date": monday.isoformat()
+    })
+    assert personal.status_code == 200, personal.text
+    leave = db.get(Leave, personal.json()["leave_id"])
+    assert (leave.deducted_from_quota, leave.quota_year) == (False, None)
+
+def test_reject_refunds_the_charged_year_only(db, client, make_user):
+    user_id, headers = make_user()
+    charged = annual_leave(db, user_id, 2)
+    # Charged just before New Year, stamped just after
+    db.get(Leave, charged).created_at = datetime(YEAR + 1, 1, 1)
+    uncharged = Leave(
+        user_id=user_id, leave_type=LeaveType.CUTI, category=LeaveCategory.CUTI_TAHUNAN,
+        start_date=datetime(YEAR, 4, 1), end_date=datetime(YEAR, 4, 1), total_days=1,
+        reason="Cuti", status=LeaveStatus.PENDING
+    )
+    db.add(uncharged)
+    db.commit()
+    LeaveQuotaService.get_or_create_quota(db, user_id, YEAR + 1)
+    db.commit()
+
+    response = client.post(f"/api/leave/{charged}/reject", headers=headers, json={"notes": "Tidak bisa"})
+    assert response.json()["quota_refunded"] is True
+    response = client.post(f"/api/leave/{uncharged.id}/reject", headers=headers, json={"notes": "Tidak bisa"})
+    assert response.json()["quota_refunded"] is False
+
+    assert {quota.year: quota.used_quota for quota in quota_rows(db, user_id)} == {YEAR: 0, YEAR + 1: 0}
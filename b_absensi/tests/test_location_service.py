@@ -0,0 +1,68 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from app.services.location_service import LocationService, Site, _SiteIndex
+
+CENTER = (-6.18, 106.82)
+
+
+def square(lat, lon, half):
+    return [[lon - half, lat - half], [lon + half, lat - half], [lon + half, lat + half],
+            [lon - half, lat + half], [lon - half, lat - half]]
+
+
+def random_sites(rng, count):
+    sites = []
+    for i in range(count):
+        lat = CENTER[0] + rng.uniform(-0.05, 0.05)
+        lon = CENTER[1] + rng.uniform(-0.05, 0.05)
+        kind = i % 3
+        if kind == 0:
+            sites.append(Site(name=f"circle-{i}", lat=lat, lon=lon, radius=rng.uniform(0.2, 1.5)))
+        elif kind == 1:
+            # Polygon with a hole in the middle
+            half = rng.uniform(0.003, 0.01)
+            boundary = {"type": "Polygon", "coordinates": [square(lat, lon, half), square(lat, lon, half / 3)]}
+            sites.append(Site(name=f"polygon-{i}", lat=lat, lon=lon, boundary=json.dumps(boundary)))
+        else:
+            half = rng.uniform(0.002, 0.006)
+            boundary = {"type": "MultiPolygon", "coordinates": [
+                [square(lat, lon, half)], [square(lat + 3 * half, lon + 3 * half, half)]
+            ]}
+            sites.append(Site(name=f"multi-{i}", lat=lat, lon=lon, boundary=json.dumps(boundary)))
+    return sites
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_locate_batch_matches_locate(monkeypatch, seed):
+    rng = random.Random(seed)
+    monkeypatch.setattr(LocationService, "_index", _SiteIndex(random_sites(rng, 30)))
+    points = [
+        (CENTER[0] + rng.uniform(-0.08, 0.08), CENTER[1] + rng.uniform(-0.08, 0.08))
+        for _ in range(500)
+    ]
+    # Points inside holes and on the multipolygon's second part
+    for site in LocationService._index.sites[1:9]:
+        points.append((site.lat, site.lon))
+
+    latitudes, longitudes = zip(*points)
+    batch = LocationService.locate_batch(latitudes, longitudes, max_cells=30 * 64)  # Several chunks
+    names = batch.names()
+    for i, point in enumerate(points):
+        match = LocationService.locate(*point)
+        assert bool(batch.is_valid[i]) == match.is_valid, point
+        assert names[i] == match.name, point
+        assert batch.distance[i] == pytest.approx(match.distance, abs=1e-6), point
+
+
+def test_locate_batch_without_sites_or_points(monkeypatch):
+    monkeypatch.setattr(LocationService, "_index", _SiteIndex([]))
+    batch = LocationService.locate_batch([CENTER[0]], [CENTER[1]])
+    assert batch.site_index.tolist() == [-1] and not batch.is_valid[0] and np.isinf(batch.distance[0])
+    assert LocationService.locate(*CENTER).site is None
+
+    monkeypatch.setattr(LocationService, "_index", _SiteIndex(random_sites(random.Random(0), 3)))
+    assert LocationService.locate_batch([], []).site_index.size == 0
@@ -0,0 +1,17 @@
+import pytest
+
+METRICS = ["/api/metrics/loop", "/api/metrics/db-pool", "/api/metrics/auth-cache", "/api/metrics/password-hashing"]
+
+
+@pytest.mark.parametrize("path", METRICS)
+def test_metrics_need_admin_position(client, make_user, path):
+    _, staff = make_user("N1", positions=["STAFF_IT"])
+    _, admin = make_user("N2", positions=["KEPALA_IT"])
+
+    assert client.get(path, headers=staff).status_code == 403
+    assert client.get(path + "?reset=true", headers=staff).status_code == 403
+    assert client.get(path, headers=admin).status_code == 200
+
+
+def test_metrics_need_login(client):
+    assert client.get("/api/metrics/loop").status_code == 403  # No bearer token
@@ -0,0 +1,169 @@
+import hashlib
+import hmac
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytz
+
+from app.config import LOKASI_ABSENSI, settings
+from app.models.absensi import Attendance
+from app.utils import create_access_token, create_offline_key
+
+PHOTO = b"\xff\xd8\xff\xe0" + b"\x00" * 64  # JPEG magic bytes are all the store checks
+MNC_TOWER = LOKASI_ABSENSI["MNC Tower"]
+
+
+def signed_event(user_id, photo_digest="", key=None, issued=None, **fields):
+    event = {
+        "client_event_id": "e1",
+        "type": "check_in",
+        "timestamp": datetime.now(pytz.timezone("Asia/Jakarta")).replace(microsecond=0).isoformat(),
+        "latitude": MNC_TOWER["lat"],
+        "longitude": MNC_TOWER["lon"],
+        **fields,
+    }
+    message = "|".join([
+        event["client_event_id"], event["type"], event["timestamp"],
+        f"{event['latitude']:.7f}", f"{event['longitude']:.7f}", photo_digest,
+    ])
+    issued = issued or create_offline_key(user_id)
+    event["key_id"] = issued["key_id"]
+    event["signature"] = hmac.new((key or issued["key"]).encode(), message.encode(), hashlib.sha256).hexdigest()
+    return event
+
+
+def post_events(client, headers, *events):
+    return client.post(
+        "/api/attendance/batch",
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+        content="".join(json.dumps(event) + "\n" for event in events).encode(),
+    )
+
+
+def stored_files():
+    root = settings.PHOTO_STORE_DIR
+    return sorted(
+        os.path.relpath(os.path.join(path, name), root)
+        for path, _, names in os.walk(root) for name in names
+    )
+
+
+def post_with_photo(client, headers, event):
+    return client.post(
+        "/api/attendance/batch",
+        headers=headers,
+        data={"events": json.dumps([event])},
+        files={"selfie": ("selfie.jpg", PHOTO, "image/jpeg")},
+    )
+
+
+def test_photo_is_not_stored_for_a_bad_signature(client, make_user):
+    user_id, headers = make_user()
+    digest = hashlib.sha256(PHOTO).hexdigest()
+    event = signed_event(user_id, digest, key="not-the-key", photo="selfie")
+
+    response = post_with_photo(client, headers, event)
+    assert response.status_code == 200
+    assert response.json()["rejected"][0]["reason"] == "Invalid signature"
+    assert stored_files() == []
+
+
+def test_photo_is_stored_for_a_good_signature(client, make_user):
+    user_id, headers = make_user()
+    digest = hashlib.sha256(PHOTO).hexdigest()
+    event = signed_event(user_id, digest, photo="selfie")
+
+    response = post_with_photo(client, headers, event)
+    assert response.status_code == 200
+    assert response.json()["rejected"] == []
+    assert f"{digest[:2]}/{digest[2:4]}/{digest}.jpg" in stored_files()
+
+
+def test_photo_is_not_stored_for_a_rejected_event(client, make_user):
+    user_id, headers = make_user()
+    digest = hashlib.sha256(PHOTO).hexdigest()
+    event = signed_event(user_id, digest, photo="selfie", latitude=-7.0, longitude=110.0)
+
+    response = post_with_photo(client, headers, event)
+    assert response.json()["rejected"][0]["reason"].startswith("Lokasi tidak valid")
+    assert stored_files() == []  # Nor left behind in the spool directory
+
+
+def test_only_the_accepted_check_in_stores_its_photo(client, make_user):
+    user_id, headers = make_user()
+    other_photo = PHOTO + b"\x01"
+    first = signed_event(user_id, hashlib.sha256(PHOTO).hexdigest(), photo="first")
+    digest = hashlib.sha256(other_photo).hexdigest()
+    second = signed_event(user_id, digest, photo="second", client_event_id="e2")
+
+    response = client.post(
+        "/api/attendance/batch",
+        headers=headers,
+        data={"events": json.dumps([first, second])},
+        files=[("first", ("a.jpg", PHOTO, "image/jpeg")), ("second", ("b.jpg", other_photo, "image/jpeg"))],
+    )
+    assert [item["client_event_id"] for item in response.json()["accepted"]] == ["e1"]
+    assert response.json()["rejected"][0]["reason"].startswith("Sudah check-in")
+    assert not any(digest in path for path in stored_files())
+    assert len(stored_files()) == 1
+
+
+def test_overlong_ndjson_line_is_refused(client, make_user):
+    user_id, headers = make_user()
+    line = json.dumps(signed_event(user_id, padding="x" * settings.OFFLINE_EVENT_MAX_BYTES))
+
+    response = client.post(
+        "/api/attendance/batch",
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+        content=line.encode(),
+    )
+    assert response.status_code == 413
+
+    ok = client.post(
+        "/api/attendance/batch",
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+        content=(json.dumps(signed_event(user_id)) + "\n").encode(),
+    )
+    assert ok.status_code == 200
+    assert len(ok.json()["accepted"]) == 1
+
+
+def test_offline_rows_are_flagged(client, make_user, db):
+    user_id, headers = make_user()
+
+    response = post_events(client, headers, signed_event(user_id))
+    [accepted] = response.json()["accepted"]
+    attendance = db.get(Attendance, accepted["attendance_id"])
+    assert (attendance.check_in_offline, attendance.check_out_offline) == (True, False)
+
+
+def test_events_before_the_key_was_issued_are_rejected(client, make_user):
+    user_id, headers = make_user()
+    issued = client.get("/api/attendance/offline-key", headers=headers).json()
+    backdated = datetime.fromisoformat(issued["issued_at"]) - timedelta(hours=2)
+
+    response = post_events(client, headers, signed_event(user_id, issued=issued, timestamp=backdated.isoformat()))
+    assert response.json()["rejected"][0]["reason"] == "Event predates its signing key"
+
+
+def test_expired_revoked_and_foreign_keys_are_rejected(client, make_user, monkeypatch):
+    user_id, headers = make_user()
+    other_id, _ = make_user("N2")
+    foreign = signed_event(user_id, issued=create_offline_key(other_id), client_event_id="foreign")
+    lifetime = settings.OFFLINE_KEY_EXPIRE_HOURS
+    monkeypatch.setattr(settings, "OFFLINE_KEY_EXPIRE_HOURS", -1)
+    expired = signed_event(user_id, client_event_id="expired")
+    monkeypatch.setattr(settings, "OFFLINE_KEY_EXPIRE_HOURS", lifetime)
+
+    issued = client.get("/api/attendance/offline-key", headers=headers).json()
+    revoked = signed_event(user_id, issued=issued, client_event_id="revoked")
+    response = client.post("/api/auth/logout", headers=headers, json={"offline_key_id": issued["key_id"]})
+    assert response.status_code == 200
+
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": user_id})}  # Logged in again
+    response = post_events(client, headers, foreign, expired, revoked)
+    assert response.json()["accepted"] == []
+    assert {item["client_event_id"]: item["reason"] for item in response.json()["rejected"]} == {
+        name: "Invalid, expired or revoked signing key" for name in ("foreign", "expired", "revoked")
+    }
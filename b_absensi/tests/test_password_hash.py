@@ -0,0 +1,42 @@
+import threading
+import time
+
+import app.services.password_hash_service as password_hash_service
+from app.config import settings
+from app.services.password_hash_service import PasswordHashService
+from app.utils import hash_password
+
+
+def test_cost_factor_comes_from_settings():
+    assert settings.BCRYPT_ROUNDS == 4  # tests/conftest.py
+    assert hash_password("rahasia123").startswith("$2b$04$")
+
+
+def test_concurrent_first_calls_share_one_pool(monkeypatch):
+    created = []
+
+    class SlowPool:
+        def __init__(self, **kwargs):
+            time.sleep(0.05)  # Widen the window a racing caller would slip through
+            created.append(self)
+
+        def shutdown(self, **kwargs):
+            pass
+
+    monkeypatch.setattr(password_hash_service, "ProcessPoolExecutor", SlowPool)
+    monkeypatch.setattr(PasswordHashService, "_executor", None)
+
+    seen = []
+    threads = [
+        threading.Thread(target=lambda: seen.append(PasswordHashService._get_executor()))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(executor is created[0] for executor in seen)
+    PasswordHashService.shutdown()
+    assert PasswordHashService._executor is None
@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from app.config import settings
+from app.models import User
+from app.utils.timezone import to_jakarta_time
+from app.services.auth_service import get_jakarta_time
+
+
+def set_pin(client, headers, pin="123456", password="rahasia123"):
+    return client.put("/api/auth/pin", headers=headers, json={"pin": pin, "current_password": password})
+
+
+def pin_login(client, user_id, pin):
+    return client.post("/api/auth/pin-login", json={"user_id": user_id, "pin": pin})
+
+
+def test_set_pin_needs_current_password(client, make_user):
+    user_id, headers = make_user(password="rahasia123")
+
+    assert set_pin(client, headers, password="salah").status_code == 400
+    assert pin_login(client, user_id, "123456").status_code == 401
+
+    assert set_pin(client, headers).status_code == 200
+    assert pin_login(client, user_id, "123456").status_code == 200
+
+
+def test_set_pin_requires_password_field(client, make_user):
+    _, headers = make_user(password="rahasia123")
+    assert client.put("/api/auth/pin", headers=headers, json={"pin": "123456"}).status_code == 422
+
+
+def test_inactive_user_cannot_pin_login(client, make_user, db):
+    user_id, headers = make_user(password="rahasia123")
+    assert set_pin(client, headers).status_code == 200
+
+    db.get(User, user_id).is_active = False
+    db.commit()
+    assert pin_login(client, user_id, "123456").status_code == 401
+
+
+def test_inactive_user_cannot_refresh(client, make_user, db):
+    user_id, _ = make_user(password="rahasia123")
+    login = client.post("/api/auth/login", json={"email": "n1@example.com", "password": "rahasia123"})
+    refresh_token = login.json()["refresh_token"]
+    response = client.post("/api/auth/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == 200
+    refresh_token = response.json()["refresh_token"]
+
+    db.get(User, user_id).is_active = False
+    db.commit()
+    response = client.post("/api/auth/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Refresh token tidak valid atau sudah kedaluwarsa"
+
+    # The family is revoked: reactivating does not bring the session back
+    db.get(User, user_id).is_active = True
+    db.commit()
+    assert client.post("/api/auth/refresh", json={"refresh_token": refresh_token}).status_code == 401
+
+
+def test_lockout_doubles_each_time(client, make_user, db):
+    user_id, headers = make_user(password="rahasia123")
+    assert set_pin(client, headers).status_code == 200
+
+    def lock_minutes():
+        db.expire_all()
+        user = db.get(User, user_id)
+        return (to_jakarta_time(user.pin_locked_until) - get_jakarta_time()).total_seconds() / 60
+
+    def expire_lock():
+        db.expire_all()
+        user = db.get(User, user_id)
+        user.pin_locked_until = get_jakarta_time() - timedelta(seconds=1)
+        db.commit()
+
+    for round_ in range(3):
+        for _ in range(settings.PIN_MAX_ATTEMPTS):
+            assert pin_login(client, user_id, "000000").status_code == 401
+        expected = settings.PIN_LOCKOUT_MINUTES * 2 ** round_
+        assert expected - 1 < lock_minutes() <= expected
+        # Locked: even the right PIN is refused
+        assert pin_login(client, user_id, "123456").status_code == 429
+        expire_lock()
+
+    # A correct PIN starts over
+    assert pin_login(client, user_id, "123456").status_code == 200
+    db.expire_all()
+    assert db.get(User, user_id).pin_failed_attempts == 0
+
@@ -0,0 +1,9 @@
+def test_profile_refuses_revoked_token(client, make_user):
+    user_id, headers = make_user()
+    response = client.get("/api/auth/profile", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["id"] == user_id
+
+    assert client.post("/api/auth/logout", headers=headers).status_code == 200
+    assert client.get("/api/auth/profile", headers=headers).status_code == 401
+    assert client.get("/api/auth/profile").status_code in (401, 403)
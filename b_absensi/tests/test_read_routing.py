@@ -0,0 +1,95 @@
+"""
+Replica routing against two SQLite files: rows only written to the
+"replica" file show which database a read endpoint used.
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import app.database as database
+from app.config import settings
+from app.database import ReadRouting
+from app.models.absensi import Attendance, Leave
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    path = tmp_path / "replica.db"
+    sync_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    database.Base.metadata.create_all(bind=sync_engine)
+
+    monkeypatch.setattr(settings, "DATABASE_REPLICA_URL", f"sqlite:///{path}")
+    monkeypatch.setattr(ReadRouting, "_recent_writes", {})
+    database.ReadSessionLocal.configure(bind=sync_engine)
+    database.AsyncReadSessionLocal.configure(bind=async_engine)
+    session = database.ReadSessionLocal()
+    yield session
+    session.close()
+    database.ReadSessionLocal.configure(bind=database.engine)
+    database.AsyncReadSessionLocal.configure(bind=database.async_engine)
+    sync_engine.dispose()
+
+
+def replica_only_rows(replica, user_id):
+    """An attendance and a leave that exist on the replica file only"""
+    replica.add(Attendance(
+        user_id=user_id,
+        check_in_time=datetime(2026, 10, 1, 8),
+        work_date=datetime(2026, 10, 1).date(),
+        check_in_latitude=-6.18,
+        check_in_longitude=106.82,
+        check_in_location="replica",
+        required_checkout_time=datetime(2026, 10, 1, 17)
+    ))
+    replica.add(Leave(
+        user_id=user_id,
+        leave_type="IZIN",
+        category="replica",
+        start_date=datetime(2026, 10, 2),
+        end_date=datetime(2026, 10, 2),
+        total_days=1,
+        reason="replica"
+    ))
+    replica.commit()
+
+
+def reads(client, headers):
+    history = client.get("/api/attendance/history", headers=headers).json()["data"]
+    leaves = client.get("/api/leave/list", headers=headers).json()["leaves"]
+    return [row["check_in_location"] for row in history], [row["category"] for row in leaves]
+
+
+def test_reads_go_to_replica_until_the_user_writes(client, make_user, replica, monkeypatch):
+    user_id, headers = make_user(password="rahasia123")
+    other_id, other_headers = make_user("N2")
+    replica_only_rows(replica, user_id)
+    replica_only_rows(replica, other_id)
+
+    assert reads(client, headers) == (["replica"], ["replica"])
+
+    # A committed write pins this user's reads to the primary
+    response = client.put(
+        "/api/auth/pin", headers=headers, json={"pin": "123456", "current_password": "rahasia123"}
+    )
+    assert response.status_code == 200
+    assert ReadRouting.use_primary(user_id)
+    assert reads(client, headers) == ([], [])
+    # Other users keep reading the replica
+    assert reads(client, other_headers) == (["replica"], ["replica"])
+
+    # Once the window is over, back to the replica
+    monkeypatch.setitem(ReadRouting._recent_writes, user_id, 0.0)
+    assert reads(client, headers) == (["replica"], ["replica"])
+
+
+def test_without_replica_reads_use_primary(client, make_user, replica, monkeypatch):
+    user_id, headers = make_user()
+    replica_only_rows(replica, user_id)
+    monkeypatch.setattr(settings, "DATABASE_REPLICA_URL", "")
+    session = ReadRouting.session_for(user_id)
+    assert session.get_bind() is database.engine
+    session.close()
+    assert reads(client, headers) == ([], [])